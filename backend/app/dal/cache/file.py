@@ -1,27 +1,201 @@
+import fnmatch
+import hashlib
 import json
+import logging
 import os
-from pympler import asizeof
+import tempfile
+import threading
+import time
+from collections.abc import AsyncIterator
+from urllib.parse import quote, unquote
 from minject import inject
 
-from lib.cache import CacheProvider
+from lib.cache import CacheProvider, EncodableT
+from lib.codec import CodecSelector, parse_codec_config
 
-@inject.bind()
+
+logger = logging.getLogger(__name__)
+
+
+@inject.bind(
+    codecs=CodecSelector(
+        default=os.getenv("BIRDSPOT_CACHE_CODEC", "json+zlib"),
+        prefix_codecs=parse_codec_config(
+            os.getenv("BIRDSPOT_CACHE_PREFIX_CODECS", "")
+        ),
+    ),
+    max_bytes=int(
+        os.getenv("BIRDSPOT_FILE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024))
+    ),
+    # 0 keeps entries until the size budget needs the space
+    max_age=float(os.getenv("BIRDSPOT_FILE_CACHE_MAX_AGE", "0")),
+    compact_interval=float(
+        os.getenv("BIRDSPOT_FILE_CACHE_COMPACT_INTERVAL", "300")
+    ),
+)
 class FileCache(CacheProvider):
-    def __init__(self):
+    """
+    Stores each key in its own file, sharded into two levels of hashed
+    subdirectories. A background compactor keeps the directory within a size
+    budget by evicting the least recently written entries.
+    """
+
+    # compaction evicts down to this fraction of the budget, so it doesn't
+    # run again on the very next write
+    LOW_WATERMARK = 0.9
+
+    def __init__(
+        self,
+        codecs: CodecSelector,
+        max_bytes: int,
+        max_age: float,
+        compact_interval: float,
+    ):
         self.cache_directory = os.getenv("BIRDSPOT_FILE_CACHE_DIRECTORY")
+        self.codecs = codecs
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compact_interval = compact_interval
+        # approximate until the first compaction measures the directory
+        self.size = 0
+        self._size_lock = threading.Lock()
+        self._compact_requested = threading.Event()
+        self._compactor: threading.Thread | None = None
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        filename = f"{quote(key, safe=':')}.bin"
+        return os.path.join(
+            f"{self.cache_directory}", digest[:2], digest[2:4], filename
+        )
 
-    async def get(self, key: str):
+    async def get(self, key: str) -> EncodableT | None:
         try:
-            path = f"{self.cache_directory}{key}.json"
-            with open(path, "r") as f:
+            with open(self._path(key), "rb") as f:
+                return self.codecs.decode(f.read())
+        except FileNotFoundError:
+            pass
+        # entries written before sharding are plain JSON files at the top level
+        try:
+            with open(f"{self.cache_directory}{key}.json", "r") as f:
                 return json.load(f)
         except FileNotFoundError:
             return None
 
-    async def set(self, key: str, value: object):
-        path = f"{self.cache_directory}{key}.json"
-        with open(path, "w") as f:
-            json.dump(value, f)
+    async def set(self, key: str, value: EncodableT, ttl: float | None = None):
+        # expired entries are skipped by Cache policies and later reclaimed by
+        # the compactor, so ttl needs no bookkeeping here
+        path = self._path(key)
+        data = self.codecs.encode(key, value)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            previous_size = os.path.getsize(path)
+        except FileNotFoundError:
+            previous_size = 0
+
+        # write to a temporary file and rename it into place, so readers never
+        # see a partially written entry
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        with self._size_lock:
+            self.size += len(data) - previous_size
+        self._ensure_compactor()
+        if self._exceeds_size():
+            self._compact_requested.set()
+
+    async def scan(self, pattern: str) -> AsyncIterator[str]:
+        seen = set()
+        for root, _, filenames in os.walk(f"{self.cache_directory}"):
+            for filename in filenames:
+                name, extension = os.path.splitext(filename)
+                if extension not in (".bin", ".json"):
+                    continue
+                key = unquote(name)
+                if key in seen:
+                    continue
+                seen.add(key)
+                if fnmatch.fnmatchcase(key, pattern):
+                    yield key
 
     def _exceeds_size(self) -> bool:
-        return asizeof.asizeof({}) / 1024.0 / 1024.0 == 0
+        return self.size > self.max_bytes
+
+    def _ensure_compactor(self) -> None:
+        if self._compactor is not None:
+            return
+        with self._size_lock:
+            if self._compactor is not None:
+                return
+            self._compactor = threading.Thread(
+                target=self._run_compactor, name="file-cache-compactor", daemon=True
+            )
+            self._compactor.start()
+
+    def _run_compactor(self) -> None:
+        while True:
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error("File cache compaction failed: %s", str(e))
+            self._compact_requested.wait(self.compact_interval)
+            self._compact_requested.clear()
+
+    def compact(self) -> int:
+        """
+        Remove expired entries and abandoned temporary files, then evict the
+        least recently written entries until the cache is back under its low
+        watermark. Returns the number of files removed.
+        """
+        now = time.time()
+        entries = []
+        removed = 0
+        for root, _, filenames in os.walk(f"{self.cache_directory}"):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                age = now - stat.st_mtime
+                is_stale_temp = filename.endswith(".tmp") and age > 3600
+                is_expired = self.max_age > 0 and age > self.max_age
+                if is_stale_temp or is_expired:
+                    removed += self._remove(path)
+                elif filename.endswith((".bin", ".json")):
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        if size > self.max_bytes:
+            target = self.max_bytes * self.LOW_WATERMARK
+            entries.sort()
+            for _, entry_size, path in entries:
+                if size <= target:
+                    break
+                if self._remove(path):
+                    size -= entry_size
+                    removed += 1
+
+        with self._size_lock:
+            self.size = size
+        if removed:
+            logger.info(
+                "File cache compaction removed %d files, %d bytes remain",
+                removed,
+                size,
+            )
+        return removed
+
+    def _remove(self, path: str) -> int:
+        try:
+            os.unlink(path)
+            return 1
+        except FileNotFoundError:
+            return 0
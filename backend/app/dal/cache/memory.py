@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any
+
+from minject import inject
+
+from lib.cache import CacheProvider, EncodableT
+from lib.codec import parse_codec_config
+
+
+logger = logging.getLogger(__name__)
+
+# hotspot and species lists change slowly, while recent observations can
+# still be updated by late checklists
+PREFIX_TTLS = {
+    "ebird:get_hotspots_by_region:": 3600.0,
+    "ebird:get_species_by_region:": 3600.0,
+    "ebird:get_species_observed_by_date_and_region:": 900.0,
+    "ebird:get_checklists_by_date_and_region:": 900.0,
+    "ebird:get_checklist_feed_by_date_and_region:": 900.0,
+}
+
+
+def _encoded_length(value: Any) -> int:
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+
+@inject.bind(
+    max_bytes=int(
+        os.getenv("BIRDSPOT_MEMORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+    ),
+    default_ttl=float(os.getenv("BIRDSPOT_MEMORY_CACHE_TTL", "300")),
+    # "prefix=seconds,..." adds to or overrides the defaults
+    prefix_ttls={
+        **PREFIX_TTLS,
+        **{
+            prefix: float(ttl)
+            for prefix, ttl in parse_codec_config(
+                os.getenv("BIRDSPOT_MEMORY_CACHE_PREFIX_TTLS", "")
+            ).items()
+        },
+    },
+)
+class MemoryCache(CacheProvider):
+    """
+    An in-process LRU cache bounded by the approximate size of its values in
+    bytes, with a TTL chosen by the longest matching key prefix.
+    """
+
+    # items of a long list that are encoded to estimate the size of all of
+    # them, since the lists eBird returns hold items of much the same size
+    SIZE_SAMPLES = 16
+    # parsed JSON takes about twice its encoded length in memory
+    OBJECT_OVERHEAD = 2
+
+    def __init__(
+        self, max_bytes: int, default_ttl: float, prefix_ttls: dict[str, float]
+    ):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        # longest prefixes first so the most specific one wins
+        self.prefix_ttls = sorted(
+            prefix_ttls.items(), key=lambda item: len(item[0]), reverse=True
+        )
+        # key -> (value, size in bytes, monotonic expiry)
+        self.entries: OrderedDict[str, tuple[EncodableT, int, float]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def ttl_for(self, key: str) -> float:
+        for prefix, ttl in self.prefix_ttls:
+            if key.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    async def get(self, key: str) -> EncodableT | None:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, _, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    async def set(self, key: str, value: EncodableT, ttl: float | None = None) -> None:
+        ttl = self.ttl_for(key) if ttl is None else min(ttl, self.ttl_for(key))
+        size = self.estimate_size(value) if ttl > 0 else 0
+        with self._lock:
+            self._remove(key)
+            if ttl <= 0 or size > self.max_bytes:
+                return
+            self.entries[key] = (value, size, time.monotonic() + ttl)
+            self.size += size
+            while self.size > self.max_bytes:
+                evicted_key, (_, evicted_size, _) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+                logger.debug("Evicted '%s' from memory cache", evicted_key)
+
+    @classmethod
+    def estimate_size(cls, value: EncodableT) -> int:
+        """
+        The approximate size of a value in memory, from the length of its JSON
+        encoding. Sets happen on the event loop, so this must stay cheap even
+        for the thousands of observations a region's prefetch caches.
+        """
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        if isinstance(value, memoryview):
+            return value.nbytes
+        return cls._encoded_size(value) * cls.OBJECT_OVERHEAD
+
+    @classmethod
+    def _encoded_size(cls, value: Any) -> int:
+        if isinstance(value, Mapping):
+            # cached values are often a small mapping around a long list
+            return 2 + sum(
+                len(str(key)) + 4 + cls._encoded_size(item)
+                for key, item in value.items()
+            )
+        if isinstance(value, list) and len(value) > cls.SIZE_SAMPLES:
+            step = len(value) / cls.SIZE_SAMPLES
+            sample = [value[int(index * step)] for index in range(cls.SIZE_SAMPLES)]
+            return _encoded_length(sample) * len(value) // cls.SIZE_SAMPLES
+        return _encoded_length(value)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    async def log_stats_forever(self, interval: float) -> None:
+        """
+        Log the hit, miss and eviction counts every interval seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            stats = self.stats()
+            lookups = stats["hits"] + stats["misses"]
+            logger.info(
+                "Memory cache: %d entries, %d bytes, %d hits, %d misses "
+                "(%.1f%% hit rate), %d evictions",
+                stats["entries"],
+                stats["bytes"],
+                stats["hits"],
+                stats["misses"],
+                100 * stats["hits"] / lookups if lookups else 0.0,
+                stats["evictions"],
+            )
+
+    def _remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
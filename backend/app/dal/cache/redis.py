@@ -1,22 +1,38 @@
 import logging
 import os
+from collections.abc import AsyncIterator, Mapping
 from minject import inject
 from redis.asyncio import Redis, ConnectionPool
-from redis.typing import EncodableT as RedisEncodableT
+from redis.exceptions import ResponseError
 from lib.cache import CacheProvider, EncodableT
+from lib.codec import CodecSelector, parse_codec_config
 
 
 logger = logging.getLogger(__name__)
 
 
+def _millis(ttl: float | None) -> int | None:
+    return int(ttl * 1000) if ttl is not None else None
+
+
 @inject.bind(
     host=os.getenv("REDISHOST"),
     port=os.getenv("REDISPORT"),
     username=os.getenv("REDISUSER") or "default",
     password=os.getenv("REDISPASSWORD"),
+    codecs=CodecSelector(
+        default=os.getenv("BIRDSPOT_CACHE_CODEC", "json+zlib"),
+        prefix_codecs=parse_codec_config(
+            os.getenv("BIRDSPOT_CACHE_PREFIX_CODECS", "")
+        ),
+    ),
 )
 class RedisCache(CacheProvider):
-    def __init__(self, host, port, username, password):
+    # keys per pipeline, so one huge batch doesn't monopolize a connection
+    BATCH_SIZE = 500
+
+    def __init__(self, host, port, username, password, codecs: CodecSelector):
+        self.codecs = codecs
         connection_pool = ConnectionPool(
             host=host,
             port=port,
@@ -24,25 +40,91 @@ class RedisCache(CacheProvider):
             password=password,
             socket_timeout=5,
             protocol=3,
+            decode_responses=False,
         )
-        self.redis = Redis(
-            connection_pool=connection_pool,
-            decode_responses=True,
-        )
+        self.redis = Redis(connection_pool=connection_pool)
         logger.info(
             "Attempting connection to %s:%s as user '%s'...", host, port, username
         )
 
-    async def get(self, key: str, value: type | None = None) -> EncodableT | None:
+    async def get(self, key: str) -> EncodableT | None:
         try:
-            return await self.redis.get(key)
-        except Exception:
-            data = await self.redis.json().get(key, ".")  # type: ignore - wrong b/c it doesn't know that we are using the async package
-            logger.debug("Redis JSON get for key '%s' returned: %s", key, data)
-            return data
-
-    async def set(self, key: str, value: EncodableT):
-        if isinstance(value, (bytes | bytearray | memoryview | str | int | float)):
-            await self.redis.set(key, value)
-        else:
-            await self.redis.json().set(key, "$", value)  # type: ignore - wrong b/c it doesn't know that we are using the async package
+            data = await self.redis.get(key)
+        except ResponseError:
+            return await self._migrate_json(key)
+        return self.codecs.decode(data) if data is not None else None
+
+    async def set(self, key: str, value: EncodableT, ttl: float | None = None):
+        await self.redis.set(key, self.codecs.encode(key, value), px=_millis(ttl))
+
+    async def get_many(self, keys: list[str]) -> dict[str, EncodableT | None]:
+        values: dict[str, EncodableT | None] = {}
+        for start in range(0, len(keys), self.BATCH_SIZE):
+            batch = keys[start : start + self.BATCH_SIZE]
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in batch:
+                    pipe.get(key)
+                results = await pipe.execute(raise_on_error=False)
+            for key, result in zip(batch, results):
+                if isinstance(result, ResponseError):
+                    values[key] = await self._migrate_json(key)
+                elif isinstance(result, Exception):
+                    raise result
+                elif result is not None:
+                    values[key] = self.codecs.decode(result)
+                else:
+                    values[key] = None
+        return values
+
+    async def set_many(
+        self, items: Mapping[str, EncodableT], ttl: float | None = None
+    ):
+        keys = list(items)
+        for start in range(0, len(keys), self.BATCH_SIZE):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys[start : start + self.BATCH_SIZE]:
+                    pipe.set(
+                        key, self.codecs.encode(key, items[key]), px=_millis(ttl)
+                    )
+                await pipe.execute()
+
+    async def incr(self, key: str) -> int:
+        # counters are stored as plain integers so INCR can update them
+        return await self.redis.incr(key)
+
+    async def get_counters(self, keys: list[str]) -> dict[str, int]:
+        values = await self.redis.mget(keys)
+        return {key: int(value or 0) for key, value in zip(keys, values)}
+
+    async def set_counter(self, key: str, value: int) -> None:
+        await self.redis.set(key, value)
+
+    async def scan(self, pattern: str) -> AsyncIterator[str]:
+        async for key in self.redis.scan_iter(match=pattern, count=self.BATCH_SIZE):
+            yield key.decode()
+
+    async def migrate(self, pattern: str) -> int:
+        """
+        Rewrite legacy RedisJSON documents matching the pattern as tagged
+        strings, returning how many keys were converted.
+        """
+        migrated = 0
+        async for key in self.redis.scan_iter(match=pattern, _type="ReJSON-RL"):
+            if await self._migrate_json(key.decode()) is not None:
+                migrated += 1
+        return migrated
+
+    async def _migrate_json(self, key: str) -> EncodableT | None:
+        """
+        Read a RedisJSON document written before values were tagged and store
+        it again in the tagged format, keeping its expiry.
+        """
+        data = await self.redis.json().get(key, ".")  # type: ignore - wrong b/c it doesn't know that we are using the async package
+        if data is None:
+            return None
+        ttl = await self.redis.pttl(key)
+        await self.redis.set(
+            key, self.codecs.encode(key, data), px=ttl if ttl > 0 else None
+        )
+        logger.debug("Migrated legacy JSON value for key '%s'", key)
+        return data
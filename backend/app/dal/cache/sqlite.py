@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator, Mapping
+from concurrent import futures
+from minject import inject
+
+from lib.cache import CacheProvider, EncodableT
+from lib.codec import CodecSelector, parse_codec_config
+
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_expires_at
+    ON cache (expires_at) WHERE expires_at IS NOT NULL;
+"""
+
+
+def _expires_at(ttl: float | None) -> float | None:
+    return time.time() + ttl if ttl is not None else None
+
+
+@inject.bind(
+    path=os.getenv("BIRDSPOT_SQLITE_CACHE_PATH", "./data/cache/cache.sqlite3"),
+    readers=int(os.getenv("BIRDSPOT_SQLITE_CACHE_READERS", "4")),
+    codecs=CodecSelector(
+        default=os.getenv("BIRDSPOT_CACHE_CODEC", "json+zlib"),
+        prefix_codecs=parse_codec_config(
+            os.getenv("BIRDSPOT_CACHE_PREFIX_CODECS", "")
+        ),
+    ),
+)
+class SQLiteCache(CacheProvider):
+    """
+    Stores every key in a single SQLite database in WAL mode, so readers never
+    block the writer. Reads run on a pool of threads with a connection each,
+    and writes from concurrent callers are committed together by a single
+    writer thread.
+    """
+
+    # keys per statement, well under SQLite's limit on bound parameters
+    BATCH_SIZE = 500
+    # how often the writer deletes expired rows, in seconds
+    PURGE_INTERVAL = 300
+
+    def __init__(self, path: str, readers: int, codecs: CodecSelector):
+        self.path = path
+        self.codecs = codecs
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+
+        self._local = threading.local()
+        self._readers = futures.ThreadPoolExecutor(
+            max_workers=readers, thread_name_prefix="sqlite-cache-reader"
+        )
+        # one writer thread, since SQLite only allows one writer at a time
+        self._writer = futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sqlite-cache-writer"
+        )
+        # rows waiting for the next write transaction, and the future that
+        # will commit them
+        self._pending: list[tuple[str, bytes, float | None]] = []
+        self._flush: futures.Future | None = None
+        self._pending_lock = threading.Lock()
+        self._purged_at = time.time()
+
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+        logger.info("Using SQLite cache at %s", path)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # WAL mode only needs to sync at checkpoints to stay consistent
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        The calling thread's connection, since connections can't be shared
+        between threads.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    async def get(self, key: str) -> EncodableT | None:
+        values = await self.get_many([key])
+        return values[key]
+
+    async def set(self, key: str, value: EncodableT, ttl: float | None = None):
+        await self.set_many({key: value}, ttl)
+
+    async def get_many(self, keys: list[str]) -> dict[str, EncodableT | None]:
+        rows = await asyncio.wrap_future(self._readers.submit(self._read, keys))
+        return {
+            key: self.codecs.decode(rows[key]) if key in rows else None
+            for key in keys
+        }
+
+    async def set_many(
+        self, items: Mapping[str, EncodableT], ttl: float | None = None
+    ):
+        expires_at = _expires_at(ttl)
+        rows = [
+            (key, self.codecs.encode(key, value), expires_at)
+            for key, value in items.items()
+        ]
+        if rows:
+            await asyncio.wrap_future(self._enqueue(rows))
+
+    async def incr(self, key: str) -> int:
+        return await asyncio.wrap_future(self._writer.submit(self._incr, key))
+
+    async def scan(self, pattern: str) -> AsyncIterator[str]:
+        after = ""
+        while True:
+            keys = await asyncio.wrap_future(
+                self._readers.submit(self._scan_page, pattern, after)
+            )
+            for key in keys:
+                yield key
+            if len(keys) < self.BATCH_SIZE:
+                return
+            after = keys[-1]
+
+    def _read(self, keys: list[str]) -> dict[str, bytes]:
+        connection = self._connection()
+        now = time.time()
+        rows = {}
+        for start in range(0, len(keys), self.BATCH_SIZE):
+            batch = keys[start : start + self.BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            cursor = connection.execute(
+                f"SELECT key, value FROM cache WHERE key IN ({placeholders}) "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (*batch, now),
+            )
+            rows.update(cursor.fetchall())
+        return rows
+
+    def _scan_page(self, pattern: str, after: str) -> list[str]:
+        cursor = self._connection().execute(
+            "SELECT key FROM cache WHERE key > ? AND key GLOB ? "
+            "AND (expires_at IS NULL OR expires_at > ?) ORDER BY key LIMIT ?",
+            (after, pattern, time.time(), self.BATCH_SIZE),
+        )
+        return [key for (key,) in cursor.fetchall()]
+
+    def _enqueue(
+        self, rows: list[tuple[str, bytes, float | None]]
+    ) -> futures.Future:
+        """
+        Add rows to the next write transaction, returning the future that
+        completes once they are committed. Rows queued while a transaction is
+        being written are committed together in the one after it.
+        """
+        with self._pending_lock:
+            self._pending.extend(rows)
+            if self._flush is None:
+                self._flush = self._writer.submit(self._write_pending)
+            return self._flush
+
+    def _write_pending(self) -> None:
+        with self._pending_lock:
+            rows, self._pending = self._pending, []
+            self._flush = None
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+        logger.debug("Wrote %d rows to the SQLite cache", len(rows))
+        self._purge_expired()
+
+    def _incr(self, key: str) -> int:
+        connection = self._connection()
+        with connection:
+            # take the write lock before reading, so other processes can't
+            # increment the counter in between
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            current = self.codecs.decode(row[0]) if row else 0
+            value = int(current) + 1  # type: ignore[arg-type]
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) "
+                "VALUES (?, ?, NULL)",
+                (key, self.codecs.encode(key, value)),
+            )
+        return value
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        if now - self._purged_at < self.PURGE_INTERVAL:
+            return
+        self._purged_at = now
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute(
+                "DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (now,),
+            )
+        if cursor.rowcount:
+            logger.info(
+                "Purged %d expired rows from the SQLite cache", cursor.rowcount
+            )
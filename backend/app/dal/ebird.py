@@ -1,43 +1,103 @@
+import asyncio
 import logging
+import os
+import threading
+import weakref
 
-import requests
+import httpx
+from lib.rate_limit import RateLimiter
 from minject import inject
 
 
 logger = logging.getLogger(__name__)
 
 
-@inject.bind(session=requests.Session(), base_url="https://api.ebird.org/v2/")
+@inject.bind(
+    base_url="https://api.ebird.org/v2/",
+    max_connections=int(os.getenv("BIRDSPOT_EBIRD_MAX_CONNECTIONS", "32")),
+    max_keepalive_connections=int(
+        os.getenv("BIRDSPOT_EBIRD_MAX_KEEPALIVE_CONNECTIONS", "16")
+    ),
+    keepalive_expiry=float(os.getenv("BIRDSPOT_EBIRD_KEEPALIVE_EXPIRY", "30")),
+    timeout=float(os.getenv("BIRDSPOT_EBIRD_TIMEOUT", "30")),
+    connect_timeout=float(os.getenv("BIRDSPOT_EBIRD_CONNECT_TIMEOUT", "10")),
+    # requests per second and burst size allowed for each eBird API key
+    rate_limiter=RateLimiter(
+        rate=float(os.getenv("BIRDSPOT_EBIRD_RATE_LIMIT", "10")),
+        burst=int(os.getenv("BIRDSPOT_EBIRD_RATE_BURST", "10")),
+    ),
+)
 class EBirdDAL:
-    def __init__(self, session: requests.Session, base_url: str):
-        self.session = session
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        timeout: float,
+        connect_timeout: float,
+        rate_limiter: RateLimiter,
+    ):
         self.base_url = base_url
+        self.rate_limiter = rate_limiter
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        # httpx connection pools are tied to the event loop that opened them,
+        # so keep one pooled client per running loop
+        self._clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, httpx.AsyncClient
+        ] = weakref.WeakKeyDictionary()
+        self._clients_lock = threading.Lock()
 
-    def make_authenticated_request(
+    @property
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            client = self._clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+                self._clients[loop] = client
+            return client
+
+    async def close(self) -> None:
+        """
+        Close the pooled client belonging to the running event loop
+        """
+        with self._clients_lock:
+            client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    async def make_authenticated_request(
         self, url: str, auth: str, method: str = "GET", **kwargs
-    ) -> requests.Response:
+    ) -> httpx.Response:
         headers = {"X-eBirdApiToken": auth}
+        await self.rate_limiter.acquire(auth)
         try:
             logger.debug("Making %s request to: %s", method, url)
-            response = self.session.request(
-                method=method, url=url, headers=headers, timeout=30, **kwargs
+            response = await self.client.request(
+                method=method, url=url, headers=headers, **kwargs
             )
             logger.debug("Request completed with status code: %d", response.status_code)
             return response
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error("Request failed: %s", e)
             raise
 
-    def get(self, endpoint: str, auth: str, **kwargs) -> requests.Response:
+    async def get(self, endpoint: str, auth: str, **kwargs) -> httpx.Response:
         """
         Make a GET request to the service
         """
         url = f"{self.base_url}{endpoint}"
-        return self.make_authenticated_request(url, auth, "GET", **kwargs)
+        return await self.make_authenticated_request(url, auth, "GET", **kwargs)
 
-    def post(self, endpoint: str, auth: str, **kwargs) -> requests.Response:
+    async def post(self, endpoint: str, auth: str, **kwargs) -> httpx.Response:
         """
         Make a POST request to the service
         """
         url = f"{self.base_url}{endpoint}"
-        return self.make_authenticated_request(url, auth, "POST", **kwargs)
+        return await self.make_authenticated_request(url, auth, "POST", **kwargs)
@@ -0,0 +1,150 @@
+import os
+from collections.abc import Iterator
+from typing import cast
+from minject import inject
+from redis import Redis
+
+from lib.job_store import JobStore, decode_cursor, encode_cursor
+
+
+@inject.bind(
+    host=os.getenv("REDISHOST"),
+    port=os.getenv("REDISPORT"),
+    username=os.getenv("REDISUSER") or "default",
+    password=os.getenv("REDISPASSWORD"),
+)
+class RedisJobStore(JobStore):
+    """
+    Keeps jobs in Redis, so web servers and workers on different nodes see
+    the same jobs. Each job is a string, indexed by sorted sets of job ids
+    scored by creation time, one per owner and one overall.
+    """
+
+    PREFIX = "birdspot:job"
+    # jobs per MGET when reading many
+    BATCH_SIZE = 500
+
+    def __init__(self, host, port, username, password):
+        # a synchronous client, since jobs are saved from job threads' done
+        # callbacks as well as request handlers
+        self.redis = Redis(
+            host=host,
+            port=port,
+            username=username,
+            password=password,
+            socket_timeout=5,
+            decode_responses=True,
+        )
+        # results and checkpoints are binary
+        self.results = Redis(
+            host=host,
+            port=port,
+            username=username,
+            password=password,
+            socket_timeout=5,
+        )
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.PREFIX}:{job_id}"
+
+    def _owner_index(self, owner: str) -> str:
+        return f"{self.PREFIX}s:owner:{owner}"
+
+    @property
+    def _created_index(self) -> str:
+        return f"{self.PREFIX}s:created"
+
+    def _hash_key(self, content_hash: str) -> str:
+        return f"{self.PREFIX}s:hash:{content_hash}"
+
+    def _result_key(self, job_id: str) -> str:
+        return f"{self.PREFIX}:{job_id}:result"
+
+    def _checkpoint_key(self, job_id: str) -> str:
+        return f"{self.PREFIX}:{job_id}:checkpoint"
+
+    def save(self, job_id: str, owner: str, created_at: float, data: str) -> None:
+        with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key(job_id), data)
+            # nx keeps the original creation time when a job is saved again
+            pipe.zadd(self._owner_index(owner), {job_id: created_at}, nx=True)
+            pipe.zadd(self._created_index, {job_id: created_at}, nx=True)
+            pipe.execute()
+
+    def load(self, job_id: str) -> str | None:
+        return cast(str | None, self.redis.get(self._key(job_id)))
+
+    def list_for_owner(
+        self, owner: str, limit: int | None = None, cursor: str | None = None
+    ) -> tuple[list[str], str | None]:
+        index = self._owner_index(owner)
+        max_score: float | str = "+inf"
+        skip_ids: set[str] = set()
+        count = limit + 1 if limit is not None else None
+        if cursor is not None:
+            created_at, after_id = decode_cursor(cursor)
+            max_score = created_at
+            # jobs created at the cursor's own time sort by id, descending,
+            # so the ones up to and including the cursor were already listed
+            tied = cast(
+                list[str], self.redis.zrangebyscore(index, created_at, created_at)
+            )
+            skip_ids = {job_id for job_id in tied if job_id >= after_id}
+            if count is not None:
+                count += len(skip_ids)
+
+        entries = cast(
+            list[tuple[str, float]],
+            self.redis.zrevrangebyscore(
+                index,
+                max_score,
+                "-inf",
+                start=0 if count is not None else None,
+                num=count,
+                withscores=True,
+            ),
+        )
+        entries = [entry for entry in entries if entry[0] not in skip_ids]
+
+        next_cursor = None
+        if limit is not None and len(entries) > limit:
+            entries = entries[:limit]
+            job_id, created_at = entries[-1]
+            next_cursor = encode_cursor(created_at, job_id)
+        return self._load_many([job_id for job_id, _ in entries]), next_cursor
+
+    def list_created_since(self, since: float) -> Iterator[str]:
+        job_ids = cast(
+            list[str], self.redis.zrangebyscore(self._created_index, since, "+inf")
+        )
+        for start in range(0, len(job_ids), self.BATCH_SIZE):
+            yield from self._load_many(job_ids[start : start + self.BATCH_SIZE])
+
+    def save_result(self, job_id: str, data: bytes) -> None:
+        self.results.set(self._result_key(job_id), data)
+
+    def load_result(self, job_id: str) -> bytes | None:
+        return cast(bytes | None, self.results.get(self._result_key(job_id)))
+
+    def save_checkpoint(self, job_id: str, data: bytes) -> None:
+        self.results.set(self._checkpoint_key(job_id), data)
+
+    def load_checkpoint(self, job_id: str) -> bytes | None:
+        return cast(bytes | None, self.results.get(self._checkpoint_key(job_id)))
+
+    def delete_checkpoint(self, job_id: str) -> None:
+        self.results.delete(self._checkpoint_key(job_id))
+
+    def set_job_for_hash(self, content_hash: str, job_id: str) -> None:
+        self.redis.set(self._hash_key(content_hash), job_id)
+
+    def get_job_for_hash(self, content_hash: str) -> str | None:
+        return cast(str | None, self.redis.get(self._hash_key(content_hash)))
+
+    def _load_many(self, job_ids: list[str]) -> list[str]:
+        if not job_ids:
+            return []
+        values = cast(
+            list[str | None], self.redis.mget([self._key(job_id) for job_id in job_ids])
+        )
+        return [value for value in values if value is not None]
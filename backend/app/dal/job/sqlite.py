@@ -0,0 +1,165 @@
+import logging
+import os
+import sqlite3
+import threading
+from collections.abc import Iterator
+from minject import inject
+
+from lib.job_store import JobStore, decode_cursor, encode_cursor
+
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_owner_created_at
+    ON jobs (owner, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+CREATE TABLE IF NOT EXISTS job_results (
+    id TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_checkpoints (
+    id TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_hashes (
+    content_hash TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+@inject.bind(
+    path=os.getenv("BIRDSPOT_JOB_DATABASE")
+    or f"{os.getenv('BIRDSPOT_JOB_DIRECTORY') or './'}jobs.sqlite3",
+)
+class SQLiteJobStore(JobStore):
+    """
+    Keeps jobs in a SQLite database in WAL mode, so listing a user's jobs
+    reads one page of the owner index instead of every job.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if directory := os.path.dirname(path):
+            os.makedirs(directory, exist_ok=True)
+        # jobs are saved from the request handlers and the job threads alike,
+        # and connections can't be shared between threads
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def save(self, job_id: str, owner: str, created_at: float, data: str) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, owner, created_at, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET data = excluded.data",
+                (job_id, owner, created_at, data),
+            )
+
+    def load(self, job_id: str) -> str | None:
+        row = (
+            self._connection()
+            .execute("SELECT data FROM jobs WHERE id = ?", (job_id,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def list_for_owner(
+        self, owner: str, limit: int | None = None, cursor: str | None = None
+    ) -> tuple[list[str], str | None]:
+        query = "SELECT id, created_at, data FROM jobs WHERE owner = ?"
+        parameters: list = [owner]
+        if cursor is not None:
+            query += " AND (created_at, id) < (?, ?)"
+            parameters.extend(decode_cursor(cursor))
+        query += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            # one extra row tells whether there is another page
+            query += " LIMIT ?"
+            parameters.append(limit + 1)
+        rows = self._connection().execute(query, parameters).fetchall()
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            job_id, created_at, _ = rows[-1]
+            next_cursor = encode_cursor(created_at, job_id)
+        return [data for _, _, data in rows], next_cursor
+
+    def list_created_since(self, since: float) -> Iterator[str]:
+        cursor = self._connection().execute(
+            "SELECT data FROM jobs WHERE created_at >= ? ORDER BY created_at",
+            (since,),
+        )
+        for (data,) in cursor:
+            yield data
+
+    def save_result(self, job_id: str, data: bytes) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO job_results (id, data) VALUES (?, ?)",
+                (job_id, data),
+            )
+
+    def load_result(self, job_id: str) -> bytes | None:
+        row = (
+            self._connection()
+            .execute("SELECT data FROM job_results WHERE id = ?", (job_id,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def save_checkpoint(self, job_id: str, data: bytes) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO job_checkpoints (id, data) VALUES (?, ?)",
+                (job_id, data),
+            )
+
+    def load_checkpoint(self, job_id: str) -> bytes | None:
+        row = (
+            self._connection()
+            .execute("SELECT data FROM job_checkpoints WHERE id = ?", (job_id,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def delete_checkpoint(self, job_id: str) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM job_checkpoints WHERE id = ?", (job_id,))
+
+    def set_job_for_hash(self, content_hash: str, job_id: str) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO job_hashes (content_hash, job_id) VALUES (?, ?) "
+                "ON CONFLICT (content_hash) DO UPDATE SET job_id = excluded.job_id",
+                (content_hash, job_id),
+            )
+
+    def get_job_for_hash(self, content_hash: str) -> str | None:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT job_id FROM job_hashes WHERE content_hash = ?",
+                (content_hash,),
+            )
+            .fetchone()
+        )
+        return row[0] if row else None
@@ -0,0 +1,45 @@
+import os
+import threading
+import time
+from typing import Any
+from minject import inject
+
+from lib.job_events import JobEvents
+
+
+@inject.bind(
+    ttl=float(os.getenv("BIRDSPOT_JOB_EVENTS_TTL", "3600")),
+)
+class MemoryJobEvents(JobEvents):
+    """
+    Job events kept in process, for when jobs run in the web server.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # job id -> (version, event, monotonic expiry)
+        self._events: dict[str, tuple[int, dict[str, Any], float]] = {}
+        # jobs publish from the job worker's thread
+        self._lock = threading.Lock()
+
+    def publish(self, job_id: str, event: dict[str, Any]) -> int:
+        now = time.monotonic()
+        with self._lock:
+            previous = self._events.get(job_id)
+            version = previous[0] + 1 if previous else 1
+            self._events[job_id] = (version, event, now + self.ttl)
+            if previous is None:
+                self._purge(now)
+        return version
+
+    def latest(self, job_id: str) -> tuple[int, dict[str, Any]] | None:
+        with self._lock:
+            entry = self._events.get(job_id)
+        if entry is None or entry[2] <= time.monotonic():
+            return None
+        return entry[0], entry[1]
+
+    def _purge(self, now: float) -> None:
+        for job_id, (_, _, expires_at) in list(self._events.items()):
+            if expires_at <= now:
+                del self._events[job_id]
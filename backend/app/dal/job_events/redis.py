@@ -0,0 +1,55 @@
+import json
+import os
+from typing import Any, cast
+from minject import inject
+from redis import Redis
+
+from lib.job_events import JobEvents
+
+
+@inject.bind(
+    host=os.getenv("REDISHOST"),
+    port=os.getenv("REDISPORT"),
+    username=os.getenv("REDISUSER") or "default",
+    password=os.getenv("REDISPASSWORD"),
+    ttl=float(os.getenv("BIRDSPOT_JOB_EVENTS_TTL", "3600")),
+)
+class RedisJobEvents(JobEvents):
+    """
+    Job events kept in Redis, so web servers can stream the progress of jobs
+    running on worker nodes. Each job's event is a hash of its version and
+    its JSON encoded event.
+    """
+
+    PREFIX = "birdspot:job-events"
+
+    def __init__(self, host, port, username, password, ttl: float):
+        self.ttl = ttl
+        # synchronous, like RedisJobStore, since jobs publish from whichever
+        # thread and loop they run on
+        self.redis = Redis(
+            host=host,
+            port=port,
+            username=username,
+            password=password,
+            socket_timeout=5,
+            decode_responses=True,
+        )
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.PREFIX}:{job_id}"
+
+    def publish(self, job_id: str, event: dict[str, Any]) -> int:
+        key = self._key(job_id)
+        with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(key, "version", 1)
+            pipe.hset(key, "event", json.dumps(event))
+            pipe.expire(key, int(self.ttl))
+            version, *_ = pipe.execute()
+        return int(version)
+
+    def latest(self, job_id: str) -> tuple[int, dict[str, Any]] | None:
+        entry = cast(dict[str, str], self.redis.hgetall(self._key(job_id)))
+        if "event" not in entry:
+            return None
+        return int(entry["version"]), json.loads(entry["event"])
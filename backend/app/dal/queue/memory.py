@@ -0,0 +1,72 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from minject import inject
+
+from lib.job_queue import JobQueue, Lease
+
+
+@inject.bind(
+    lease_seconds=float(os.getenv("BIRDSPOT_JOB_LEASE_SECONDS", "60")),
+)
+class MemoryJobQueue(JobQueue):
+    """
+    An in-process stand-in for RedisJobQueue, with the same lease semantics,
+    for running the web server and its job worker in one process.
+    """
+
+    # how often a blocked claim checks for new jobs
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, lease_seconds: float):
+        self.lease_seconds = lease_seconds
+        self._sequence = itertools.count()
+        # (priority, sequence, lease) waiting to be claimed
+        self._waiting: list[tuple[int, int, Lease]] = []
+        # message id -> (lease, monotonic expiry)
+        self._leased: dict[str, tuple[Lease, float]] = {}
+        self._lock = threading.Lock()
+
+    async def enqueue(self, job_id: str, priority: int = 0) -> None:
+        sequence = next(self._sequence)
+        lease = Lease(str(sequence), job_id, priority)
+        with self._lock:
+            heapq.heappush(self._waiting, (priority, sequence, lease))
+
+    async def claim(self, consumer: str, timeout: float) -> Lease | None:
+        deadline = time.monotonic() + timeout
+        while True:
+            if (lease := self._claim_now()) is not None:
+                return lease
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    def _claim_now(self) -> Lease | None:
+        now = time.monotonic()
+        with self._lock:
+            for message_id, (lease, expires_at) in list(self._leased.items()):
+                if expires_at <= now:
+                    # the consumer holding it stopped heartbeating
+                    self._leased[message_id] = (lease, now + self.lease_seconds)
+                    return lease
+            if not self._waiting:
+                return None
+            _, _, lease = heapq.heappop(self._waiting)
+            self._leased[lease.message_id] = (lease, now + self.lease_seconds)
+            return lease
+
+    async def heartbeat(self, consumer: str, lease: Lease) -> None:
+        with self._lock:
+            if lease.message_id in self._leased:
+                self._leased[lease.message_id] = (
+                    lease,
+                    time.monotonic() + self.lease_seconds,
+                )
+
+    async def ack(self, lease: Lease) -> None:
+        with self._lock:
+            self._leased.pop(lease.message_id, None)
@@ -0,0 +1,110 @@
+import logging
+import os
+from minject import inject
+from redis.asyncio import Redis, ConnectionPool
+from redis.exceptions import ResponseError
+
+from lib.job_queue import JobQueue, Lease
+
+
+logger = logging.getLogger(__name__)
+
+
+@inject.bind(
+    host=os.getenv("REDISHOST"),
+    port=os.getenv("REDISPORT"),
+    username=os.getenv("REDISUSER") or "default",
+    password=os.getenv("REDISPASSWORD"),
+    lease_seconds=float(os.getenv("BIRDSPOT_JOB_LEASE_SECONDS", "60")),
+)
+class RedisJobQueue(JobQueue):
+    """
+    A job queue on a Redis stream read through a consumer group. Claimed jobs
+    stay in the group's pending list until acknowledged, and jobs idle there
+    for longer than a lease are claimed again by the next consumer.
+    """
+
+    STREAM = "birdspot:jobs"
+    GROUP = "workers"
+    # the longest a claim blocks in one call, well under the socket timeout
+    MAX_BLOCK_SECONDS = 10
+
+    def __init__(self, host, port, username, password, lease_seconds: float):
+        self.lease_millis = int(lease_seconds * 1000)
+        connection_pool = ConnectionPool(
+            host=host,
+            port=port,
+            username=username,
+            password=password,
+            socket_timeout=self.MAX_BLOCK_SECONDS + 5,
+            decode_responses=True,
+        )
+        self.redis = Redis(connection_pool=connection_pool)
+        self._group_created = False
+
+    async def _ensure_group(self) -> None:
+        if self._group_created:
+            return
+        try:
+            await self.redis.xgroup_create(
+                self.STREAM, self.GROUP, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_created = True
+
+    async def enqueue(self, job_id: str, priority: int = 0) -> None:
+        await self._ensure_group()
+        await self.redis.xadd(self.STREAM, {"job_id": job_id, "priority": priority})
+
+    async def claim(self, consumer: str, timeout: float) -> Lease | None:
+        await self._ensure_group()
+        # redeliver jobs whose consumer stopped heartbeating first
+        _, messages, *_ = await self.redis.xautoclaim(
+            self.STREAM,
+            self.GROUP,
+            consumer,
+            min_idle_time=self.lease_millis,
+            start_id="0-0",
+            count=1,
+        )
+        if messages:
+            message_id, fields = messages[0]
+            if fields:
+                logger.info("Redelivering job %s to %s", fields["job_id"], consumer)
+                return self._lease(message_id, fields)
+            # older Redis versions still list messages deleted from the stream
+            await self.redis.xack(self.STREAM, self.GROUP, message_id)
+
+        response = await self.redis.xreadgroup(
+            self.GROUP,
+            consumer,
+            {self.STREAM: ">"},
+            count=1,
+            block=int(min(timeout, self.MAX_BLOCK_SECONDS) * 1000),
+        )
+        for _, stream_messages in response or []:
+            for message_id, fields in stream_messages:
+                return self._lease(message_id, fields)
+        return None
+
+    def _lease(self, message_id: str, fields: dict[str, str]) -> Lease:
+        return Lease(message_id, fields["job_id"], int(fields.get("priority", 0)))
+
+    async def heartbeat(self, consumer: str, lease: Lease) -> None:
+        # claiming a message resets its idle time
+        await self.redis.xclaim(
+            self.STREAM,
+            self.GROUP,
+            consumer,
+            min_idle_time=0,
+            message_ids=[lease.message_id],
+            justid=True,
+        )
+
+    async def ack(self, lease: Lease) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(self.STREAM, self.GROUP, lease.message_id)
+            pipe.xdel(self.STREAM, lease.message_id)
+            await pipe.execute()
@@ -1,18 +1,47 @@
+import asyncio
 from collections import defaultdict
+from collections.abc import Awaitable, Callable
 import datetime
+import functools
+import logging
 import math
+import os
 from typing import Any
 
 from app.manager.ebird import EBirdManager
-from app.model.ebird_types import EBirdTaxon
+from app.model.ebird_types import EBirdHotspot, EBirdTaxon
+from lib.progress import (
+    advance,
+    get_checkpoint,
+    set_checkpoint,
+    set_partial,
+    set_phase,
+)
+from lib.top_k import TopK
 from minject import inject
 
 
+logger = logging.getLogger(__name__)
+
+type HotspotDateFetcher = Callable[[str, datetime.date], Awaitable[tuple[list, list]]]
+
+
 @inject.bind(
     ebird_manager=inject.reference(EBirdManager),
 )
 class BirdSpotManager:
     SCALING_FACTOR = 2.430016  # sum of 0.6^i for i from 0 to 6
+    # upper bound on concurrent hotspot/date fetches; jobs may ask for fewer
+    MAX_CONCURRENCY = int(os.getenv("BIRDSPOT_SCORE_CONCURRENCY", "8"))
+    # "auto", "hotspot" or "region"
+    FETCH_STRATEGY = os.getenv("BIRDSPOT_FETCH_STRATEGY", "auto")
+    REGION_FETCH_MIN_HOTSPOTS = int(
+        os.getenv("BIRDSPOT_REGION_FETCH_MIN_HOTSPOTS", "4")
+    )
+    # how many of the best hotspots a region's scores keep, 0 for all of them
+    TOP_K = int(os.getenv("BIRDSPOT_SCORE_TOP_K", "50")) or None
+    # the checkpoint of the best hotspots scored so far
+    TOP_CHECKPOINT_KEY = "top"
 
     def __init__(self, ebird_manager: EBirdManager):
         self.ebird_manager = ebird_manager
@@ -25,9 +54,10 @@ class BirdSpotManager:
         except (ValueError, TypeError):
             return None
 
-    def get_missing_species(
-        self, possible_species: list[EBirdTaxon], species: list
-    ) -> list:
+    def get_seen_taxa(self, species: list) -> set[str]:
+        """
+        The normalized taxon orders of a life list's species.
+        """
         try:
             seen_species = set()
             for s in species:
@@ -44,7 +74,12 @@ class BirdSpotManager:
                             seen_species.add(normalized)
         except Exception:
             seen_species = set()
+        return seen_species
 
+    def get_missing_species(
+        self, possible_species: list[EBirdTaxon], species: list
+    ) -> list:
+        seen_species = self.get_seen_taxa(species)
         result = []
         for s in possible_species:
             try:
@@ -62,8 +97,15 @@ class BirdSpotManager:
         return result
 
     async def get_scores_for_region(
-        self, region_code: str, life_list: list, life_list_name: str, target_date: datetime.date, auth: str
+        self,
+        region_code: str,
+        life_list: list,
+        life_list_name: str,
+        target_date: datetime.date,
+        auth: str,
+        max_concurrency: int | None = None,
     ):
+        set_phase("species")
         possible_species = await self.ebird_manager.get_species_by_region(
             region_code, auth
         )
@@ -71,52 +113,298 @@ class BirdSpotManager:
         missing_species_codes = {ms.get("speciesCode") for ms in missing_species}
 
         # get hotspots in a region
+        set_phase("hotspots")
         hotspots = await self.ebird_manager.get_hotspots_by_region(region_code, auth)
         # end
 
         dates = [target_date - datetime.timedelta(days=i) for i in range(1, 8)]
 
-        # get recent birds in each hotspot on date
-        hotspot_scores = []
-        for hotspot in hotspots:
-            species_map = defaultdict(list)
-            checklists_map = {}
-            for date in dates:
-                loc_id = hotspot.get("locId")
-                if loc_id is None:
-                    raise RuntimeError("Something went wrong (Cailyn!)")
-                species = (
-                    await self.ebird_manager.get_species_observed_by_date_and_region(
-                        loc_id, date, auth
-                    )
+        # a job resumed after a restart keeps the hotspots it already scored.
+        # Only their scores are checkpointed, along with the full results of
+        # the best ones, since the others can't make it into the top anymore
+        checkpointed = {
+            index
+            for index, hotspot in enumerate(hotspots)
+            if get_checkpoint(self._checkpoint_key(hotspot)) is not None
+        }
+        remaining = [
+            hotspot
+            for index, hotspot in enumerate(hotspots)
+            if index not in checkpointed
+        ]
+
+        # get recent birds in each hotspot on date, bounding how many
+        # hotspot/date fetches are in flight at once
+        set_phase("prefetching", hotspots=len(hotspots))
+        semaphore = asyncio.Semaphore(self._concurrency_limit(max_concurrency))
+        fetch = await self._make_fetcher(
+            region_code, remaining, dates, auth, semaphore
+        )
+        set_phase(
+            "scoring",
+            hotspots_fetched=len(checkpointed),
+            hotspots_scored=len(checkpointed),
+        )
+        # ranked as hotspots finish, so the best so far can be shown early,
+        # with ties kept in the region's hotspot order
+        top = TopK(
+            self.TOP_K,
+            key=lambda hotspot_score: hotspot_score.get("birdspot_score"),
+        )
+        indexes = {
+            hotspot.get("locId"): index for index, hotspot in enumerate(hotspots)
+        }
+        for hotspot_score in get_checkpoint(self.TOP_CHECKPOINT_KEY) or []:
+            index = indexes.get(hotspot_score["location"].get("locId"))
+            # failed hotspots in the top are scored again instead
+            if index in checkpointed:
+                top.push(hotspot_score, order=index)
+
+        async def score(index: int, hotspot: EBirdHotspot):
+            if index in checkpointed:
+                return
+            hotspot_score = await self._score_hotspot(
+                hotspot, dates, missing_species_codes, target_date, fetch
+            )
+            kept = top.push(hotspot_score, order=index)
+            # failures are retried when resuming
+            if "error" not in hotspot_score:
+                if kept:
+                    set_checkpoint(self.TOP_CHECKPOINT_KEY, top.items())
+                set_checkpoint(
+                    self._checkpoint_key(hotspot), hotspot_score["birdspot_score"]
                 )
+            if kept:
+                set_partial(top.items)
+
+        await asyncio.gather(
+            *(score(index, hotspot) for index, hotspot in enumerate(hotspots))
+        )
+        return top.items()
+
+    async def warm_region(
+        self,
+        region_code: str,
+        dates: list[datetime.date],
+        auth: str,
+        max_concurrency: int | None = None,
+    ) -> int:
+        """
+        Fetch everything scoring the region for the given dates would, without
+        scoring it, so later jobs are served from the cache. Returns how many
+        hotspots were fetched.
+        """
+        await self.ebird_manager.get_species_by_region(region_code, auth)
+        hotspots = await self.ebird_manager.get_hotspots_by_region(region_code, auth)
+        semaphore = asyncio.Semaphore(self._concurrency_limit(max_concurrency))
+        fetch = await self._make_fetcher(region_code, hotspots, dates, auth, semaphore)
+        loc_ids = [h.get("locId") for h in hotspots if h.get("locId") is not None]
+        results = await asyncio.gather(
+            *(fetch(loc_id, date) for loc_id in loc_ids for date in dates),
+            return_exceptions=True,
+        )
+        if failures := sum(isinstance(result, Exception) for result in results):
+            logger.warning(
+                "Failed %d of %d fetches while warming %s",
+                failures,
+                len(results),
+                region_code,
+            )
+        return len(loc_ids)
+
+    def _checkpoint_key(self, hotspot: EBirdHotspot) -> str:
+        return f"hotspot:{hotspot.get('locId')}"
+
+    def _concurrency_limit(self, max_concurrency: int | None) -> int:
+        if max_concurrency is None:
+            return self.MAX_CONCURRENCY
+        return max(1, min(max_concurrency, self.MAX_CONCURRENCY))
+
+    def _choose_fetch_strategy(self, hotspot_count: int) -> str:
+        if self.FETCH_STRATEGY != "auto":
+            return self.FETCH_STRATEGY
+        # per hotspot fetching costs two requests per hotspot per day, while
+        # the region feed costs one request per day plus observations for the
+        # hotspots that were actually birded
+        if hotspot_count >= self.REGION_FETCH_MIN_HOTSPOTS:
+            return "region"
+        return "hotspot"
+
+    async def _make_fetcher(
+        self,
+        region_code: str,
+        hotspots: list[EBirdHotspot],
+        dates: list[datetime.date],
+        auth: str,
+        semaphore: asyncio.Semaphore,
+    ) -> HotspotDateFetcher:
+        loc_ids = [h.get("locId") for h in hotspots if h.get("locId") is not None]
+        if self._choose_fetch_strategy(len(hotspots)) == "region":
+            try:
+                feeds = await self._get_region_checklist_feeds(
+                    region_code, dates, auth, semaphore
+                )
+            except Exception as e:
+                logger.warning(
+                    "Falling back to per hotspot fetching for %s: %s",
+                    region_code,
+                    str(e),
+                )
+            else:
+                # only the hotspot/dates with checklists need observations
+                await self.ebird_manager.prefetch_by_date_and_region(
+                    (
+                        (loc_id, date)
+                        for date, (checklists_by_loc, _) in feeds.items()
+                        for loc_id in loc_ids
+                        if loc_id in checklists_by_loc
+                    ),
+                    auth,
+                    include_checklists=False,
+                    parent_region=region_code,
+                )
+                return functools.partial(
+                    self._fetch_hotspot_date_from_feed,
+                    feeds=feeds,
+                    region_code=region_code,
+                    auth=auth,
+                    semaphore=semaphore,
+                )
+
+        await self.ebird_manager.prefetch_by_date_and_region(
+            ((loc_id, date) for loc_id in loc_ids for date in dates),
+            auth,
+            parent_region=region_code,
+        )
+        return functools.partial(
+            self._fetch_hotspot_date,
+            region_code=region_code,
+            auth=auth,
+            semaphore=semaphore,
+        )
+
+    async def _get_region_checklist_feeds(
+        self,
+        region_code: str,
+        dates: list[datetime.date],
+        auth: str,
+        semaphore: asyncio.Semaphore,
+    ) -> dict[datetime.date, tuple[dict[str, list], bool]]:
+        """
+        Fetch the region's checklist feed for each date and split it by
+        locId. Each date also records whether the feed may be truncated.
+        """
+
+        async def get_feed(date: datetime.date):
+            async with semaphore:
+                return await self.ebird_manager.get_checklist_feed_by_date_and_region(
+                    region_code, date, auth
+                )
+
+        feeds = await asyncio.gather(*(get_feed(date) for date in dates))
+        result = {}
+        for date, feed in zip(dates, feeds):
+            checklists_by_loc = defaultdict(list)
+            for checklist in feed:
+                checklists_by_loc[checklist.get("locId")].append(checklist)
+            truncated = len(feed) >= self.ebird_manager.CHECKLIST_FEED_MAX_RESULTS
+            result[date] = (dict(checklists_by_loc), truncated)
+        return result
+
+    async def _fetch_hotspot_date_from_feed(
+        self,
+        loc_id: str,
+        date: datetime.date,
+        feeds: dict[datetime.date, tuple[dict[str, list], bool]],
+        region_code: str,
+        auth: str,
+        semaphore: asyncio.Semaphore,
+    ) -> tuple[list, list]:
+        checklists_by_loc, truncated = feeds[date]
+        checklists = checklists_by_loc.get(loc_id)
+        async with semaphore:
+            # a hotspot missing from a truncated feed may still have checklists
+            if checklists is None and truncated:
                 checklists = await self.ebird_manager.get_checklists_by_date_and_region(
-                    loc_id, date, auth
+                    loc_id, date, auth, region_code
                 )
-                checklists_map[date] = checklists
-                for s in species:
-                    species_map[s.get("speciesCode")].append(s)
-            missing_species = dict(
-                (key, value)
-                for (key, value) in species_map.items()
-                if key in missing_species_codes
+            # observations only come from checklists, so a hotspot nobody
+            # birded that day has none to fetch
+            if not checklists:
+                return [], []
+            species = await self.ebird_manager.get_species_observed_by_date_and_region(
+                loc_id, date, auth, region_code
             )
-            hotspot_scores.append(
-                {
-                    "location": hotspot,
-                    "missing_species": missing_species,
-                    "birdspot_score": self.get_target_score_for_hotspot_and_date(
-                        missing_species, checklists_map, target_date
-                    ),
-                    "score": len(missing_species),
-                }
+        return species, checklists
+
+    async def _fetch_hotspot_date(
+        self,
+        loc_id: str,
+        date: datetime.date,
+        region_code: str,
+        auth: str,
+        semaphore: asyncio.Semaphore,
+    ) -> tuple[list, list]:
+        async with semaphore:
+            return await asyncio.gather(
+                self.ebird_manager.get_species_observed_by_date_and_region(
+                    loc_id, date, auth, region_code
+                ),
+                self.ebird_manager.get_checklists_by_date_and_region(
+                    loc_id, date, auth, region_code
+                ),
             )
 
-        return sorted(
-            hotspot_scores,
-            key=lambda hotspot_score: hotspot_score.get("birdspot_score"),
-            reverse=True,
+    async def _score_hotspot(
+        self,
+        hotspot: EBirdHotspot,
+        dates: list[datetime.date],
+        missing_species_codes: set,
+        target_date: datetime.date,
+        fetch: HotspotDateFetcher,
+    ) -> dict[str, Any]:
+        try:
+            loc_id = hotspot.get("locId")
+            if loc_id is None:
+                raise RuntimeError("Something went wrong (Cailyn!)")
+            fetched = await asyncio.gather(*(fetch(loc_id, date) for date in dates))
+        except Exception as e:
+            # a single bad hotspot shouldn't fail the whole region
+            logger.warning(
+                "Failed to fetch hotspot %s: %s", hotspot.get("locId"), str(e)
+            )
+            advance("hotspots_fetched")
+            advance("hotspots_scored")
+            return {
+                "location": hotspot,
+                "missing_species": {},
+                "birdspot_score": 0,
+                "score": 0,
+                "error": str(e),
+            }
+
+        advance("hotspots_fetched")
+        species_map = defaultdict(list)
+        checklists_map = {}
+        for date, (species, checklists) in zip(dates, fetched):
+            checklists_map[date] = checklists
+            for s in species:
+                species_map[s.get("speciesCode")].append(s)
+        missing_species = dict(
+            (key, value)
+            for (key, value) in species_map.items()
+            if key in missing_species_codes
+        )
+        birdspot_score = self.get_target_score_for_hotspot_and_date(
+            missing_species, checklists_map, target_date
         )
+        advance("hotspots_scored")
+        return {
+            "location": hotspot,
+            "missing_species": missing_species,
+            "birdspot_score": birdspot_score,
+            "score": len(missing_species),
+        }
 
     def get_target_score_for_hotspot_and_date(
         self,
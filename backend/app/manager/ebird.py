@@ -1,16 +1,29 @@
 import datetime
 import logging
 import os
-from time import sleep
+from collections.abc import Iterable
 from app.dal.cache.file import FileCache
+from app.dal.cache.memory import MemoryCache
 from app.dal.cache.redis import RedisCache
+from app.dal.cache.sqlite import SQLiteCache
 from app.model.ebird_types import (
     EBirdChecklistFeedEntry,
     EBirdHotspot,
     EBirdObservation,
     EBirdTaxon,
 )
-from lib.cache import CacheAccessor, CacheProvider, Cache, CacheKey, KeySerializer
+from lib.cache import (
+    CacheAccessor,
+    CachePolicy,
+    CacheProvider,
+    Cache,
+    CacheKey,
+    KeySerializer,
+    PolicySelector,
+    ScopeSerializer,
+    TieredCacheProvider,
+)
+from lib.config import choose_from_env
 from minject import inject
 
 from app.dal.ebird import EBirdDAL
@@ -20,36 +33,149 @@ logger = logging.getLogger(__name__)
 
 EBIRD_CACHE_KEY = CacheKey("ebird", 1)
 
+CACHE_PROVIDERS: dict[str, type[CacheProvider]] = {
+    "redis": RedisCache,
+    "file": FileCache,
+    "sqlite": SQLiteCache,
+}
+
 CACHE_ACCESSOR: CacheAccessor["EBirdManager"] = lambda self: self.cache
 
 REGION_KEY: KeySerializer[str, str] = lambda region_code, auth: region_code
-REGION_DATE_KEY: KeySerializer[str, datetime.date, str] = (
-    lambda region_code, date, auth: f"{region_code}:{date.isoformat()}"
+REGION_DATE_KEY: KeySerializer[str, datetime.date, str, str | None] = (
+    lambda region_code, date, auth, parent_region=None: (
+        f"{region_code}:{date.isoformat()}"
+    )
+)
+
+# scopes a region's entries can be invalidated by, see invalidate_region.
+# A hotspot's entries are scoped under the region it was fetched for.
+REGION_SCOPES: ScopeSerializer[str, str] = lambda region_code, auth: [
+    f"region:{region_code}"
+]
+REGION_DATE_SCOPES: ScopeSerializer[str, datetime.date, str, str | None] = (
+    lambda region_code, date, auth, parent_region=None: [
+        f"region:{parent_region or region_code}"
+    ]
+)
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# hotspots are added and renamed now and then
+HOTSPOTS_POLICY = CachePolicy(ttl=30 * DAY, stale_after=DAY)
+# a region's species list only grows with rare vagrants
+SPECIES_POLICY = CachePolicy(ttl=90 * DAY, stale_after=7 * DAY)
+# late checklists still arrive for the last week, after which a day's
+# observations are effectively immutable
+RECENT_DAYS = 7
+RECENT_DATE_POLICY = CachePolicy(ttl=30 * DAY, stale_after=6 * HOUR)
+
+
+def settled_date_policy(date: datetime.date) -> CachePolicy:
+    """
+    A settled date's policy. Values cached while the date was still recent
+    may miss late checklists, so they are refreshed once.
+    """
+    settled_on = date + datetime.timedelta(days=RECENT_DAYS + 1)
+    return CachePolicy(
+        ttl=180 * DAY,
+        stale_before=datetime.datetime.combine(settled_on, datetime.time()).timestamp(),
+    )
+
+
+REGION_DATE_POLICY: PolicySelector[str, datetime.date, str, str | None] = (
+    lambda region_code, date, auth, parent_region=None: RECENT_DATE_POLICY
+    if (datetime.date.today() - date).days <= RECENT_DAYS
+    else settled_date_policy(date)
 )
 
 
 @inject.bind(
     ebird_dal=inject.reference(EBirdDAL),
-    cache_provider=inject.reference(RedisCache)
-    if os.getenv("RAILWAY_ENVIRONMENT_NAME") == "production"
-    else inject.reference(FileCache),
+    cache_provider=inject.reference(
+        choose_from_env(
+            "BIRDSPOT_CACHE_PROVIDER",
+            CACHE_PROVIDERS,
+            "redis"
+            if os.getenv("RAILWAY_ENVIRONMENT_NAME") == "production"
+            else "file",
+        )
+    ),
+    memory_cache=inject.reference(MemoryCache),
+    generation_ttl=float(os.getenv("BIRDSPOT_CACHE_GENERATION_TTL", "5")),
 )
 class EBirdManager:
+    # the largest page eBird serves from the product/lists feed
+    CHECKLIST_FEED_MAX_RESULTS = 200
+
     ebird_dal: EBirdDAL
     cache: Cache[CacheProvider]
 
-    def __init__(self, ebird_dal: EBirdDAL, cache_provider: CacheProvider):
+    def __init__(
+        self,
+        ebird_dal: EBirdDAL,
+        cache_provider: CacheProvider,
+        memory_cache: MemoryCache,
+        generation_ttl: float,
+    ):
         self.ebird_dal = ebird_dal
         self.cache_provider = cache_provider
-        self.cache = Cache(EBIRD_CACHE_KEY, cache_provider)
+        self.memory_cache = memory_cache
+        self.cache = Cache(
+            EBIRD_CACHE_KEY,
+            TieredCacheProvider(memory_cache, cache_provider),
+            generation_ttl=generation_ttl,
+        )
+
+    async def invalidate_region(self, region_code: str) -> int:
+        """
+        Invalidate everything cached for a region, including its hotspots'
+        entries, without touching other regions. Subregions have their own
+        entries and are not included.
+        """
+        return await self.cache.invalidate(f"region:{region_code}")
+
+    async def prefetch_by_date_and_region(
+        self,
+        region_dates: Iterable[tuple[str, datetime.date]],
+        auth: str,
+        include_checklists: bool = True,
+        parent_region: str | None = None,
+    ) -> int:
+        """
+        Load the cached observations (and checklists) for many region/date
+        pairs in one batch, so the per-call lookups that follow are served
+        from the memory tier. Pass parent_region when the pairs are hotspots
+        of that region. Returns how many entries were cached.
+        """
+        methods = [self.get_species_observed_by_date_and_region]
+        if include_checklists:
+            methods.append(self.get_checklists_by_date_and_region)
+        keys = await self.cache.keys_for(
+            (method, (region_code, date, auth, parent_region))
+            for region_code, date in region_dates
+            for method in methods
+        )
+        if not keys:
+            return 0
+        values = await self.cache.get_many(keys)
+        hits = sum(1 for value in values.values() if value is not None)
+        logger.debug("Prefetched %d of %d cache entries", hits, len(keys))
+        return hits
 
     @Cache.with_cache(
-        cache_accessor=CACHE_ACCESSOR, key_serializer=Cache.typed_serializer(REGION_KEY)
+        cache_accessor=CACHE_ACCESSOR,
+        key_serializer=Cache.typed_serializer(REGION_KEY),
+        scopes=REGION_SCOPES,
+        policy=HOTSPOTS_POLICY,
     )
     async def get_hotspots_by_region(
         self, region_code: str, auth: str
     ) -> list[EBirdHotspot]:
-        response = self.ebird_dal.get(f"ref/hotspot/{region_code}?fmt=json", auth)
+        response = await self.ebird_dal.get(
+            f"ref/hotspot/{region_code}?fmt=json", auth
+        )
         if response.status_code in (204, 404):
             return []
         try:
@@ -66,12 +192,15 @@ class EBirdManager:
             raise
 
     @Cache.with_cache(
-        cache_accessor=CACHE_ACCESSOR, key_serializer=Cache.typed_serializer(REGION_KEY)
+        cache_accessor=CACHE_ACCESSOR,
+        key_serializer=Cache.typed_serializer(REGION_KEY),
+        scopes=REGION_SCOPES,
+        policy=SPECIES_POLICY,
     )
     async def get_species_by_region(
         self, region_code: str, auth: str
     ) -> list[EBirdTaxon]:
-        possible_species_codes_response = self.ebird_dal.get(
+        possible_species_codes_response = await self.ebird_dal.get(
             f"product/spplist/{region_code}?fmt=json", auth
         )
         if possible_species_codes_response.status_code in (204, 404):
@@ -90,7 +219,7 @@ class EBirdManager:
             )
             return []
 
-        possible_species_response = self.ebird_dal.get(
+        possible_species_response = await self.ebird_dal.get(
             f"ref/taxonomy/ebird?species={','.join(possible_species_codes)}&fmt=json",
             auth,
         )
@@ -111,9 +240,15 @@ class EBirdManager:
     @Cache.with_cache(
         cache_accessor=CACHE_ACCESSOR,
         key_serializer=Cache.typed_serializer(REGION_DATE_KEY),
+        scopes=REGION_DATE_SCOPES,
+        policy=REGION_DATE_POLICY,
     )
     async def get_species_observed_by_date_and_region(
-        self, region_code: str, date: datetime.date, auth: str
+        self,
+        region_code: str,
+        date: datetime.date,
+        auth: str,
+        parent_region: str | None = None,
     ) -> list[EBirdObservation]:
         # The eBird API may return an empty body (204 No Content) or a 404
         # for locations with no observations.  The original implementation
@@ -121,8 +256,7 @@ class EBirdManager:
         # ``JSONDecodeError`` when the body is empty.  We now guard against
         # that by checking the status code and returning an empty list when
         # appropriate.
-        sleep(0.1)
-        species_observed_response = self.ebird_dal.get(
+        species_observed_response = await self.ebird_dal.get(
             f"data/obs/{region_code}/historic/{date.year}/{date.month}/{date.day}", auth
         )
 
@@ -145,15 +279,48 @@ class EBirdManager:
     @Cache.with_cache(
         cache_accessor=CACHE_ACCESSOR,
         key_serializer=Cache.typed_serializer(REGION_DATE_KEY),
+        scopes=REGION_DATE_SCOPES,
+        policy=REGION_DATE_POLICY,
     )
     async def get_checklists_by_date_and_region(
+        self,
+        region_code: str,
+        date: datetime.date,
+        auth: str,
+        parent_region: str | None = None,
+    ) -> list[EBirdChecklistFeedEntry]:
+        return await self._get_checklists(region_code, date, auth)
+
+    @Cache.with_cache(
+        cache_accessor=CACHE_ACCESSOR,
+        key_serializer=Cache.typed_serializer(REGION_DATE_KEY),
+        scopes=REGION_DATE_SCOPES,
+        policy=REGION_DATE_POLICY,
+    )
+    async def get_checklist_feed_by_date_and_region(
         self, region_code: str, date: datetime.date, auth: str
     ) -> list[EBirdChecklistFeedEntry]:
-        # Similar defensive handling as ``get_species_observed_by_date_and_region``.
-        sleep(0.1)
-        checklists_response = self.ebird_dal.get(
-            f"product/lists/{region_code}/{date.year}/{date.month}/{date.day}", auth
+        """
+        Get as much of a region's checklist feed for a date as eBird allows in
+        one request. A feed holding CHECKLIST_FEED_MAX_RESULTS entries may be
+        truncated.
+        """
+        return await self._get_checklists(
+            region_code, date, auth, max_results=self.CHECKLIST_FEED_MAX_RESULTS
         )
+
+    async def _get_checklists(
+        self,
+        region_code: str,
+        date: datetime.date,
+        auth: str,
+        max_results: int | None = None,
+    ) -> list[EBirdChecklistFeedEntry]:
+        # Similar defensive handling as ``get_species_observed_by_date_and_region``.
+        endpoint = f"product/lists/{region_code}/{date.year}/{date.month}/{date.day}"
+        if max_results is not None:
+            endpoint = f"{endpoint}?maxResults={max_results}"
+        checklists_response = await self.ebird_dal.get(endpoint, auth)
         if checklists_response.status_code in (204, 404):
             return []
         try:
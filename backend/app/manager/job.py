@@ -1,40 +1,94 @@
 import asyncio
 import codecs
+import datetime
 import json
 import logging
 import traceback
-from collections.abc import Callable
+from collections import Counter
+from collections.abc import AsyncIterator
 from concurrent import futures
 import os
+import time
 from typing import Any
 from uuid import uuid4
 
 import attrs
 import dill
+from app.dal.job.redis import RedisJobStore
+from app.dal.job.sqlite import SQLiteJobStore
+from app.dal.job_events.memory import MemoryJobEvents
+from app.dal.job_events.redis import RedisJobEvents
+from app.dal.queue.memory import MemoryJobQueue
+from app.dal.queue.redis import RedisJobQueue
+from app.manager.task import SCORE_REGION_TASK, TaskManager
+from lib.job_events import FINAL_STATES, JobEvents
+from lib.job_queue import JobQueue
+from lib.job_store import JobStore
+from lib.codec import CodecSelector
+from lib.config import choose_from_env
+from lib.progress import Progress, tracking
+from lib.task import Task
+from lib.worker import WorkerLoop
 from minject import inject
 
 
 logger = logging.getLogger(__name__)
 
+JOB_STORES: dict[str, type[JobStore]] = {
+    "sqlite": SQLiteJobStore,
+    "redis": RedisJobStore,
+}
+JOB_QUEUES: dict[str, type[JobQueue]] = {
+    "local": MemoryJobQueue,
+    "redis": RedisJobQueue,
+}
+# progress events travel between processes the same way jobs do
+JOB_EVENTS: dict[str, type[JobEvents]] = {
+    "local": MemoryJobEvents,
+    "redis": RedisJobEvents,
+}
+
 
 @attrs.define
 class Job:
     id: str
     owner: str
     state: str
-    callable: str
-    payload: str
+    # the registered task the job runs, or None for jobs created before tasks
+    # were named, which all scored a region
+    task: str | None
+    # the task's encoded payload, or a dill pickled dict for legacy jobs
+    payload: Any
+    # the task's summary of its result once the job completes, the full
+    # result being stored apart from the job, or the best result so far
+    # while it runs
     response: Any
+    # unknown for jobs created before it was recorded
+    created_at: float | None = None
+    # identifies the work the job does, if its task deduplicates
+    content_hash: str | None = None
+    # the job whose result this one reuses instead of running
+    source: str | None = None
+    # counts and timings of the finished job
+    summary: dict[str, Any] | None = None
 
     @classmethod
-    def build(cls, owner: str, callable: Callable, **payload):
+    def build(
+        cls,
+        owner: str,
+        task: str,
+        payload: dict[str, Any],
+        content_hash: str | None = None,
+    ):
         return Job(
             id=str(uuid4()),
             owner=owner,
             state="not-started",
-            callable=codecs.encode(dill.dumps(callable), "base64").decode(),
-            payload=codecs.encode(dill.dumps(payload), "base64").decode(),
+            task=task,
+            payload=payload,
             response=None,
+            created_at=time.time(),
+            content_hash=content_hash,
         )
 
     @classmethod
@@ -44,117 +98,519 @@ class Job:
             id=obj["id"],
             owner=obj["owner"],
             state=obj["state"],
-            callable=obj["callable"],
+            task=obj.get("task", None),
             payload=obj["payload"],
             response=obj.get("response", None),
+            created_at=obj.get("created_at", None),
+            content_hash=obj.get("content_hash", None),
+            source=obj.get("source", None),
+            summary=obj.get("summary", None),
         )
 
-    def start(self):
-        (fn, args) = self.__decode()
-        return fn(**args)
-
-    def __decode(self) -> tuple[Callable, dict]:
-        decoded_payload = codecs.decode(self.payload.encode(), "base64")
-        decoded_callable = codecs.decode(self.callable.encode(), "base64")
-        return dill.loads(decoded_callable), dill.loads(decoded_payload)
-
-    def get_decoded_payload(self) -> dict:
-        decoded_payload = codecs.decode(self.payload.encode(), "base64")
-        return dill.loads(decoded_payload)
-
     def __str__(self) -> str:
         return json.dumps(attrs.asdict(self))
 
 
-@inject.bind()
+@inject.bind(
+    # use redis for both when web servers and workers run on separate nodes
+    job_store=inject.reference(
+        choose_from_env("BIRDSPOT_JOB_STORE", JOB_STORES, "sqlite")
+    ),
+    job_queue=inject.reference(
+        choose_from_env("BIRDSPOT_JOB_QUEUE", JOB_QUEUES, "local")
+    ),
+    job_events=inject.reference(
+        choose_from_env("BIRDSPOT_JOB_QUEUE", JOB_EVENTS, "local")
+    ),
+    task_manager=inject.reference(TaskManager),
+    worker=WorkerLoop(
+        max_concurrency=int(os.getenv("BIRDSPOT_JOB_CONCURRENCY", "4")),
+        max_per_owner=int(os.getenv("BIRDSPOT_JOB_MAX_PER_OWNER", "2")),
+        name="job-worker",
+    ),
+    # seconds a job's result is reused by identical jobs, 0 to always run
+    dedup_window=float(os.getenv("BIRDSPOT_JOB_DEDUP_WINDOW", "3600")),
+    result_codecs=CodecSelector(os.getenv("BIRDSPOT_JOB_RESULT_CODEC", "json+zlib")),
+    # how far back to look for jobs left running by a restart
+    resume_window=float(os.getenv("BIRDSPOT_JOB_RESUME_WINDOW", str(24 * 60 * 60))),
+)
 class JobManager:
-    def __init__(self):
+    # lower runs first
+    DEFAULT_PRIORITY = Task.DEFAULT_PRIORITY
+    # seconds between progress events of a running job, at most
+    PROGRESS_INTERVAL = 0.5
+    # seconds between saves of a running job's partial result, at most
+    PARTIAL_RESULT_INTERVAL = 2.0
+    # seconds between saves of a running job's checkpoint, at most
+    CHECKPOINT_INTERVAL = 5.0
+    # seconds between checks for a newer event of a followed job
+    EVENTS_POLL_INTERVAL = 0.5
+
+    def __init__(
+        self,
+        job_store: JobStore,
+        job_queue: JobQueue,
+        job_events: JobEvents,
+        task_manager: TaskManager,
+        worker: WorkerLoop,
+        dedup_window: float,
+        result_codecs: CodecSelector,
+        resume_window: float,
+    ):
         self.id = str(uuid4())
-        self.executor = futures.ThreadPoolExecutor()
+        self.dedup_window = dedup_window
+        self.result_codecs = result_codecs
+        self.resume_window = resume_window
+        self.job_queue = job_queue
+        self.job_events = job_events
+        # every job runs on the worker's event loop, sharing its HTTP client
+        # and in-flight cache lookups
+        self.worker = worker
         self.directory = os.getenv("BIRDSPOT_JOB_DIRECTORY")
+        self.job_store = job_store
+        self.task_manager = task_manager
+        self.import_legacy_jobs()
+
+    def import_legacy_jobs(self) -> int:
+        """
+        Move jobs saved as one JSON file each into the job store. Imported
+        files are renamed rather than deleted, and files that can't be read
+        are left in place.
+        """
+        try:
+            filenames = os.listdir(self.directory)
+        except (FileNotFoundError, TypeError):
+            return 0
+        imported = 0
+        for filename in filenames:
+            if not filename.endswith(".json"):
+                continue
+            path = f"{self.directory}{filename}"
+            try:
+                with open(path, "r") as f:
+                    job = Job.from_str(f.readline())
+                if job.created_at is None:
+                    job.created_at = os.path.getmtime(path)
+                self._save(job)
+                os.replace(path, f"{path}.imported")
+                imported += 1
+            except Exception as e:
+                logger.warning("Failed to import job file %s: %s", filename, str(e))
+        if imported:
+            logger.info("Imported %d job files into the job store", imported)
+        return imported
 
-    def create_job(self, owner: str, callable: Callable, payload: dict) -> Job:
-        job = Job.build(owner, callable, **payload)
-        with open(f"{self.directory}{job.id}.json", "w") as f:
-            f.write(str(job))
+    def _save(self, job: Job) -> None:
+        self.job_store.save(job.id, job.owner, job.created_at or 0.0, str(job))
+
+    def create_job(self, owner: str, task: str, payload: Any) -> Job:
+        """
+        Create a job for the owner. If a job doing the same work is running,
+        or finished within the dedup window, the new job attaches to it and
+        takes its result instead of running again.
+        """
+        registered = self.task_manager.get(task)
+        content_hash = registered.content_hash(payload)
+        job = Job.build(owner, task, registered.encode(payload), content_hash)
+        if content_hash is not None and (source := self._find_reusable(content_hash)):
+            job.source = source.id
+            job.state = "running"
+            self._copy_result(job, source)
+            logger.info("Job %s reuses job %s", job.id, source.id)
+        self._save(job)
 
         logger.info("Job created: %s for owner: %s", job.id, owner)
         return job
 
-    def get_job(self, job_id: str):
-        try:
-            with open(f"{self.directory}{job_id}.json", "r") as f:
-                return Job.from_str(f.readline())
-        except FileNotFoundError:
+    def _find_reusable(self, content_hash: str) -> Job | None:
+        if self.dedup_window <= 0:
+            return None
+        job_id = self.job_store.get_job_for_hash(content_hash)
+        if job_id is None or (job := self._load(job_id)) is None:
             return None
+        if job.state == "failed":
+            return None
+        if job.state == "running":
+            # in flight, however long it has been running, unless it was
+            # orphaned for longer than resume_orphaned_jobs looks back
+            started_at = job.created_at or 0.0
+            if time.time() - started_at > self.resume_window:
+                return None
+            return job
+        finished_at = (job.summary or {}).get("finished_at", job.created_at or 0.0)
+        if time.time() - finished_at > self.dedup_window:
+            return None
+        return job
+
+    def _copy_result(self, job: Job, source: Job) -> None:
+        if source.state in ("completed", "failed"):
+            job.state = source.state
+            job.response = source.response
+            job.summary = source.summary
+
+    def _load(self, job_id: str) -> Job | None:
+        data = self.job_store.load(job_id)
+        return Job.from_str(data) if data is not None else None
+
+    def _resolve(self, job: Job) -> Job:
+        """
+        Bring a job attached to another up to date with that job's result.
+        """
+        if job.source is None or job.state != "running":
+            return job
+        source = self._load(job.source)
+        if source is None:
+            job.state = "failed"
+            job.response = {"error": f"Job {job.source} no longer exists"}
+        else:
+            self._copy_result(job, source)
+        if job.state != "running":
+            self._save(job)
+        return job
 
-    def get_jobs_for_owner(self, owner: str):
-        jobs = []
+    def get_job(self, job_id: str):
+        job = self._load(job_id)
+        return self._resolve(job) if job is not None else None
+
+    def get_payload(self, job: Job) -> Any:
+        """
+        The job's typed payload.
+        """
+        if job.task is None:
+            legacy_payload = dill.loads(codecs.decode(job.payload.encode(), "base64"))
+            return self.task_manager.get(SCORE_REGION_TASK).decode(legacy_payload)
+        return self.task_manager.get(job.task).decode(job.payload)
+
+    def get_priority(self, job: Job) -> int:
+        """
+        The priority the job's task gives it, lower running first.
+        """
         try:
-            for filename in os.listdir(self.directory):
-                if not filename.endswith(".json"):
-                    continue
-                job_id = filename[:-5]
-                try:
-                    job = self.get_job(job_id)
-                    if job and job.owner == owner:
-                        jobs.append(job)
-                except Exception:
-                    continue
-        except FileNotFoundError:
-            pass
-        return jobs
-
-    def start_job(self, job: Job):
-        with open(f"{self.directory}{job.id}.json", "w") as f:
-            job.state = "running"
-            f.write(str(job))
+            task = self.task_manager.get(job.task or SCORE_REGION_TASK)
+            return task.priority_for(self.get_payload(job))
+        except Exception as e:
+            # the worker fails the job once it claims it
+            logger.warning("Failed to prioritize job %s: %s", job.id, e)
+            return self.DEFAULT_PRIORITY
+
+    def get_result(self, job: Job) -> Any:
+        """
+        The job's full result, which for jobs that ran before results were
+        stored apart is their response.
+        """
+        data = self.job_store.load_result(job.source or job.id)
+        if data is None:
+            return job.response
+        return self.result_codecs.decode(data)
+
+    def get_summary(self, job: Job) -> Any:
+        """
+        The summary of the job's result, summarizing the full responses of
+        jobs that ran before results were stored apart.
+        """
+        if job.state != "completed" or job.summary is not None:
+            return job.response
+        return self.task_manager.get(job.task or SCORE_REGION_TASK).summarize_result(
+            job.response
+        )
 
-        logger.info("Job starting: %s", job.id)
+    def get_jobs_for_owner(
+        self, owner: str, limit: int | None = None, cursor: str | None = None
+    ) -> tuple[list[Job], str | None]:
+        """
+        The owner's jobs, newest first, a page at a time if a limit is given,
+        along with the cursor of the next page.
+        """
+        jobs, next_cursor = self.job_store.list_for_owner(owner, limit, cursor)
+        return [self._resolve(Job.from_str(data)) for data in jobs], next_cursor
 
-        def run_job():
+    def get_region_job_counts(self, since: datetime.datetime) -> Counter[str]:
+        """
+        Count the jobs created since the given time by region.
+        """
+        counts: Counter[str] = Counter()
+        for data in self.job_store.list_created_since(since.timestamp()):
             try:
-                logger.info("Job executing in thread: %s", job.id)
-                result = asyncio.run(job.start())
+                payload = self.get_payload(Job.from_str(data))
+            except Exception:
+                continue
+            if region_code := getattr(payload, "region_code", None):
+                counts[region_code] += 1
+        return counts
+
+    async def start_job(self, job: Job, priority: int | None = None):
+        """
+        Queue the job for a JobWorker, in this process or another one, at the
+        priority its task gives it unless one is given. Jobs attached to
+        another job have nothing to run.
+        """
+        if job.source is not None:
+            return
+        if priority is None:
+            priority = self.get_priority(job)
+        job.state = "running"
+        self._save(job)
+        if job.content_hash is not None:
+            self.job_store.set_job_for_hash(job.content_hash, job.id)
+        await self.job_queue.enqueue(job.id, priority)
+        self._publish(job.id, {"state": job.state, "phase": "queued"})
+        logger.info("Job queued: %s", job.id)
+
+    async def resume_orphaned_jobs(self) -> int:
+        """
+        Queue again the jobs left running when the process running them
+        stopped. They resume from their checkpoints. Only for job queues
+        that lose their jobs on restart, since others redeliver them.
+        """
+        since = time.time() - self.resume_window
+        orphaned = [
+            job
+            for job in map(Job.from_str, self.job_store.list_created_since(since))
+            if job.state == "running" and job.source is None
+        ]
+        for job in orphaned:
+            await self.job_queue.enqueue(job.id, self.get_priority(job))
+            logger.info("Job resumed: %s", job.id)
+        return len(orphaned)
+
+    def run_job(self, job: Job, priority: int = DEFAULT_PRIORITY) -> futures.Future:
+        """
+        Run the job on this process's worker loop. Its result is saved before
+        the returned future resolves.
+        """
+        task = self.task_manager.get(job.task or SCORE_REGION_TASK)
+        payload = self.get_payload(job)
+
+        async def run_job():
+            started_at = time.time()
+            progress = Progress(
+                await asyncio.to_thread(self._load_checkpoint, job.id)
+            )
+            finished = asyncio.Event()
+            publisher = asyncio.create_task(
+                self._publish_progress(job, task, progress, finished)
+            )
+            error = None
+            try:
+                logger.info("Job executing: %s", job.id)
+                with tracking(progress):
+                    result = await task.run(payload)
                 logger.info("Job completed successfully: %s", job.id)
-                return result
             except Exception as e:
                 logger.error("Job failed: %s - %s", job.id, str(e))
                 logger.error("Traceback: %s", traceback.format_exc())
-                raise
+                error, result = e, None
+            finally:
+                # lets a save in flight finish, so it can't overwrite the
+                # job's result once it is saved
+                finished.set()
+                await publisher
+            # the job store is synchronous, so it is written from another
+            # thread, keeping the other jobs on the worker loop running
+            await asyncio.to_thread(
+                self._save_outcome, job.id, task, started_at, result, error
+            )
+            if error is not None:
+                raise error
+            return result
 
-        future = self.executor.submit(run_job)
-        future.add_done_callback(self._job_completed_callback(job.id))
+        return self.worker.submit(job.owner, run_job, priority)
 
-    def _job_completed_callback(self, job_id: str):
-        def __inner(future: futures.Future):
-            try:
-                job = self.get_job(job_id)
-                if job is None:
-                    logger.error("Job not found in callback: %s", job_id)
+    def fail_job(self, job_id: str, error: str) -> None:
+        """
+        Mark a job that couldn't be run as failed, unless it finished anyway.
+        """
+        job = self._load(job_id)
+        if job is None or job.state in FINAL_STATES:
+            return
+        job.state = "failed"
+        job.response = {"error": error}
+        job.summary = {"finished_at": time.time()}
+        self._save(job)
+        self._publish(job_id, {"state": job.state})
+        self.job_store.delete_checkpoint(job_id)
+
+    async def follow_events(
+        self,
+        job: Job,
+        last_version: str | None = None,
+        keepalive_interval: float = 15.0,
+    ) -> AsyncIterator[tuple[int | None, dict[str, Any]] | None]:
+        """
+        The job's progress events as (version, event) once they are newer
+        than last_version, until it completes or fails. Yields None when
+        nothing was published for keepalive_interval seconds. The job itself
+        is reread then, since its final event may have been lost or expired.
+        """
+        if job.state in FINAL_STATES:
+            yield None, {"state": job.state}
+            return
+        # a job reusing another's result follows that job's progress
+        events_id = job.source or job.id
+        quiet = 0.0
+        while True:
+            # job events and stores may block, so keep them off the caller's
+            # event loop
+            latest = await asyncio.to_thread(self.job_events.latest, events_id)
+            # versions restart if the events were lost, so any other version
+            # is new
+            if latest is not None and str(latest[0]) != last_version:
+                version, event = latest
+                yield version, event
+                if event.get("state") in FINAL_STATES:
                     return
+                last_version = str(version)
+                quiet = 0.0
+            elif quiet >= keepalive_interval:
+                current = await asyncio.to_thread(self.get_job, job.id)
+                if current is None:
+                    return
+                if current.state in FINAL_STATES:
+                    yield None, {"state": current.state}
+                    return
+                yield None
+                quiet = 0.0
+            await asyncio.sleep(self.EVENTS_POLL_INTERVAL)
+            quiet += self.EVENTS_POLL_INTERVAL
 
-                exception = future.exception()
-                if exception:
-                    logger.error(
-                        "Job callback received exception for %s: %s",
-                        job_id,
-                        str(exception),
-                    )
-                    job.state = "failed"
-                    job.response = {"error": str(exception)}
-                else:
-                    logger.info("Job callback saving completed state for: %s", job_id)
-                    job.state = "completed"
-                    job.response = future.result()
-
-                with open(f"{self.directory}{job.id}.json", "w") as f:
-                    f.write(str(job))
+    def close(self) -> None:
+        self.worker.stop()
 
-            except Exception as e:
-                logger.error(
-                    "Error in job completion callback for %s: %s", job_id, str(e)
+    def _publish(self, job_id: str, event: dict[str, Any]) -> None:
+        try:
+            self.job_events.publish(job_id, event)
+        except Exception as e:
+            # progress is best effort, and never fails the job
+            logger.warning("Failed to publish an event for job %s: %s", job_id, e)
+
+    async def _publish_progress(
+        self, job: Job, task: Task, progress: Progress, finished: asyncio.Event
+    ) -> None:
+        # publishes the latest progress at most every interval, however often
+        # it changes in between, until the job is finished. The job store and
+        # events are synchronous, so they are written from another thread to
+        # keep from blocking the other jobs on the worker loop
+        published = 0
+        saved = 0
+        # the first partial result is saved right away
+        saved_at = float("-inf")
+        checkpointed = 0
+        checkpointed_at = time.monotonic()
+        while not finished.is_set():
+            if (
+                progress.checkpoint_version != checkpointed
+                and time.monotonic() - checkpointed_at >= self.CHECKPOINT_INTERVAL
+            ):
+                checkpointed = progress.checkpoint_version
+                checkpointed_at = time.monotonic()
+                # copied, since the job goes on adding to it meanwhile
+                await asyncio.to_thread(
+                    self._save_checkpoint, job.id, dict(progress.checkpoint)
                 )
-                logger.error("Traceback: %s", traceback.format_exc())
+            if (
+                progress.partial_version != saved
+                and time.monotonic() - saved_at >= self.PARTIAL_RESULT_INTERVAL
+            ):
+                saved = progress.partial_version
+                saved_at = time.monotonic()
+                await asyncio.to_thread(
+                    self._save_partial, job, task.summarize_result(progress.partial())
+                )
+            if progress.version != published:
+                published = progress.version
+                await asyncio.to_thread(
+                    self._publish,
+                    job.id,
+                    {
+                        "state": "running",
+                        **progress.snapshot(),
+                        # the job's response holds the best hotspots so far
+                        "partial_result": saved > 0,
+                    },
+                )
+            try:
+                await asyncio.wait_for(finished.wait(), self.PROGRESS_INTERVAL)
+            except TimeoutError:
+                pass
+
+    def _load_checkpoint(self, job_id: str) -> dict[str, Any] | None:
+        try:
+            data = self.job_store.load_checkpoint(job_id)
+            if data is None:
+                return None
+            checkpoint = self.result_codecs.decode(data)
+        except Exception as e:
+            logger.warning("Failed to load the checkpoint of %s: %s", job_id, e)
+            return None
+        logger.info("Job %s resumes from %d checkpoints", job_id, len(checkpoint))
+        return checkpoint
+
+    def _save_checkpoint(self, job_id: str, checkpoint: dict[str, Any]) -> None:
+        try:
+            data = self.result_codecs.encode(f"job-checkpoint:{job_id}", checkpoint)
+            self.job_store.save_checkpoint(job_id, data)
+        except Exception as e:
+            logger.warning("Failed to save the checkpoint of %s: %s", job_id, e)
+
+    def _save_partial(self, job: Job, response: Any) -> None:
+        """
+        Save the best result so far as the running job's response.
+        """
+        try:
+            job.response = response
+            self._save(job)
+        except Exception as e:
+            logger.warning("Failed to save a partial result for %s: %s", job.id, e)
+
+    def _save_result(self, job: Job, task: Task, result: Any) -> dict[str, Any]:
+        """
+        Store the full result apart from the job, and keep its summary as the
+        job's response.
+        """
+        data = self.result_codecs.encode(f"job-result:{task.name}", result)
+        self.job_store.save_result(job.id, data)
+        job.response = task.summarize_result(result)
+        summary: dict[str, Any] = {"result_bytes": len(data)}
+        if isinstance(result, list):
+            summary["count"] = len(result)
+        return summary
+
+    def _save_outcome(
+        self,
+        job_id: str,
+        task: Task,
+        started_at: float,
+        result: Any,
+        error: Exception | None,
+    ) -> None:
+        try:
+            job = self.get_job(job_id)
+            if job is None:
+                logger.error("Job not found when saving its outcome: %s", job_id)
+                return
+
+            if error is not None:
+                logger.error("Saving failed state for %s: %s", job_id, str(error))
+                job.state = "failed"
+                job.response = {"error": str(error)}
+                summary = {}
+            else:
+                logger.info("Saving completed state for: %s", job_id)
+                job.state = "completed"
+                summary = self._save_result(job, task, result)
+
+            finished_at = time.time()
+            job.summary = {
+                **summary,
+                "started_at": started_at,
+                "finished_at": finished_at,
+                "duration": finished_at - started_at,
+            }
+            self._save(job)
+            # only once the result is saved, so it can be read right away
+            self._publish(job_id, {"state": job.state})
+            self.job_store.delete_checkpoint(job_id)
 
-        return __inner
+        except Exception as e:
+            logger.error("Error saving the outcome of job %s: %s", job_id, str(e))
+            logger.error("Traceback: %s", traceback.format_exc())
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import socket
+
+from app.manager.job import JobManager
+from lib.job_queue import Lease
+from minject import inject
+
+
+logger = logging.getLogger(__name__)
+
+
+@inject.bind(
+    job_manager=inject.reference(JobManager),
+    consumer=os.getenv("BIRDSPOT_WORKER_NAME")
+    or f"{socket.gethostname()}-{os.getpid()}",
+    lease_seconds=float(os.getenv("BIRDSPOT_JOB_LEASE_SECONDS", "60")),
+)
+class JobWorker:
+    """
+    Claims jobs from the job queue and runs them on the job manager's worker
+    loop, renewing their leases until their results are saved. A job whose
+    worker dies is redelivered once its lease expires, so a job may run more
+    than once but is never lost.
+    """
+
+    # how long one claim waits for a job before checking again
+    CLAIM_TIMEOUT = 5
+
+    def __init__(
+        self, job_manager: JobManager, consumer: str, lease_seconds: float
+    ):
+        self.job_manager = job_manager
+        self.job_queue = job_manager.job_queue
+        self.consumer = consumer
+        # renew well before the lease runs out
+        self.heartbeat_interval = lease_seconds / 3
+        # claim a few more jobs than can run, so the worker loop can choose
+        # between owners and priorities
+        self.max_claimed = job_manager.worker.max_concurrency * 2
+        self._claimed: dict[str, Lease] = {}
+        self._released = asyncio.Event()
+        self._acks: set[asyncio.Task] = set()
+
+    async def run(self) -> None:
+        logger.info("Job worker %s started", self.consumer)
+        heartbeats = asyncio.create_task(self._heartbeat_forever())
+        try:
+            while True:
+                if len(self._claimed) >= self.max_claimed:
+                    self._released.clear()
+                    await self._released.wait()
+                    continue
+                try:
+                    lease = await self.job_queue.claim(
+                        self.consumer, self.CLAIM_TIMEOUT
+                    )
+                except Exception as e:
+                    logger.error("Failed to claim a job: %s", str(e))
+                    await asyncio.sleep(self.CLAIM_TIMEOUT)
+                    continue
+                if lease is not None:
+                    try:
+                        await self._start(lease)
+                    except Exception as e:
+                        await self._reject(lease, e)
+        finally:
+            heartbeats.cancel()
+
+    async def _start(self, lease: Lease) -> None:
+        job = self.job_manager.get_job(lease.job_id)
+        if job is None or job.state in ("completed", "failed"):
+            # a redelivery of a job that finished after all
+            await self.job_queue.ack(lease)
+            return
+
+        loop = asyncio.get_running_loop()
+        future = self.job_manager.run_job(job, lease.priority)
+        self._claimed[lease.message_id] = lease
+        # the job manager saves the result before the future resolves, so the
+        # lease is only released once the result is stored
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._finish, lease)
+        )
+
+    async def _reject(self, lease: Lease, error: Exception) -> None:
+        """
+        Fail a job that can't be run, such as one whose task no longer exists,
+        so that its redeliveries don't fail every worker that claims it. If
+        even that fails, the lease is left to expire and the job redelivered.
+        """
+        logger.error("Failed to start job %s: %s", lease.job_id, str(error))
+        try:
+            self.job_manager.fail_job(lease.job_id, str(error))
+        except Exception as e:
+            logger.error("Failed to mark job %s failed: %s", lease.job_id, str(e))
+            return
+        await self._ack(lease)
+
+    def _finish(self, lease: Lease) -> None:
+        self._claimed.pop(lease.message_id, None)
+        self._released.set()
+        task = asyncio.get_running_loop().create_task(self._ack(lease))
+        self._acks.add(task)
+        task.add_done_callback(self._acks.discard)
+
+    async def _ack(self, lease: Lease) -> None:
+        try:
+            await self.job_queue.ack(lease)
+        except Exception as e:
+            # the job will be redelivered and skipped, since it finished
+            logger.error("Failed to acknowledge job %s: %s", lease.job_id, str(e))
+
+    async def _heartbeat_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            for lease in list(self._claimed.values()):
+                try:
+                    await self.job_queue.heartbeat(self.consumer, lease)
+                except Exception as e:
+                    logger.warning(
+                        "Failed to renew the lease on job %s: %s",
+                        lease.job_id,
+                        str(e),
+                    )
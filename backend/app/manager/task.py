@@ -0,0 +1,66 @@
+import os
+from typing import Any
+
+import attrs
+from app.manager.birdspot import BirdSpotManager
+from app.model.task import ScoreRegionPayload
+from lib.task import TaskRegistry
+from minject import inject
+
+
+SCORE_REGION_TASK = "score_region"
+# hotspots kept in a score region job's summary
+SUMMARY_SIZE = int(os.getenv("BIRDSPOT_JOB_SUMMARY_SIZE", "5"))
+
+
+def summarize_scores(hotspot_scores: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    The best hotspots, each with only the first observation of its missing
+    species, which is all that's needed to name them.
+    """
+    return [
+        {
+            **hotspot_score,
+            "missing_species": {
+                code: observations[:1]
+                for code, observations in hotspot_score["missing_species"].items()
+            },
+        }
+        for hotspot_score in hotspot_scores[:SUMMARY_SIZE]
+    ]
+
+
+def region_priority(region_code: str) -> int:
+    """
+    Smaller regions first, since they have fewer hotspots to score: a county
+    like US-NY-061, then a state like US-NY, then a country like US.
+    """
+    return 2 - min(region_code.count("-"), 2)
+
+
+@inject.bind(
+    birdspot_manager=inject.reference(BirdSpotManager),
+)
+class TaskManager(TaskRegistry):
+    """
+    The tasks jobs can run, by name.
+    """
+
+    def __init__(self, birdspot_manager: BirdSpotManager):
+        super().__init__()
+        self.register(
+            SCORE_REGION_TASK,
+            ScoreRegionPayload,
+            lambda payload: birdspot_manager.get_scores_for_region(
+                **attrs.asdict(payload, recurse=False)
+            ),
+            # scores only depend on these, not on who asked or how
+            dedup_key=lambda payload: {
+                "region_code": payload.region_code,
+                "life_list": birdspot_manager.get_seen_taxa(payload.life_list),
+                "target_date": payload.target_date,
+            },
+            summarize=summarize_scores,
+            # so a county's job isn't stuck behind a country's
+            priority=lambda payload: region_priority(payload.region_code),
+        )
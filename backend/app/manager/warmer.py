@@ -0,0 +1,103 @@
+import asyncio
+import datetime
+import logging
+import os
+
+from app.manager.birdspot import BirdSpotManager
+from app.manager.job import JobManager
+from minject import inject
+
+
+logger = logging.getLogger(__name__)
+
+
+@inject.bind(
+    birdspot_manager=inject.reference(BirdSpotManager),
+    job_manager=inject.reference(JobManager),
+    auth=os.getenv("EBIRD_API_KEY"),
+    max_regions=int(os.getenv("BIRDSPOT_WARMER_MAX_REGIONS", "20")),
+    lookback_days=int(os.getenv("BIRDSPOT_WARMER_LOOKBACK_DAYS", "7")),
+    # how long after midnight UTC to run, so late uploads for the day are in
+    delay=datetime.timedelta(
+        minutes=float(os.getenv("BIRDSPOT_WARMER_DELAY_MINUTES", "30"))
+    ),
+    # well below the score concurrency, so user jobs sharing the API key's
+    # rate limit aren't starved
+    max_concurrency=int(os.getenv("BIRDSPOT_WARMER_CONCURRENCY", "2")),
+)
+class CacheWarmer:
+    """
+    Fetches the previous day's observations and checklists for the regions
+    with the most recent jobs once a night, so the jobs that follow are
+    served from the cache.
+    """
+
+    def __init__(
+        self,
+        birdspot_manager: BirdSpotManager,
+        job_manager: JobManager,
+        auth: str | None,
+        max_regions: int,
+        lookback_days: int,
+        delay: datetime.timedelta,
+        max_concurrency: int,
+    ):
+        self.birdspot_manager = birdspot_manager
+        self.job_manager = job_manager
+        self.auth = auth
+        self.max_regions = max_regions
+        self.lookback_days = lookback_days
+        self.delay = delay
+        self.max_concurrency = max_concurrency
+
+    def popular_regions(self, now: datetime.datetime) -> list[str]:
+        since = now - datetime.timedelta(days=self.lookback_days)
+        counts = self.job_manager.get_region_job_counts(since)
+        return [region_code for region_code, _ in counts.most_common(self.max_regions)]
+
+    def next_run(self, now: datetime.datetime) -> datetime.datetime:
+        midnight = datetime.datetime.combine(
+            now.date(), datetime.time(), tzinfo=datetime.timezone.utc
+        )
+        run_at = midnight + self.delay
+        if run_at <= now:
+            run_at += datetime.timedelta(days=1)
+        return run_at
+
+    async def warm(self, date: datetime.date | None = None) -> int:
+        """
+        Warm the cache for the popular regions on the given date, yesterday
+        (UTC) by default. Regions are warmed one at a time, most popular
+        first. Returns how many regions were warmed.
+        """
+        if self.auth is None:
+            logger.warning("Skipping cache warming, EBIRD_API_KEY is not set")
+            return 0
+        now = datetime.datetime.now(datetime.timezone.utc)
+        date = date or now.date() - datetime.timedelta(days=1)
+        regions = await asyncio.to_thread(self.popular_regions, now)
+        logger.info("Warming %s for %d regions", date.isoformat(), len(regions))
+
+        warmed = 0
+        for region_code in regions:
+            try:
+                hotspots = await self.birdspot_manager.warm_region(
+                    region_code, [date], self.auth, self.max_concurrency
+                )
+            except Exception as e:
+                logger.warning("Failed to warm %s: %s", region_code, str(e))
+                continue
+            logger.info("Warmed %d hotspots in %s", hotspots, region_code)
+            warmed += 1
+        return warmed
+
+    async def run_forever(self) -> None:
+        while True:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            run_at = self.next_run(now)
+            logger.info("Next cache warming at %s", run_at.isoformat())
+            await asyncio.sleep((run_at - now).total_seconds())
+            try:
+                await self.warm()
+            except Exception as e:
+                logger.error("Cache warming failed: %s", str(e))
@@ -0,0 +1,26 @@
+import datetime
+
+import attrs
+
+
+def _to_date(value: datetime.date | str) -> datetime.date:
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    return value
+
+
+def _positive_int(instance, attribute: attrs.Attribute, value: int | None) -> None:
+    if value is None:
+        return
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        raise ValueError(f"{attribute.name} must be a positive integer")
+
+
+@attrs.define
+class ScoreRegionPayload:
+    region_code: str
+    life_list: list
+    life_list_name: str
+    target_date: datetime.date = attrs.field(converter=_to_date)
+    auth: str
+    max_concurrency: int | None = attrs.field(default=None, validator=_positive_int)
@@ -1,8 +1,15 @@
+import asyncio
 import functools
+import logging
+import threading
+import time
 from abc import ABC, abstractmethod
-from collections.abc import Callable, Coroutine, Mapping
+from concurrent import futures
+from collections.abc import AsyncIterator, Callable, Coroutine, Iterable, Mapping
 from typing import Any, Concatenate, List, Union, cast
 
+logger = logging.getLogger(__name__)
+
 type JsonType = Mapping[str, Any] | List[Any] | str | int | float | bool | None
 type EncodedT = Union[bytes, bytearray, memoryview]
 type DecodedT = Union[str, int, float]
@@ -10,6 +17,8 @@ type EncodableT = Union[EncodedT, DecodedT, JsonType]
 
 type CacheAccessor[S] = Callable[[S], Cache[CacheProvider]]
 type KeySerializer[**P] = Callable[P, str]
+type PolicySelector[**P] = Callable[P, CachePolicy]
+type ScopeSerializer[**P] = Callable[P, Iterable[str]]
 
 
 class CacheProvider(ABC):
@@ -18,10 +27,164 @@ class CacheProvider(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    async def set(self, key: str, value: EncodableT) -> None:
+    async def set(self, key: str, value: EncodableT, ttl: float | None = None) -> None:
+        """
+        Store the value, letting the provider reclaim it after ttl seconds if
+        one is given.
+        """
+        raise NotImplementedError
+
+    async def get_many(self, keys: list[str]) -> dict[str, EncodableT | None]:
+        """
+        Get several keys at once. Providers that can batch round trips should
+        override this.
+        """
+        return {key: await self.get(key) for key in keys}
+
+    async def set_many(
+        self, items: Mapping[str, EncodableT], ttl: float | None = None
+    ) -> None:
+        for key, value in items.items():
+            await self.set(key, value, ttl)
+
+    async def incr(self, key: str) -> int:
+        """
+        Increment the integer counter stored at the key, which starts at 0,
+        and return its new value. Providers shared between processes should
+        override this with an atomic increment.
+        """
+        value = int(await self.get(key) or 0) + 1  # type: ignore[arg-type]
+        await self.set(key, value)
+        return value
+
+    async def get_counters(self, keys: list[str]) -> dict[str, int]:
+        values = await self.get_many(keys)
+        return {
+            key: int(values.get(key) or 0)  # type: ignore[arg-type]
+            for key in keys
+        }
+
+    async def set_counter(self, key: str, value: int) -> None:
+        """
+        Overwrite a counter, in a form incr can continue from.
+        """
+        await self.set(key, value)
+
+    def scan(self, pattern: str) -> AsyncIterator[str]:
+        """
+        Iterate over the stored keys matching a glob style pattern. This is
+        meant for maintenance scripts rather than request paths.
+        """
         raise NotImplementedError
 
 
+class TieredCacheProvider(CacheProvider):
+    """
+    Reads through a fast local provider to a slower shared one, filling the
+    local tier on remote hits. Writes go to both tiers.
+    """
+
+    def __init__(self, local: CacheProvider, remote: CacheProvider):
+        self.local = local
+        self.remote = remote
+
+    async def get(self, key: str) -> EncodableT | None:
+        value = await self.local.get(key)
+        if value is not None:
+            return value
+        value = await self.remote.get(key)
+        if value is not None:
+            await self.local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: EncodableT, ttl: float | None = None) -> None:
+        await self.remote.set(key, value, ttl)
+        await self.local.set(key, value, ttl)
+
+    async def get_many(self, keys: list[str]) -> dict[str, EncodableT | None]:
+        values = await self.local.get_many(keys)
+        misses = [key for key in keys if values.get(key) is None]
+        if misses:
+            remote_values = await self.remote.get_many(misses)
+            hits = {
+                key: value
+                for key, value in remote_values.items()
+                if value is not None
+            }
+            await self.local.set_many(hits)
+            values.update(remote_values)
+        return values
+
+    async def set_many(
+        self, items: Mapping[str, EncodableT], ttl: float | None = None
+    ) -> None:
+        await self.remote.set_many(items, ttl)
+        await self.local.set_many(items, ttl)
+
+    # counters are only kept in the shared tier, so every process sees the
+    # same values
+
+    async def incr(self, key: str) -> int:
+        return await self.remote.incr(key)
+
+    async def get_counters(self, keys: list[str]) -> dict[str, int]:
+        return await self.remote.get_counters(keys)
+
+    async def set_counter(self, key: str, value: int) -> None:
+        await self.remote.set_counter(key, value)
+
+
+class CachePolicy:
+    """
+    How long a cached value may be served. Once it is older than stale_after
+    seconds, or was cached before the stale_before timestamp, it is still
+    served, but refreshed in the background; once it is older than ttl seconds
+    it is not served at all. None disables any of the limits.
+    """
+
+    # marks a value wrapped with the time it was cached
+    CACHED_AT = "__cached_at__"
+
+    def __init__(
+        self,
+        ttl: float | None = None,
+        stale_after: float | None = None,
+        stale_before: float | None = None,
+    ):
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.stale_before = stale_before
+
+    def wrap(self, value: EncodableT) -> dict[str, Any]:
+        return {self.CACHED_AT: time.time(), "value": value}
+
+    @classmethod
+    def unwrap(cls, cached: EncodableT) -> tuple[EncodableT, float | None]:
+        """
+        Split a cached value into the value and the time it was cached, which
+        is unknown for values cached before policies were introduced.
+        """
+        if isinstance(cached, Mapping) and cls.CACHED_AT in cached:
+            return cached["value"], cached[cls.CACHED_AT]
+        return cached, None
+
+    def is_expired(self, cached_at: float | None) -> bool:
+        if self.ttl is None or cached_at is None:
+            return False
+        return time.time() - cached_at > self.ttl
+
+    def is_stale(self, cached_at: float | None) -> bool:
+        if self.stale_after is None and self.stale_before is None:
+            return False
+        if cached_at is None:
+            return True
+        if self.stale_before is not None and cached_at < self.stale_before:
+            return True
+        if self.stale_after is None:
+            return False
+        return time.time() - cached_at > self.stale_after
+
+
 class CacheKey:
     def __init__(self, prefix: str, version: int):
         self.prefix = prefix
@@ -32,18 +195,169 @@ class CacheKey:
 
 
 class Cache[C: CacheProvider]:
-    def __init__(self, cache_key: CacheKey, cache_provider: C):
+    def __init__(
+        self, cache_key: CacheKey, cache_provider: C, generation_ttl: float = 5.0
+    ):
         self.cache_key = cache_key
         self.cache_provider = cache_provider
-        self.cache = {}
+        # generations are read from the provider at most once per
+        # generation_ttl seconds, so invalidations made by other processes
+        # take up to that long to be seen
+        self.generation_ttl = generation_ttl
+        # counter key -> (generation, monotonic time it was read)
+        self._generations: dict[str, tuple[int, float]] = {}
+        # concurrent.futures rather than asyncio futures, since callers may be
+        # running on different threads' event loops
+        self._in_flight: dict[str, futures.Future] = {}
+        self._in_flight_lock = threading.Lock()
+        # keys being refreshed in the background, and strong references to
+        # those refresh tasks until they finish
+        self._refreshing: set[str] = set()
+        self._refresh_tasks: set[asyncio.Task] = set()
 
     async def get(self, key: str) -> EncodableT | None:
         final_key = self.cache_key.make_key(key)
         return await self.cache_provider.get(final_key)
 
-    async def set(self, key: str, value: EncodableT) -> None:
+    async def set(self, key: str, value: EncodableT, ttl: float | None = None) -> None:
         final_key = self.cache_key.make_key(key)
-        return await self.cache_provider.set(final_key, value)
+        return await self.cache_provider.set(final_key, value, ttl)
+
+    async def get_many(self, keys: list[str]) -> dict[str, EncodableT | None]:
+        final_keys = {self.cache_key.make_key(key): key for key in keys}
+        values = await self.cache_provider.get_many(list(final_keys))
+        return {key: values.get(final_key) for final_key, key in final_keys.items()}
+
+    async def set_many(
+        self, items: Mapping[str, EncodableT], ttl: float | None = None
+    ) -> None:
+        await self.cache_provider.set_many(
+            {self.cache_key.make_key(key): value for key, value in items.items()},
+            ttl,
+        )
+
+    def _generation_key(self, scope: str | None) -> str:
+        if scope is None:
+            return self.cache_key.make_key("generation")
+        return self.cache_key.make_key(f"generation:{scope}")
+
+    def generation_pattern(self) -> str:
+        """
+        A glob pattern matching the provider keys of every generation counter.
+        """
+        return self.cache_key.make_key("generation*")
+
+    async def generations(self, scopes: Iterable[str | None]) -> list[int]:
+        """
+        The current generation of each scope, where None is the whole
+        namespace.
+        """
+        counter_keys = [self._generation_key(scope) for scope in scopes]
+        now = time.monotonic()
+        outdated = [
+            key
+            for key in dict.fromkeys(counter_keys)
+            if key not in self._generations
+            or now - self._generations[key][1] > self.generation_ttl
+        ]
+        if outdated:
+            counters = await self.cache_provider.get_counters(outdated)
+            for key, generation in counters.items():
+                self._generations[key] = (generation, now)
+        return [self._generations[key][0] for key in counter_keys]
+
+    async def generational_key(self, key: str, scopes: Iterable[str] = ()) -> str:
+        """
+        Qualify the key with the current generations of the namespace and the
+        given scopes, so invalidating any of them moves readers to new keys.
+        Keys are left as they are until something has been invalidated.
+        """
+        return self._qualify(key, await self.generations([None, *scopes]))
+
+    @staticmethod
+    def _qualify(key: str, generations: list[int]) -> str:
+        if not any(generations):
+            return key
+        return f"{key}:g{'.'.join(str(generation) for generation in generations)}"
+
+    async def invalidate(self, scope: str | None = None) -> int:
+        """
+        Invalidate every key in the scope, or the whole namespace if no scope
+        is given, by bumping its generation. Entries under old generations are
+        never read again and are left to expire or be evicted by the provider.
+        Returns the new generation.
+        """
+        counter_key = self._generation_key(scope)
+        generation = await self.cache_provider.incr(counter_key)
+        self._generations[counter_key] = (generation, time.monotonic())
+        logger.info("Invalidated cache scope '%s'", scope or "*")
+        return generation
+
+    async def single_flight[R](
+        self, key: str, compute: Callable[[], Coroutine[Any, Any, R]]
+    ) -> R:
+        """
+        Run compute for the key, unless a call for the same key is already in
+        flight, in which case wait for and share its result instead.
+        """
+        final_key = self.cache_key.make_key(key)
+        while True:
+            with self._in_flight_lock:
+                future = self._in_flight.get(final_key)
+                is_leader = future is None
+                if future is None:
+                    future = futures.Future()
+                    self._in_flight[final_key] = future
+
+            if is_leader:
+                try:
+                    result = await compute()
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except BaseException as e:
+                    future.set_exception(e)
+                    raise
+                else:
+                    future.set_result(result)
+                    return result
+                finally:
+                    with self._in_flight_lock:
+                        self._in_flight.pop(final_key, None)
+
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if task is not None and task.cancelling():
+                    raise
+                # the computing call was cancelled, so take over from it
+
+    def refresh_in_background(
+        self, key: str, compute: Callable[[], Coroutine[Any, Any, Any]]
+    ) -> None:
+        """
+        Recompute the key on the running event loop without waiting for it,
+        unless it is already being computed.
+        """
+        final_key = self.cache_key.make_key(key)
+        with self._in_flight_lock:
+            if final_key in self._in_flight or final_key in self._refreshing:
+                return
+            self._refreshing.add(final_key)
+
+        async def refresh():
+            try:
+                await self.single_flight(key, compute)
+            except Exception as e:
+                logger.warning("Background refresh of '%s' failed: %s", key, str(e))
+            finally:
+                with self._in_flight_lock:
+                    self._refreshing.discard(final_key)
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
 
     @staticmethod
     def with_cache[
@@ -52,6 +366,8 @@ class Cache[C: CacheProvider]:
     ](
         cache_accessor: CacheAccessor[S],
         key_serializer: KeySerializer[P],
+        policy: CachePolicy | PolicySelector[P] | None = None,
+        scopes: ScopeSerializer[P] | None = None,
     ) -> Callable[
         [Callable[Concatenate[S, P], Coroutine[Any, Any, R]]],
         Callable[Concatenate[S, P], Coroutine[Any, Any, R]],
@@ -59,23 +375,89 @@ class Cache[C: CacheProvider]:
         def decorator(
             fn: Callable[Concatenate[S, P], Coroutine[Any, Any, R]],
         ) -> Callable[Concatenate[S, P], Coroutine[Any, Any, R]]:
+            def key_parts(
+                *args: P.args, **kwargs: P.kwargs
+            ) -> tuple[str, list[str]]:
+                # every method's keys can also be invalidated together, by
+                # the method's name
+                key_scopes = [fn.__name__]
+                if scopes is not None:
+                    key_scopes.extend(scopes(*args, **kwargs))
+                return f"{fn.__name__}:{key_serializer(*args, **kwargs)}", key_scopes
+
+            async def make_key(
+                cache: Cache[CacheProvider], *args: P.args, **kwargs: P.kwargs
+            ) -> str:
+                return await cache.generational_key(*key_parts(*args, **kwargs))
+
             @functools.wraps(fn)
             async def inner(self: S, *args: P.args, **kwargs: P.kwargs) -> R:
                 cache = cache_accessor(self)
-                key = f"{fn.__name__}:{key_serializer(*args, **kwargs)}"
+                key = await make_key(cache, *args, **kwargs)
+                key_policy = (
+                    policy(*args, **kwargs) if callable(policy) else policy
+                )
+
+                async def compute() -> R:
+                    result = await fn(self, *args, **kwargs)
+                    if key_policy is None:
+                        await cache.set(key, result)
+                    else:
+                        await cache.set(key, key_policy.wrap(result), key_policy.ttl)
+                    return result
 
                 cached = await cache.get(key)
-                if cached is not None:
+                if cached is not None and key_policy is None:
                     return cast(R, cached)
+                if cached is not None and key_policy is not None:
+                    value, cached_at = CachePolicy.unwrap(cached)
+                    if not key_policy.is_expired(cached_at):
+                        if key_policy.is_stale(cached_at):
+                            cache.refresh_in_background(key, compute)
+                        return cast(R, value)
 
-                result = await fn(self, *args, **kwargs)
-                await cache.set(key, result)
-                return result
+                return await cache.single_flight(key, compute)
 
+            inner.cache_key = make_key  # type: ignore[attr-defined]
+            inner.cache_key_parts = key_parts  # type: ignore[attr-defined]
             return inner
 
         return decorator
 
+    async def key_for(
+        self, method: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> str:
+        """
+        The key a with_cache decorated method currently stores its result
+        under for the given arguments, for use with get_many/set_many.
+        """
+        make_key = method.cache_key  # type: ignore[attr-defined]
+        return await make_key(self, *args, **kwargs)
+
+    async def keys_for(
+        self, calls: Iterable[tuple[Callable[..., Any], tuple[Any, ...]]]
+    ) -> list[str]:
+        """
+        The keys of key_for for many method and argument pairs. The
+        generations of all their scopes are read in one batch rather than
+        once per key.
+        """
+        parts = [
+            method.cache_key_parts(*args)  # type: ignore[attr-defined]
+            for method, args in calls
+        ]
+        scopes = list(
+            dict.fromkeys(scope for _, key_scopes in parts for scope in key_scopes)
+        )
+        namespace, *generations = await self.generations([None, *scopes])
+        by_scope = dict(zip(scopes, generations))
+        return [
+            self._qualify(
+                key, [namespace, *(by_scope[scope] for scope in key_scopes)]
+            )
+            for key, key_scopes in parts
+        ]
+
     @staticmethod
     def typed_serializer[**P](serializer: KeySerializer[P]) -> KeySerializer[P]:
         """
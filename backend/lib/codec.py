@@ -0,0 +1,188 @@
+import json
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any
+
+from lib.cache import EncodableT
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    from compression import zstd
+except ImportError:  # only in the standard library from Python 3.14
+    zstd = None
+
+
+# Every encoded value starts with this marker and a one byte tag naming the
+# codec (or scalar type) that wrote it, so values can always be decoded no
+# matter which codec is currently selected for their key.
+VALUE_MARKER = b"\xbc"
+STR_TAG = b"s"
+BYTES_TAG = b"b"
+INT_TAG = b"i"
+FLOAT_TAG = b"f"
+
+
+class Codec(ABC):
+    name: str
+    tag: bytes
+
+    @abstractmethod
+    def encode(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    name = "json"
+    tag = b"j"
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class ZlibJsonCodec(JsonCodec):
+    name = "json+zlib"
+    tag = b"z"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def encode(self, value: Any) -> bytes:
+        return zlib.compress(super().encode(value), self.level)
+
+    def decode(self, data: bytes) -> Any:
+        return super().decode(zlib.decompress(data))
+
+
+class ZstdJsonCodec(JsonCodec):
+    name = "json+zstd"
+    tag = b"J"
+
+    def encode(self, value: Any) -> bytes:
+        return zstd.compress(super().encode(value))  # type: ignore[union-attr]
+
+    def decode(self, data: bytes) -> Any:
+        return super().decode(zstd.decompress(data))  # type: ignore[union-attr]
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+    tag = b"m"
+
+    def encode(self, value: Any) -> bytes:
+        return msgpack.packb(value)  # type: ignore[union-attr]
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data)  # type: ignore[union-attr]
+
+
+class ZstdMsgpackCodec(MsgpackCodec):
+    name = "msgpack+zstd"
+    tag = b"M"
+
+    def encode(self, value: Any) -> bytes:
+        return zstd.compress(super().encode(value))  # type: ignore[union-attr]
+
+    def decode(self, data: bytes) -> Any:
+        return super().decode(zstd.decompress(data))  # type: ignore[union-attr]
+
+
+def available_codecs() -> dict[str, Codec]:
+    codecs: list[Codec] = [JsonCodec(), ZlibJsonCodec()]
+    if zstd is not None:
+        codecs.append(ZstdJsonCodec())
+    if msgpack is not None:
+        codecs.append(MsgpackCodec())
+        if zstd is not None:
+            codecs.append(ZstdMsgpackCodec())
+    return {codec.name: codec for codec in codecs}
+
+
+def parse_codec_config(config: str) -> dict[str, str]:
+    """
+    Parse "prefix=codec,prefix=codec" into a mapping of key prefix to codec
+    name.
+    """
+    result = {}
+    for entry in config.split(","):
+        if not entry.strip():
+            continue
+        prefix, _, name = entry.partition("=")
+        result[prefix.strip()] = name.strip()
+    return result
+
+
+class CodecSelector:
+    """
+    Encodes cache values with the codec configured for the longest matching
+    key prefix, and decodes values written by any known codec.
+    """
+
+    def __init__(self, default: str, prefix_codecs: dict[str, str] | None = None):
+        self.codecs = available_codecs()
+        self.default = self._codec(default)
+        # longest prefixes first so the most specific one wins
+        self.prefix_codecs = sorted(
+            (
+                (prefix, self._codec(name))
+                for prefix, name in (prefix_codecs or {}).items()
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        self.by_tag = {codec.tag: codec for codec in self.codecs.values()}
+
+    def _codec(self, name: str) -> Codec:
+        if name not in self.codecs:
+            raise ValueError(
+                f"Unknown or unavailable cache codec '{name}', "
+                f"expected one of: {', '.join(self.codecs)}"
+            )
+        return self.codecs[name]
+
+    def codec_for(self, key: str) -> Codec:
+        for prefix, codec in self.prefix_codecs:
+            if key.startswith(prefix):
+                return codec
+        return self.default
+
+    def encode(self, key: str, value: EncodableT) -> bytes:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return VALUE_MARKER + BYTES_TAG + bytes(value)
+        if isinstance(value, str):
+            return VALUE_MARKER + STR_TAG + value.encode()
+        # bool is an int, but belongs with the other structured values
+        if isinstance(value, int) and not isinstance(value, bool):
+            return VALUE_MARKER + INT_TAG + str(value).encode()
+        if isinstance(value, float):
+            return VALUE_MARKER + FLOAT_TAG + repr(value).encode()
+        codec = self.codec_for(key)
+        return VALUE_MARKER + codec.tag + codec.encode(value)
+
+    def decode(self, data: bytes) -> EncodableT:
+        if not data.startswith(VALUE_MARKER):
+            # written before values were tagged, when strings were stored as is
+            return data.decode()
+        tag, payload = data[1:2], data[2:]
+        if tag == STR_TAG:
+            return payload.decode()
+        if tag == BYTES_TAG:
+            return payload
+        if tag == INT_TAG:
+            return int(payload)
+        if tag == FLOAT_TAG:
+            return float(payload)
+        codec = self.by_tag.get(tag)
+        if codec is None:
+            raise ValueError(f"Unknown cache value tag: {tag!r}")
+        return codec.decode(payload)
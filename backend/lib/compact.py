@@ -0,0 +1,118 @@
+from collections.abc import Iterable
+from typing import Any
+
+
+FORMAT = "compact-v1"
+# observation fields interned into the species and places tables
+SPECIES_FIELDS = ("speciesCode", "comName", "sciName")
+PLACE_FIELDS = ("locId", "locName", "lat", "lng")
+
+
+class _Table:
+    """
+    Interns rows of fixed fields, stored column by column.
+    """
+
+    def __init__(self, fields: tuple[str, ...]):
+        self.fields = fields
+        self.columns: dict[str, list] = {field: [] for field in fields}
+        self._index: dict[tuple, int] = {}
+
+    def intern(self, record: dict[str, Any]) -> int:
+        row = tuple(record.get(field) for field in self.fields)
+        index = self._index.get(row)
+        if index is None:
+            index = self._index[row] = len(self._index)
+            for field, value in zip(self.fields, row):
+                self.columns[field].append(value)
+        return index
+
+
+def _columns(records: Iterable[dict[str, Any]], skip: set[str]) -> dict[str, list]:
+    """
+    The records' fields as columns, with None where a record lacks one.
+    """
+    columns: dict[str, list] = {}
+    count = 0
+    for record in records:
+        for field, value in record.items():
+            if field not in skip:
+                columns.setdefault(field, [None] * count).append(value)
+        count += 1
+        for column in columns.values():
+            if len(column) < count:
+                column.append(None)
+    return columns
+
+
+def _rows(columns: dict[str, list], count: int) -> list[dict[str, Any]]:
+    return [
+        {
+            field: column[i]
+            for field, column in columns.items()
+            if column[i] is not None
+        }
+        for i in range(count)
+    ]
+
+
+def compact_scores(hotspot_scores: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Hotspot scores with each species and observation place stored once, in
+    lookup tables, and every other field stored as a column. Observations
+    reference their hotspot, species and place by index. Fields that are
+    null are left out when expanded again.
+    """
+    species = _Table(SPECIES_FIELDS)
+    places = _Table(PLACE_FIELDS)
+    observations = []
+    references: dict[str, list[int]] = {"hotspot": [], "species": [], "place": []}
+    for hotspot_index, hotspot_score in enumerate(hotspot_scores):
+        for species_observations in hotspot_score["missing_species"].values():
+            for observation in species_observations:
+                references["hotspot"].append(hotspot_index)
+                references["species"].append(species.intern(observation))
+                references["place"].append(places.intern(observation))
+                observations.append(observation)
+
+    return {
+        "format": FORMAT,
+        "species": species.columns,
+        "places": places.columns,
+        "hotspots": _columns(hotspot_scores, skip={"missing_species"}),
+        "hotspot_count": len(hotspot_scores),
+        "observations": {
+            **references,
+            **_columns(observations, skip={*SPECIES_FIELDS, *PLACE_FIELDS}),
+        },
+    }
+
+
+def expand_scores(compact: dict[str, Any]) -> list[dict[str, Any]]:
+    """
+    The hotspot scores a compact_scores result was made from.
+    """
+    if compact.get("format") != FORMAT:
+        raise ValueError(f"Expected the {FORMAT} format")
+    hotspot_scores = _rows(compact["hotspots"], compact["hotspot_count"])
+    for hotspot_score in hotspot_scores:
+        hotspot_score["missing_species"] = {}
+
+    species, places = compact["species"], compact["places"]
+    columns = dict(compact["observations"])
+    references = [columns.pop(name) for name in ("hotspot", "species", "place")]
+    observations = _rows(columns, len(references[0]))
+    for hotspot_index, species_index, place_index, observation in zip(
+        *references, observations
+    ):
+        record = {
+            **{field: species[field][species_index] for field in SPECIES_FIELDS},
+            **{field: places[field][place_index] for field in PLACE_FIELDS},
+        }
+        record = {
+            field: value for field, value in record.items() if value is not None
+        }
+        record.update(observation)
+        missing_species = hotspot_scores[hotspot_index]["missing_species"]
+        missing_species.setdefault(record["speciesCode"], []).append(record)
+    return hotspot_scores
@@ -0,0 +1,15 @@
+import os
+from collections.abc import Mapping
+
+
+def choose_from_env[T](variable: str, choices: Mapping[str, T], default: str) -> T:
+    """
+    The choice named by an environment variable, or its default. Unknown
+    names raise a ValueError listing the known ones.
+    """
+    name = os.getenv(variable) or default
+    if name not in choices:
+        raise ValueError(
+            f"Unknown {variable} '{name}', expected one of: {', '.join(choices)}"
+        )
+    return choices[name]
@@ -0,0 +1,28 @@
+from abc import ABC, abstractmethod
+from typing import Any
+
+
+# states after which a job publishes nothing more
+FINAL_STATES = frozenset({"completed", "failed"})
+
+
+class JobEvents(ABC):
+    """
+    The latest event published by each running job. Events replace each
+    other, so readers only ever see the current state, and each has a
+    version that goes up by one per publish.
+    """
+
+    @abstractmethod
+    def publish(self, job_id: str, event: dict[str, Any]) -> int:
+        """
+        Replace the job's event, returning the new event's version.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def latest(self, job_id: str) -> tuple[int, dict[str, Any]] | None:
+        """
+        The job's latest event and its version, if it published one recently.
+        """
+        raise NotImplementedError
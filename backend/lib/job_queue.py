@@ -0,0 +1,50 @@
+from abc import ABC, abstractmethod
+
+
+class Lease:
+    """
+    A claim on one queued job. Unless it is renewed with heartbeat, the job
+    is redelivered to another consumer once the lease expires.
+    """
+
+    def __init__(self, message_id: str, job_id: str, priority: int = 0):
+        self.message_id = message_id
+        self.job_id = job_id
+        self.priority = priority
+
+    def __repr__(self) -> str:
+        return f"Lease({self.message_id!r}, {self.job_id!r}, {self.priority})"
+
+
+class JobQueue(ABC):
+    """
+    An at least once queue of job ids. Consumers claim a lease on a job, keep
+    it alive with heartbeats while the job runs, and acknowledge it once the
+    job's result is saved.
+    """
+
+    @abstractmethod
+    async def enqueue(self, job_id: str, priority: int = 0) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def claim(self, consumer: str, timeout: float) -> Lease | None:
+        """
+        Claim the next job, preferring jobs whose lease has expired. Waits up
+        to timeout seconds for one to be available.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def heartbeat(self, consumer: str, lease: Lease) -> None:
+        """
+        Renew the lease for another lease duration.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def ack(self, lease: Lease) -> None:
+        """
+        Remove the job from the queue for good.
+        """
+        raise NotImplementedError
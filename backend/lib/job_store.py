@@ -0,0 +1,86 @@
+import base64
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+
+
+class InvalidCursor(ValueError): ...
+
+
+def encode_cursor(created_at: float, job_id: str) -> str:
+    """
+    An opaque cursor pointing just after the given job in newest first order.
+    """
+    return base64.urlsafe_b64encode(f"{created_at!r}:{job_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[float, str]:
+    try:
+        created_at, _, job_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().partition(":")
+        )
+        return float(created_at), job_id
+    except ValueError as e:
+        raise InvalidCursor(cursor) from e
+
+
+class JobStore(ABC):
+    """
+    Stores serialized jobs, indexed by owner and creation time, and their
+    encoded results apart from them.
+    """
+
+    @abstractmethod
+    def save(self, job_id: str, owner: str, created_at: float, data: str) -> None:
+        """
+        Insert a job, or replace the data of an existing one.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def load(self, job_id: str) -> str | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_for_owner(
+        self, owner: str, limit: int | None = None, cursor: str | None = None
+    ) -> tuple[list[str], str | None]:
+        """
+        A page of the owner's jobs, newest first, starting after the cursor.
+        Also returns the cursor of the next page, or None if this is the last.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_created_since(self, since: float) -> Iterator[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_result(self, job_id: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_result(self, job_id: str) -> bytes | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_checkpoint(self, job_id: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_checkpoint(self, job_id: str) -> bytes | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_checkpoint(self, job_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_job_for_hash(self, content_hash: str, job_id: str) -> None:
+        """
+        Record the job that last ran the work with this content hash.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_job_for_hash(self, content_hash: str) -> str | None:
+        raise NotImplementedError
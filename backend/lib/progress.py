@@ -0,0 +1,102 @@
+import contextlib
+from collections.abc import Callable, Iterator
+from contextvars import ContextVar
+from typing import Any
+
+
+class Progress:
+    """
+    How far along a job is: the phase it is in, counters within it, the
+    best result so far, and a checkpoint of finished work to resume from.
+    The versions go up with every change, so publishers can tell whether
+    there is anything new to send.
+    """
+
+    def __init__(self, checkpoint: dict[str, Any] | None = None):
+        self.phase: str | None = None
+        self.counts: dict[str, int] = {}
+        self.version = 0
+        self._partial: Callable[[], Any] | None = None
+        self.partial_version = 0
+        self.checkpoint: dict[str, Any] = dict(checkpoint or {})
+        self.checkpoint_version = 0
+
+    def set_phase(self, phase: str, **counts: int) -> None:
+        self.phase = phase
+        self.counts.update(counts)
+        self.version += 1
+
+    def advance(self, counter: str, amount: int = 1) -> None:
+        self.counts[counter] = self.counts.get(counter, 0) + amount
+        self.version += 1
+
+    def set_partial(self, result: Callable[[], Any]) -> None:
+        """
+        Record that the partial result changed. It is computed by result()
+        only when it is published, however often it changes before then.
+        """
+        self._partial = result
+        self.partial_version += 1
+
+    def partial(self) -> Any:
+        return self._partial() if self._partial is not None else None
+
+    def set_checkpoint(self, key: str, value: Any) -> None:
+        self.checkpoint[key] = value
+        self.checkpoint_version += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"phase": self.phase, **self.counts}
+
+
+_current: ContextVar[Progress | None] = ContextVar("progress", default=None)
+
+
+@contextlib.contextmanager
+def tracking(progress: Progress) -> Iterator[Progress]:
+    """
+    Record progress reported by the current task, and the tasks it starts,
+    in the given Progress.
+    """
+    token = _current.set(progress)
+    try:
+        yield progress
+    finally:
+        _current.reset(token)
+
+
+def set_phase(phase: str, **counts: int) -> None:
+    """
+    Report the phase of the work being tracked, if any is.
+    """
+    if (progress := _current.get()) is not None:
+        progress.set_phase(phase, **counts)
+
+
+def advance(counter: str, amount: int = 1) -> None:
+    if (progress := _current.get()) is not None:
+        progress.advance(counter, amount)
+
+
+def set_partial(result: Callable[[], Any]) -> None:
+    if (progress := _current.get()) is not None:
+        progress.set_partial(result)
+
+
+def get_checkpoint(key: str) -> Any:
+    """
+    The value checkpointed under key by an earlier run of the tracked work,
+    or None.
+    """
+    if (progress := _current.get()) is not None:
+        return progress.checkpoint.get(key)
+    return None
+
+
+def set_checkpoint(key: str, value: Any) -> None:
+    """
+    Checkpoint a finished piece of the tracked work, so a run resumed after a
+    restart needn't redo it.
+    """
+    if (progress := _current.get()) is not None:
+        progress.set_checkpoint(key, value)
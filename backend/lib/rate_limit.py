@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A token bucket that refills at `rate` tokens per second up to `burst`
+    tokens. Callers reserve a token up front and sleep until it is due, so a
+    single bucket can be shared by every thread and event loop in a process.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.tokens = min(float(self.burst), self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        """
+        Take a token, returning the number of seconds to wait before it may be
+        used. The balance may go negative, which queues later callers behind
+        earlier ones.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def refund(self) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(float(self.burst), self.tokens + 1)
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay <= 0:
+            return
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            # a cancelled waiter never used its token, so hand it back
+            self.refund()
+            raise
+
+
+class RateLimiter:
+    """
+    A set of token buckets sharing one rate and burst, keyed by an arbitrary
+    string such as an API key.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, key: str) -> TokenBucket:
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self.buckets[key] = bucket
+            return bucket
+
+    async def acquire(self, key: str) -> None:
+        await self.bucket(key).acquire()
@@ -0,0 +1,167 @@
+import fnmatch
+import gzip
+import logging
+import os
+import struct
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
+
+from lib.cache import CacheProvider, EncodableT
+from lib.codec import CodecSelector
+
+
+logger = logging.getLogger(__name__)
+
+
+# A snapshot is a gzip stream of this header followed by records of a one
+# byte kind, a length prefixed key and a length prefixed value, so it can be
+# written and loaded in batches without holding the whole cache in memory.
+MAGIC = b"BIRDSPOT-CACHE-SNAPSHOT\x01"
+VALUE_RECORD = b"v"
+COUNTER_RECORD = b"c"
+
+_LENGTH = struct.Struct(">I")
+# values are stored in the tagged format cache providers use, without
+# compression of their own since the whole stream is compressed
+_CODECS = CodecSelector(default="json")
+
+
+def write_record(file: BinaryIO, kind: bytes, key: str, data: bytes) -> None:
+    key_bytes = key.encode()
+    file.write(kind)
+    file.write(_LENGTH.pack(len(key_bytes)))
+    file.write(key_bytes)
+    file.write(_LENGTH.pack(len(data)))
+    file.write(data)
+
+
+def read_records(file: BinaryIO) -> Iterator[tuple[bytes, str, bytes]]:
+    while kind := file.read(1):
+        key = _read_exactly(file, _LENGTH.unpack(_read_exactly(file, 4))[0])
+        data = _read_exactly(file, _LENGTH.unpack(_read_exactly(file, 4))[0])
+        yield kind, key.decode(), data
+
+
+def _read_exactly(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("Cache snapshot is truncated")
+    return data
+
+
+async def export_snapshot(
+    provider: CacheProvider,
+    path: str,
+    patterns: Iterable[str],
+    counter_pattern: str | None = None,
+    batch_size: int = 500,
+) -> int:
+    """
+    Write every key matching the patterns to a snapshot file, returning how
+    many entries were written. Keys matching counter_pattern are stored as
+    counters, so they can be restored in a form incr can update.
+    """
+    temp_path = f"{path}.tmp"
+    written = 0
+    seen: set[str] = set()
+    with gzip.open(temp_path, "wb") as file:
+        file.write(MAGIC)
+        for pattern in patterns:
+            batch: list[str] = []
+            async for key in provider.scan(pattern):
+                if key in seen:
+                    continue
+                seen.add(key)
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    written += await _export_batch(
+                        provider, file, batch, counter_pattern
+                    )
+                    batch = []
+            written += await _export_batch(provider, file, batch, counter_pattern)
+    # only replace an existing snapshot once the new one is complete
+    os.replace(temp_path, path)
+    return written
+
+
+async def _export_batch(
+    provider: CacheProvider,
+    file: BinaryIO,
+    keys: list[str],
+    counter_pattern: str | None,
+) -> int:
+    counter_keys = [
+        key
+        for key in keys
+        if counter_pattern is not None and fnmatch.fnmatchcase(key, counter_pattern)
+    ]
+    value_keys = [key for key in keys if key not in counter_keys]
+    written = 0
+    if counter_keys:
+        for key, counter in (await provider.get_counters(counter_keys)).items():
+            write_record(file, COUNTER_RECORD, key, str(counter).encode())
+            written += 1
+    if value_keys:
+        for key, value in (await provider.get_many(value_keys)).items():
+            if value is None:
+                # expired or evicted since the scan
+                continue
+            write_record(file, VALUE_RECORD, key, _CODECS.encode(key, value))
+            written += 1
+    return written
+
+
+async def import_snapshot(
+    provider: CacheProvider,
+    path: str,
+    ttl: float | None = None,
+    overwrite: bool = False,
+    batch_size: int = 500,
+) -> int:
+    """
+    Load a snapshot file into the provider, returning how many entries were
+    stored. Unless overwrite is set, keys the provider already holds are left
+    alone, since they are at least as fresh as the snapshot. Counters are
+    never moved backwards.
+    """
+    loaded = 0
+    with gzip.open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a cache snapshot")
+        values: dict[str, EncodableT] = {}
+        for kind, key, data in read_records(file):  # type: ignore[arg-type]
+            if kind == COUNTER_RECORD:
+                loaded += await _import_counter(provider, key, int(data))
+            elif kind == VALUE_RECORD:
+                values[key] = _CODECS.decode(data)
+                if len(values) >= batch_size:
+                    loaded += await _import_batch(provider, values, ttl, overwrite)
+                    values = {}
+            else:
+                raise ValueError(f"Unknown cache snapshot record kind: {kind!r}")
+        loaded += await _import_batch(provider, values, ttl, overwrite)
+    return loaded
+
+
+async def _import_counter(provider: CacheProvider, key: str, counter: int) -> int:
+    current = (await provider.get_counters([key]))[key]
+    if current >= counter:
+        return 0
+    await provider.set_counter(key, counter)
+    return 1
+
+
+async def _import_batch(
+    provider: CacheProvider,
+    values: dict[str, EncodableT],
+    ttl: float | None,
+    overwrite: bool,
+) -> int:
+    if not overwrite and values:
+        existing = await provider.get_many(list(values))
+        values = {
+            key: value for key, value in values.items() if existing.get(key) is None
+        }
+    if values:
+        await provider.set_many(values, ttl)
+    return len(values)
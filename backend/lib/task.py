@@ -0,0 +1,125 @@
+import datetime
+import hashlib
+import json
+from collections.abc import Awaitable, Callable, Mapping
+from typing import Any
+
+import attrs
+
+
+class UnknownTask(KeyError): ...
+
+
+def _serialize(instance: Any, field: attrs.Attribute, value: Any) -> Any:
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    raise TypeError(f"Can't hash a {type(value).__name__}")
+
+
+class Task[P]:
+    """
+    A named kind of job. Its payload is an attrs class, stored as JSON so
+    jobs can be listed and started without unpickling anything.
+
+    Tasks with a dedup_key treat payloads with equal keys as the same work,
+    so a job can reuse the result of an earlier one. Tasks with a summarize
+    function keep a smaller summary of their result alongside the job, for
+    listing jobs without loading every result. Tasks with a priority function
+    choose where each job waits in the queue, lower running first.
+    """
+
+    DEFAULT_PRIORITY = 0
+
+    def __init__(
+        self,
+        name: str,
+        payload_type: type[P],
+        handler: Callable[[P], Awaitable[Any]],
+        dedup_key: Callable[[P], Any] | None = None,
+        summarize: Callable[[Any], Any] | None = None,
+        priority: Callable[[P], int] | None = None,
+    ):
+        self.name = name
+        self.payload_type = payload_type
+        self.handler = handler
+        self.dedup_key = dedup_key
+        self.summarize = summarize
+        self.priority = priority
+
+    def encode(self, payload: P) -> dict[str, Any]:
+        if not isinstance(payload, self.payload_type):
+            raise TypeError(
+                f"Task '{self.name}' expects {self.payload_type.__name__}, "
+                f"got {type(payload).__name__}"
+            )
+        return attrs.asdict(payload, value_serializer=_serialize)
+
+    def decode(self, data: Mapping[str, Any]) -> P:
+        # ignore fields a newer version of the payload may have written
+        fields = attrs.fields(self.payload_type)  # type: ignore[arg-type]
+        names = {field.name for field in fields}
+        return self.payload_type(
+            **{key: value for key, value in data.items() if key in names}
+        )
+
+    def content_hash(self, payload: P) -> str | None:
+        """
+        A hash of the payload's dedup key, or None if the task doesn't
+        deduplicate. Sets and dicts hash the same in any order.
+        """
+        if self.dedup_key is None:
+            return None
+        key = json.dumps(
+            [self.name, self.dedup_key(payload)],
+            sort_keys=True,
+            separators=(",", ":"),
+            default=_canonical,
+        )
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def summarize_result(self, result: Any) -> Any:
+        if self.summarize is None:
+            return result
+        return self.summarize(result)
+
+    def priority_for(self, payload: P) -> int:
+        if self.priority is None:
+            return self.DEFAULT_PRIORITY
+        return self.priority(payload)
+
+    async def run(self, payload: P) -> Any:
+        return await self.handler(payload)
+
+
+class TaskRegistry:
+    def __init__(self):
+        self.tasks: dict[str, Task] = {}
+
+    def register[P](
+        self,
+        name: str,
+        payload_type: type[P],
+        handler: Callable[[P], Awaitable[Any]],
+        dedup_key: Callable[[P], Any] | None = None,
+        summarize: Callable[[Any], Any] | None = None,
+        priority: Callable[[P], int] | None = None,
+    ) -> Task[P]:
+        if name in self.tasks:
+            raise ValueError(f"Task '{name}' is already registered")
+        task = Task(name, payload_type, handler, dedup_key, summarize, priority)
+        self.tasks[name] = task
+        return task
+
+    def get(self, name: str) -> Task:
+        try:
+            return self.tasks[name]
+        except KeyError:
+            raise UnknownTask(name) from None
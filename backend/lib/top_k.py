@@ -0,0 +1,48 @@
+import heapq
+from collections.abc import Callable
+from typing import Any
+
+
+class TopK[T]:
+    """
+    The k items with the highest keys seen so far, kept in a heap of size k.
+    Items with equal keys rank by the order they were added in, as a stable
+    descending sort of every item would. With k None every item is kept.
+    """
+
+    def __init__(self, k: int | None, key: Callable[[T], Any]):
+        if k is not None and k < 1:
+            raise ValueError("k must be at least 1")
+        self.k = k
+        self.key = key
+        # (key, -order, item), so the heap's root is the item to drop next
+        self._heap: list[tuple[Any, int, T]] = []
+        self._count = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, item: T, order: int | None = None) -> bool:
+        """
+        Offer an item, ranked among equal keys by order, which defaults to
+        the number of items offered before it. Returns whether it was kept.
+        """
+        if order is None:
+            order = self._count
+        self._count += 1
+        entry = (self.key(item), -order, item)
+        if self.k is None or len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[:2] <= self._heap[0][:2]:
+            return False
+        heapq.heapreplace(self._heap, entry)
+        return True
+
+    def items(self) -> list[T]:
+        """
+        The kept items, best first.
+        """
+        return [
+            item for _, _, item in sorted(self._heap, key=lambda e: e[:2], reverse=True)
+        ]
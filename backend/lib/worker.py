@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import threading
+from collections import Counter, deque
+from collections.abc import Callable, Coroutine
+from concurrent import futures
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    def __init__(
+        self,
+        owner: str,
+        factory: Callable[[], Coroutine[Any, Any, Any]],
+        future: futures.Future,
+    ):
+        self.owner = owner
+        self.factory = factory
+        self.future = future
+
+
+class WorkerLoop:
+    """
+    Runs coroutines on one long-lived event loop in a background thread, so
+    they share the loop's connection pools and caches instead of each
+    building a loop of their own.
+
+    At most max_concurrency coroutines run at once. Waiting work is started
+    by priority (lower first). Within a priority, the owner with the fewest
+    running coroutines goes first, and owners are otherwise served round
+    robin, so one owner's backlog can't starve everyone else. Owners never
+    run more than max_per_owner coroutines at once, if that is set.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_per_owner: int | None = None,
+        name: str = "worker-loop",
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_per_owner = max_per_owner
+        self.name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        # the following are only touched on the loop's thread
+        # priority -> owner -> waiting entries, with owners in serving order
+        self._pending: dict[int, dict[str, deque[_Entry]]] = {}
+        self._running = 0
+        self._running_by_owner: Counter[str] = Counter()
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name=self.name, daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def submit(
+        self,
+        owner: str,
+        factory: Callable[[], Coroutine[Any, Any, Any]],
+        priority: int = 0,
+    ) -> futures.Future:
+        """
+        Queue factory() to run on the loop, returning a future for its result.
+        Cancelling the future before the coroutine starts removes it from the
+        queue.
+        """
+        future: futures.Future = futures.Future()
+        entry = _Entry(owner, factory, future)
+        self.loop.call_soon_threadsafe(self._enqueue, entry, priority)
+        return future
+
+    def stop(self) -> None:
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+
+    def _enqueue(self, entry: _Entry, priority: int) -> None:
+        owners = self._pending.setdefault(priority, {})
+        owners.setdefault(entry.owner, deque()).append(entry)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_concurrency:
+            entry = self._next()
+            if entry is None:
+                return
+            # skips entries whose future was cancelled while they waited
+            if not entry.future.set_running_or_notify_cancel():
+                continue
+            self._running += 1
+            self._running_by_owner[entry.owner] += 1
+            task = asyncio.get_running_loop().create_task(self._run(entry))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _next(self) -> _Entry | None:
+        for priority in sorted(self._pending):
+            owners = self._pending[priority]
+            eligible = [
+                owner
+                for owner in owners
+                if self.max_per_owner is None
+                or self._running_by_owner[owner] < self.max_per_owner
+            ]
+            if not eligible:
+                continue
+            # min keeps the first of equals, and served owners move to the
+            # back, so ties go round robin
+            owner = min(eligible, key=lambda owner: self._running_by_owner[owner])
+            entries = owners.pop(owner)
+            entry = entries.popleft()
+            if entries:
+                owners[owner] = entries
+            if not owners:
+                del self._pending[priority]
+            return entry
+        return None
+
+    async def _run(self, entry: _Entry) -> None:
+        try:
+            result = await entry.factory()
+        except BaseException as e:
+            entry.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            entry.future.set_result(result)
+        finally:
+            self._running -= 1
+            self._running_by_owner[entry.owner] -= 1
+            if not self._running_by_owner[entry.owner]:
+                del self._running_by_owner[entry.owner]
+            self._dispatch()
@@ -10,6 +10,7 @@ logging.basicConfig(
     ],
 )
 
+import asyncio
 import datetime
 import json
 import os
@@ -28,10 +29,15 @@ else:
 
 import jwt as pyjwt
 from app.dal.auth.file import FileAuth
+from app.dal.ebird import EBirdDAL
 from app.manager.birdspot import BirdSpotManager
 from app.manager.ebird import EBirdManager
 from app.manager.job import JobManager
+from app.manager.job_worker import JobWorker
 from app.manager.regions import RegionSearch
+from app.manager.task import SCORE_REGION_TASK
+from app.manager.warmer import CacheWarmer
+from app.model.task import ScoreRegionPayload
 from lib.auth import (
     Auth,
     AuthProvider,
@@ -39,6 +45,8 @@ from lib.auth import (
     JWTCredentials,
     PasswordCredentials,
 )
+from lib.compact import compact_scores
+from lib.snapshot import import_snapshot
 from minject import Registry
 from sanic import Request, Sanic, response
 from sanic.views import HTTPMethodView
@@ -47,10 +55,27 @@ from sanic_ext import Extend
 
 app = Sanic("BirdSpot")
 app.config.CORS_ORIGINS = "https://birds.cailynhansen.com"
+app.config.CORS_EXPOSE_HEADERS = "X-Next-Cursor"
 Extend(app)
 
 registry = Registry()
 
+logger = logging.getLogger(__name__)
+
+
+# ?format= values for job responses
+RESPONSE_FORMATS = {"json", "compact"}
+
+
+def format_response(job_response, response_format: str):
+    """
+    A job's response, with hotspot scores interned into lookup tables for
+    the compact format.
+    """
+    if response_format == "compact" and isinstance(job_response, list):
+        return compact_scores(job_response)
+    return job_response
+
 
 def CREDENTIAL_ACCESSOR(self, request: Request, *args, **kwargs):
     if not (authorization := request.headers.get("Authorization")):
@@ -153,18 +178,21 @@ class BirdSpotHandler(HTTPMethodView):
             )
 
         life_list_name = body.get("life_list_name", "Life List")
+        try:
+            payload = ScoreRegionPayload(
+                region_code=region_code,
+                life_list=life_list.get("birds", []),
+                life_list_name=life_list_name,
+                target_date=target_date,
+                auth=ebird_api_key,
+                max_concurrency=body.get("max_concurrency", None),
+            )
+        except ValueError as e:
+            return response.json({"error": str(e)}, status=400)
         job = self.job_manager.create_job(
-            credentials.identifier,
-            self.birdspot_manager.get_scores_for_region,
-            payload={
-                "region_code": region_code,
-                "life_list": life_list.get("birds", []),
-                "life_list_name": life_list_name,
-                "target_date": target_date,
-                "auth": ebird_api_key,
-            },
+            credentials.identifier, SCORE_REGION_TASK, payload=payload
         )
-        self.job_manager.start_job(job)
+        await self.job_manager.start_job(job)
         return response.json({"id": job.id, "state": job.state})
 
 
@@ -183,13 +211,74 @@ class JobHandler(HTTPMethodView):
             return response.empty(status=404)
         if job.owner != credentials.identifier:
             return response.empty(status=403)
-
+        response_format = request.args.get("format", "json")
+        if response_format not in RESPONSE_FORMATS:
+            return response.json({"error": "invalid format"}, status=400)
+
+        # the full result is only loaded here, one job at a time
+        job_response = (
+            self.job_manager.get_result(job)
+            if job.state == "completed"
+            else job.response
+        )
         return response.json(
-            {"id": job.id, "state": job.state, "response": job.response}
+            {
+                "id": job.id,
+                "state": job.state,
+                "response": format_response(job_response, response_format),
+                "summary": job.summary,
+            }
         )
 
 
+class JobEventsHandler(HTTPMethodView):
+    """
+    Streams a job's progress as server-sent events, so clients needn't poll
+    JobHandler. Each event's data is the job's state and, while it runs, its
+    phase and hotspot counts. The stream ends after the job completes or
+    fails.
+    """
+
+    # a comment sent on quiet streams keeps proxies from closing them
+    KEEPALIVE_INTERVAL = 15
+
+    def __init__(self, job_manager: JobManager, auth_provider: AuthProvider):
+        self.job_manager = job_manager
+        self.auth = Auth(auth_provider)
+
+    @Auth.requires_auth(
+        auth_accessor=lambda self, request, job_id: self.auth,
+        credentials_accessor=CREDENTIAL_ACCESSOR,
+    )
+    async def get(self, credentials: Credentials, request: Request, job_id: str):
+        job = self.job_manager.get_job(job_id)
+        if job is None:
+            return response.empty(status=404)
+        if job.owner != credentials.identifier:
+            return response.empty(status=403)
+
+        stream = await request.respond(
+            content_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+        )
+        async for event in self.job_manager.follow_events(
+            job, request.headers.get("Last-Event-ID"), self.KEEPALIVE_INTERVAL
+        ):
+            if event is None:
+                await stream.send(": keepalive\n\n")
+            else:
+                await stream.send(self._format(*event))
+        await stream.eof()
+
+    def _format(self, version: int | None, event: dict) -> str:
+        lines = [f"id: {version}"] if version is not None else []
+        lines.append("event: progress")
+        lines.append(f"data: {json.dumps(event)}")
+        return "\n".join(lines) + "\n\n"
+
+
 class UserJobsHandler(HTTPMethodView):
+    MAX_PAGE_SIZE = 100
+
     def __init__(
         self,
         job_manager: JobManager,
@@ -205,26 +294,48 @@ class UserJobsHandler(HTTPMethodView):
         credentials_accessor=CREDENTIAL_ACCESSOR,
     )
     async def get(self, credentials: Credentials, request: Request):
-        jobs = self.job_manager.get_jobs_for_owner(credentials.identifier)
-        return response.json([self._job_to_dict(job) for job in jobs])
+        limit = request.args.get("limit", None)
+        cursor = request.args.get("cursor", None)
+        response_format = request.args.get("format", "json")
+        if response_format not in RESPONSE_FORMATS:
+            return response.json({"error": "invalid format"}, status=400)
+        try:
+            jobs, next_cursor = self.job_manager.get_jobs_for_owner(
+                credentials.identifier,
+                limit=max(1, min(int(limit), self.MAX_PAGE_SIZE)) if limit else None,
+                cursor=cursor,
+            )
+        # a limit that isn't a number, or an InvalidCursor
+        except ValueError:
+            return response.json({"error": "invalid limit or cursor"}, status=400)
+
+        # the response stays a plain list, with the next page's cursor in a
+        # header, so clients that don't paginate still get every job
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return response.json(
+            [self._job_to_dict(job, response_format) for job in jobs],
+            headers=headers,
+        )
 
-    def _job_to_dict(self, job):
-        payload = job.get_decoded_payload()
-        region_code = payload.get("region_code", None)
+    def _job_to_dict(self, job, response_format: str = "json"):
+        payload = self.job_manager.get_payload(job)
+        region_code = payload.region_code
         region_info = (
             self.region_search.get_region_by_code(region_code) if region_code else None
         )
         return {
             "id": job.id,
             "state": job.state,
-            "target_date": payload.get("target_date", None).strftime(
-                "%Y-%m-%dT%H:%M:%S.%fZ"
-            ),
+            "target_date": payload.target_date.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
             "region_code": region_code,
             "region_name": region_info.get("name") if region_info else None,
-            "life_list": payload.get("life_list", None),
-            "life_list_name": payload.get("life_list_name", None),
-            "response": job.response,
+            "life_list": payload.life_list,
+            "life_list_name": payload.life_list_name,
+            # the best few hotspots, with the full result at /api/jobs/<id>
+            "response": format_response(
+                self.job_manager.get_summary(job), response_format
+            ),
+            "summary": job.summary,
         }
 
 
@@ -329,6 +440,14 @@ app.add_route(
     "/api/jobs/<job_id:strorempty>",
     methods=["GET"],
 )
+app.add_route(
+    JobEventsHandler.as_view(
+        job_manager=registry[JobManager],
+        auth_provider=registry[FileAuth],
+    ),
+    "/api/jobs/<job_id:str>/events",
+    methods=["GET"],
+)
 
 app.add_route(
     UserJobsHandler.as_view(
@@ -358,5 +477,71 @@ def make_directories():
 
 make_directories()
 
+
+async def load_cache_snapshot(path: str):
+    ttl = float(os.getenv("BIRDSPOT_CACHE_SNAPSHOT_TTL", str(30 * 24 * 60 * 60)))
+    try:
+        loaded = await import_snapshot(
+            registry[EBirdManager].cache_provider, path, ttl=ttl
+        )
+        logger.info("Loaded %d cache entries from snapshot %s", loaded, path)
+    except Exception as e:
+        logger.error("Failed to load cache snapshot %s: %s", path, str(e))
+
+
+@app.after_server_start
+async def start_cache_snapshot_load(app: Sanic):
+    # load in the background, so the server can take requests meanwhile
+    if (snapshot := os.getenv("BIRDSPOT_CACHE_SNAPSHOT")) and os.path.exists(
+        snapshot
+    ):
+        app.add_task(load_cache_snapshot(snapshot))
+
+
+@app.after_server_start
+async def start_cache_warmer(app: Sanic):
+    if os.getenv("EBIRD_API_KEY") and os.getenv("BIRDSPOT_CACHE_WARMER") != "false":
+        app.add_task(registry[CacheWarmer].run_forever(), name="cache_warmer")
+
+
+@app.after_server_start
+async def start_memory_cache_stats(app: Sanic):
+    interval = float(os.getenv("BIRDSPOT_MEMORY_CACHE_STATS_INTERVAL", "300"))
+    if interval > 0:
+        app.add_task(
+            registry[EBirdManager].memory_cache.log_stats_forever(interval),
+            name="memory_cache_stats",
+        )
+
+
+@app.after_server_start
+async def start_job_worker(app: Sanic):
+    local_queue = os.getenv("BIRDSPOT_JOB_QUEUE", "local") == "local"
+    if local_queue:
+        # the local queue starts out empty, so jobs a restart interrupted
+        # would otherwise never finish
+        await registry[JobManager].resume_orphaned_jobs()
+    # with a shared queue, jobs normally run in worker.py processes instead
+    if local_queue or os.getenv("BIRDSPOT_JOB_WORKER_IN_PROCESS") == "true":
+        app.add_task(registry[JobWorker].run(), name="job_worker")
+
+
+@app.after_server_stop
+async def close_ebird_client(app: Sanic):
+    await registry[EBirdDAL].close()
+
+
+@app.after_server_stop
+async def stop_job_worker(app: Sanic):
+    job_manager = registry[JobManager]
+    # the job worker's loop has an eBird client of its own
+    await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(
+            registry[EBirdDAL].close(), job_manager.worker.loop
+        )
+    )
+    job_manager.close()
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000, dev=True)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+# This script maintains the cache used by the API. Run it from the backend
+# directory so the app modules can be imported:
+#
+#   uv run python -m scripts.cache <command> [arguments]
+
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+
+
+def init():
+    load_dotenv("./.env")
+
+
+def migrate_redis(pattern="ebird:*:v1"):
+    """
+    Rewrite legacy RedisJSON cache entries matching the pattern in the tagged
+    single-read format.
+    """
+    # the cache providers read their configuration from the environment at
+    # import time, so they are imported after init()
+    from app.dal.cache.redis import RedisCache
+    from minject import Registry
+
+    cache = Registry()[RedisCache]
+    migrated = asyncio.run(cache.migrate(pattern))
+    print(f"Migrated {migrated} keys matching '{pattern}'.")
+
+
+def _cache_provider():
+    """
+    The shared cache provider EBirdManager is configured to use.
+    """
+    from app.manager.ebird import EBirdManager
+    from minject import Registry
+
+    return Registry()[EBirdManager].cache_provider
+
+
+def benchmark_codecs(pattern="ebird:*", limit="200"):
+    """
+    Compare the size and encode/decode latency of every available codec on a
+    sample of cached values.
+    """
+    from lib.codec import available_codecs
+
+    async def sample():
+        provider = _cache_provider()
+        keys = []
+        async for key in provider.scan(pattern):
+            keys.append(key)
+            if len(keys) >= int(limit):
+                break
+        values = await provider.get_many(keys)
+        return [value for value in values.values() if value is not None]
+
+    values = asyncio.run(sample())
+    if not values:
+        print(f"No cached values match '{pattern}'.")
+        return
+
+    print(f"Sampled {len(values)} values matching '{pattern}'.")
+    print(
+        f"{'codec':<14}{'bytes':>14}{'ratio':>8}{'encode ms':>12}{'decode ms':>12}"
+    )
+    baseline = None
+    for name, codec in available_codecs().items():
+        start = time.perf_counter()
+        encoded = [codec.encode(value) for value in values]
+        encode_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        for data in encoded:
+            codec.decode(data)
+        decode_ms = (time.perf_counter() - start) * 1000
+        size = sum(len(data) for data in encoded)
+        baseline = baseline or size
+        print(
+            f"{name:<14}{size:>14}{size / baseline:>8.2f}"
+            f"{encode_ms:>12.1f}{decode_ms:>12.1f}"
+        )
+
+
+def invalidate(target):
+    """
+    Invalidate the cached eBird data for a region code, or for every region
+    with "all". Servers notice within BIRDSPOT_CACHE_GENERATION_TTL seconds.
+    """
+    from app.manager.ebird import EBirdManager
+    from minject import Registry
+
+    manager = Registry()[EBirdManager]
+    if target == "all":
+        generation = asyncio.run(manager.cache.invalidate())
+        print(f"Invalidated all cached eBird data (generation {generation}).")
+    else:
+        generation = asyncio.run(manager.invalidate_region(target))
+        print(
+            f"Invalidated cached eBird data for {target} "
+            f"(generation {generation})."
+        )
+
+
+def export_snapshot(path, *patterns):
+    """
+    Write the cached entries matching the patterns (by default all eBird
+    data) to a compressed snapshot file.
+    """
+    from app.manager.ebird import EBirdManager
+    from lib.snapshot import export_snapshot
+    from minject import Registry
+
+    manager = Registry()[EBirdManager]
+    patterns = patterns or ("ebird:*",)
+    written = asyncio.run(
+        export_snapshot(
+            manager.cache_provider,
+            path,
+            patterns,
+            counter_pattern=manager.cache.generation_pattern(),
+        )
+    )
+    print(f"Wrote {written} entries matching {', '.join(patterns)} to {path}.")
+
+
+def import_snapshot(path, ttl_days="30", overwrite="false"):
+    """
+    Load a snapshot file into the cache. Existing entries are kept unless
+    overwrite is "true".
+    """
+    from lib.snapshot import import_snapshot
+
+    loaded = asyncio.run(
+        import_snapshot(
+            _cache_provider(),
+            path,
+            ttl=float(ttl_days) * 24 * 60 * 60,
+            overwrite=overwrite == "true",
+        )
+    )
+    print(f"Loaded {loaded} entries from {path}.")
+
+
+if __name__ == "__main__":
+    arg_to_function = {
+        "migrate-redis": migrate_redis,
+        "benchmark-codecs": benchmark_codecs,
+        "invalidate": invalidate,
+        "export-snapshot": export_snapshot,
+        "import-snapshot": import_snapshot,
+    }
+
+    args = os.sys.argv  # type: ignore
+
+    if args and len(args) > 1 and args[1] in arg_to_function:
+        func = arg_to_function[args[1]]
+        if callable(func):
+            init()
+            func(*args[2:])
+        else:
+            print(f"Argument '{args[1]}' is not callable.")
+    else:
+        print(
+            "No valid command provided. Available commands: "
+            + ", ".join(arg_to_function.keys())
+        )
@@ -0,0 +1,119 @@
+import asyncio
+import unittest
+
+from app.manager.birdspot import BirdSpotManager
+from app.manager.ebird import EBirdManager
+from tests.lib.fakes import (
+    TARGET_DATE,
+    FakeEBirdDAL,
+    MemoryProvider,
+    make_region_dal,
+)
+
+
+class FailingEBirdDAL(FakeEBirdDAL):
+    """
+    Fails every request for the failing hotspots.
+    """
+
+    def __init__(self, *args, failing=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failing = set(failing)
+
+    async def get(self, endpoint, auth):
+        if endpoint.split("/")[2] in self.failing:
+            raise RuntimeError(f"eBird failed for {endpoint}")
+        return await super().get(endpoint, auth)
+
+
+class ConcurrencyRecordingEBirdDAL(FakeEBirdDAL):
+    """
+    Records the most observation requests ever in flight at once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def get(self, endpoint, auth):
+        if not endpoint.startswith("data/obs/"):
+            return await super().get(endpoint, auth)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            # lets the other fetches start
+            await asyncio.sleep(0.001)
+            return await super().get(endpoint, auth)
+        finally:
+            self.in_flight -= 1
+
+
+def score_region(strategy, feed_max_results=None, dal=None, max_concurrency=None):
+    dal = dal or make_region_dal()
+    ebird_manager = EBirdManager(dal, MemoryProvider(), MemoryProvider(), 5.0)
+    if feed_max_results is not None:
+        ebird_manager.CHECKLIST_FEED_MAX_RESULTS = feed_max_results
+    birdspot_manager = BirdSpotManager(ebird_manager)
+    birdspot_manager.FETCH_STRATEGY = strategy
+    scores = asyncio.run(
+        birdspot_manager.get_scores_for_region(
+            "US-NY", [], "life list", TARGET_DATE, "auth", max_concurrency
+        )
+    )
+    return scores, dal.calls
+
+
+class TestFetchStrategies(unittest.TestCase):
+    def setUp(self):
+        self.hotspot_scores, self.hotspot_calls = score_region("hotspot")
+
+    def test_hotspot_scores(self):
+        self.assertEqual(
+            [score["location"]["locId"] for score in self.hotspot_scores[:6]],
+            ["L5", "L4", "L3", "L2", "L1", "L0"],
+        )
+        self.assertGreater(self.hotspot_scores[5]["birdspot_score"], 0)
+
+    def test_region_scores_match_hotspot_scores_with_fewer_calls(self):
+        scores, calls = score_region("region")
+
+        self.assertEqual(scores, self.hotspot_scores)
+        self.assertLess(len(calls), len(self.hotspot_calls))
+
+    def test_truncated_feed_falls_back_to_hotspot_checklists(self):
+        # the feed for the day before TARGET_DATE holds all six hotspots
+        scores, calls = score_region("region", feed_max_results=4)
+
+        self.assertEqual(scores, self.hotspot_scores)
+        fallbacks = [
+            call
+            for call in calls
+            if call.startswith("product/lists/L") and "maxResults" not in call
+        ]
+        self.assertTrue(fallbacks)
+        self.assertLess(len(calls), len(self.hotspot_calls))
+
+
+class TestRegionScoring(unittest.TestCase):
+    def test_a_failing_hotspot_does_not_fail_the_others(self):
+        expected, _ = score_region("hotspot")
+        scores, _ = score_region(
+            "hotspot", dal=make_region_dal(FailingEBirdDAL, failing={"L3"})
+        )
+
+        by_loc_id = {score["location"]["locId"]: score for score in scores}
+        self.assertIn("eBird failed", by_loc_id["L3"]["error"])
+        self.assertEqual(by_loc_id["L3"]["birdspot_score"], 0)
+        self.assertEqual(
+            [score for score in scores if "error" not in score],
+            [score for score in expected if score["location"]["locId"] != "L3"],
+        )
+
+    def test_max_concurrency_bounds_the_fetches_in_flight(self):
+        for max_concurrency in (1, 3):
+            with self.subTest(max_concurrency=max_concurrency):
+                dal = make_region_dal(ConcurrencyRecordingEBirdDAL)
+                score_region("hotspot", dal=dal, max_concurrency=max_concurrency)
+
+                self.assertEqual(dal.peak, max_concurrency)
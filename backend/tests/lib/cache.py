@@ -0,0 +1,342 @@
+import asyncio
+import unittest
+
+from lib.cache import (
+    Cache,
+    CacheKey,
+    CachePolicy,
+    TieredCacheProvider,
+)
+from tests.lib.fakes import MemoryProvider
+
+
+class Service:
+    def __init__(self):
+        self.cache = Cache(CacheKey("test", 1), MemoryProvider())
+        self.calls = 0
+
+    @Cache.with_cache(
+        cache_accessor=lambda self: self.cache,
+        key_serializer=lambda region_code: region_code,
+    )
+    async def fetch(self, region_code: str) -> list:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [region_code]
+
+    @Cache.with_cache(
+        cache_accessor=lambda self: self.cache,
+        key_serializer=lambda region_code: region_code,
+    )
+    async def fail(self, region_code: str) -> list:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError(region_code)
+
+
+class ScopedService:
+    def __init__(self, cache: Cache):
+        self.cache = cache
+        self.calls = 0
+
+    @Cache.with_cache(
+        cache_accessor=lambda self: self.cache,
+        key_serializer=lambda region_code: region_code,
+        scopes=lambda region_code: [f"region:{region_code}"],
+    )
+    async def fetch(self, region_code: str) -> list:
+        self.calls += 1
+        return [region_code, self.calls]
+
+
+class PolicyService:
+    def __init__(self):
+        self.cache = Cache(CacheKey("test", 1), MemoryProvider())
+        self.calls = 0
+
+    @Cache.with_cache(
+        cache_accessor=lambda self: self.cache,
+        key_serializer=lambda region_code: region_code,
+        policy=CachePolicy(ttl=100, stale_after=10),
+    )
+    async def fetch(self, region_code: str) -> list:
+        self.calls += 1
+        return [region_code, self.calls]
+
+    def age(self, key: str, seconds: float):
+        entry = self.cache.cache_provider.data[key]
+        entry[CachePolicy.CACHED_AT] -= seconds
+
+
+class TestCache(unittest.TestCase):
+    def test_with_cache_stores_result(self):
+        service = Service()
+
+        async def run():
+            first = await service.fetch("US-NY")
+            second = await service.fetch("US-NY")
+            return first, second
+
+        self.assertEqual(asyncio.run(run()), (["US-NY"], ["US-NY"]))
+        self.assertEqual(service.calls, 1)
+        self.assertEqual(
+            service.cache.cache_provider.data, {"test:fetch:US-NY:v1": ["US-NY"]}
+        )
+
+    def test_concurrent_misses_share_one_call(self):
+        service = Service()
+
+        async def run():
+            return await asyncio.gather(*(service.fetch("US-NY") for _ in range(5)))
+
+        self.assertEqual(asyncio.run(run()), [["US-NY"]] * 5)
+        self.assertEqual(service.calls, 1)
+
+    def test_different_keys_are_not_coalesced(self):
+        service = Service()
+
+        async def run():
+            return await asyncio.gather(service.fetch("US-NY"), service.fetch("US-CA"))
+
+        self.assertEqual(asyncio.run(run()), [["US-NY"], ["US-CA"]])
+        self.assertEqual(service.calls, 2)
+
+    def test_errors_are_shared_and_not_cached(self):
+        service = Service()
+
+        async def run():
+            return await asyncio.gather(
+                *(service.fail("US-NY") for _ in range(3)), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(service.calls, 1)
+        self.assertEqual(service.cache.cache_provider.data, {})
+
+    def test_cancelled_leader_hands_off(self):
+        service = Service()
+
+        async def run():
+            leader = asyncio.create_task(service.fetch("US-NY"))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(service.fetch("US-NY"))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(run()), ["US-NY"])
+        self.assertEqual(service.calls, 2)
+
+    def test_concurrent_misses_across_event_loops(self):
+        import threading
+
+        service = Service()
+        results = []
+
+        def run():
+            results.append(asyncio.run(service.fetch("US-NY")))
+
+        threads = [threading.Thread(target=run) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [["US-NY"]] * 3)
+        self.assertEqual(service.calls, 1)
+
+
+class TestTieredCacheProvider(unittest.TestCase):
+    def test_remote_hits_fill_local_tier(self):
+        local, remote = MemoryProvider(), MemoryProvider()
+        remote.data["key"] = [1, 2]
+        tiered = TieredCacheProvider(local, remote)
+
+        self.assertEqual(asyncio.run(tiered.get("key")), [1, 2])
+        self.assertEqual(local.data, {"key": [1, 2]})
+
+    def test_local_hits_skip_remote(self):
+        local, remote = MemoryProvider(), MemoryProvider()
+        local.data["key"] = "local"
+        remote.data["key"] = "remote"
+        tiered = TieredCacheProvider(local, remote)
+
+        self.assertEqual(asyncio.run(tiered.get("key")), "local")
+
+    def test_set_writes_both_tiers(self):
+        local, remote = MemoryProvider(), MemoryProvider()
+        tiered = TieredCacheProvider(local, remote)
+        asyncio.run(tiered.set("key", "value"))
+
+        self.assertEqual(local.data, {"key": "value"})
+        self.assertEqual(remote.data, {"key": "value"})
+
+    def test_get_many_reads_local_then_remote(self):
+        local, remote = MemoryProvider(), MemoryProvider()
+        local.data["a"] = 1
+        remote.data["b"] = 2
+        tiered = TieredCacheProvider(local, remote)
+
+        values = asyncio.run(tiered.get_many(["a", "b", "c"]))
+        self.assertEqual(values, {"a": 1, "b": 2, "c": None})
+        self.assertEqual(local.data, {"a": 1, "b": 2})
+
+
+class TestCacheBatches(unittest.TestCase):
+    def test_key_for_matches_with_cache(self):
+        service = Service()
+        asyncio.run(service.fetch("US-NY"))
+
+        key = asyncio.run(service.cache.key_for(service.fetch, "US-NY"))
+        self.assertEqual(key, "fetch:US-NY")
+        self.assertEqual(asyncio.run(service.cache.get(key)), ["US-NY"])
+
+    def test_get_many_and_set_many_use_final_keys(self):
+        cache = Cache(CacheKey("test", 1), MemoryProvider())
+        asyncio.run(cache.set_many({"a": 1, "b": 2}))
+
+        self.assertEqual(
+            cache.cache_provider.data, {"test:a:v1": 1, "test:b:v1": 2}
+        )
+        self.assertEqual(
+            asyncio.run(cache.get_many(["a", "b", "c"])), {"a": 1, "b": 2, "c": None}
+        )
+
+
+class TestCachePolicy(unittest.TestCase):
+    KEY = "test:fetch:US-NY:v1"
+
+    def test_values_are_wrapped_with_ttl(self):
+        service = PolicyService()
+        self.assertEqual(asyncio.run(service.fetch("US-NY")), ["US-NY", 1])
+
+        provider = service.cache.cache_provider
+        self.assertEqual(provider.data[self.KEY]["value"], ["US-NY", 1])
+        self.assertEqual(provider.ttls[self.KEY], 100)
+
+    def test_fresh_values_are_served(self):
+        service = PolicyService()
+
+        async def run():
+            await service.fetch("US-NY")
+            return await service.fetch("US-NY")
+
+        self.assertEqual(asyncio.run(run()), ["US-NY", 1])
+        self.assertEqual(service.calls, 1)
+
+    def test_stale_values_are_served_and_refreshed_once(self):
+        service = PolicyService()
+
+        async def run():
+            await service.fetch("US-NY")
+            service.age(self.KEY, 20)
+            results = await asyncio.gather(*(service.fetch("US-NY") for _ in range(3)))
+            await asyncio.sleep(0.01)
+            return results
+
+        self.assertEqual(asyncio.run(run()), [["US-NY", 1]] * 3)
+        self.assertEqual(service.calls, 2)
+        value, _ = CachePolicy.unwrap(service.cache.cache_provider.data[self.KEY])
+        self.assertEqual(value, ["US-NY", 2])
+
+    def test_expired_values_are_recomputed(self):
+        service = PolicyService()
+
+        async def run():
+            await service.fetch("US-NY")
+            service.age(self.KEY, 200)
+            return await service.fetch("US-NY")
+
+        self.assertEqual(asyncio.run(run()), ["US-NY", 2])
+
+    def test_unwrapped_values_are_served_as_stale(self):
+        service = PolicyService()
+        service.cache.cache_provider.data[self.KEY] = ["US-NY", 0]
+
+        async def run():
+            result = await service.fetch("US-NY")
+            await asyncio.sleep(0.01)
+            return result
+
+        self.assertEqual(asyncio.run(run()), ["US-NY", 0])
+        self.assertEqual(service.calls, 1)
+
+
+class TestCacheGenerations(unittest.TestCase):
+    def test_keys_are_unchanged_until_invalidated(self):
+        service = ScopedService(Cache(CacheKey("test", 1), MemoryProvider()))
+        asyncio.run(service.fetch("US-NY"))
+
+        self.assertIn("test:fetch:US-NY:v1", service.cache.cache_provider.data)
+
+    def test_invalidating_a_scope_only_refetches_its_keys(self):
+        service = ScopedService(Cache(CacheKey("test", 1), MemoryProvider()))
+
+        async def run():
+            await service.fetch("US-NY")
+            await service.fetch("US-CA")
+            await service.cache.invalidate("region:US-NY")
+            return await service.fetch("US-NY"), await service.fetch("US-CA")
+
+        self.assertEqual(asyncio.run(run()), (["US-NY", 3], ["US-CA", 2]))
+        self.assertIn("test:fetch:US-NY:g0.0.1:v1", service.cache.cache_provider.data)
+
+    def test_invalidating_the_namespace_refetches_everything(self):
+        service = ScopedService(Cache(CacheKey("test", 1), MemoryProvider()))
+
+        async def run():
+            await service.fetch("US-NY")
+            await service.cache.invalidate()
+            return await service.fetch("US-NY")
+
+        self.assertEqual(asyncio.run(run()), ["US-NY", 2])
+
+    def test_other_instances_see_invalidations_after_generation_ttl(self):
+        provider = MemoryProvider()
+        reader = ScopedService(Cache(CacheKey("test", 1), provider, generation_ttl=60))
+        writer = Cache(CacheKey("test", 1), provider)
+
+        async def run():
+            await reader.fetch("US-NY")
+            await writer.invalidate("region:US-NY")
+            cached = await reader.fetch("US-NY")
+            reader.cache.generation_ttl = 0
+            return cached, await reader.fetch("US-NY")
+
+        self.assertEqual(asyncio.run(run()), (["US-NY", 1], ["US-NY", 2]))
+
+    def test_keys_for_reads_generations_once(self):
+        provider = MemoryProvider()
+        service = ScopedService(Cache(CacheKey("test", 1), provider, generation_ttl=0))
+        reads = []
+        get_counters = provider.get_counters
+
+        async def counting_get_counters(keys):
+            reads.append(keys)
+            return await get_counters(keys)
+
+        async def run():
+            await service.cache.invalidate("region:US-NY")
+            provider.get_counters = counting_get_counters
+            keys = await service.cache.keys_for(
+                (service.fetch, (region,)) for region in ("US-NY", "US-CA", "US-NY")
+            )
+            provider.get_counters = get_counters
+            return keys, [
+                await service.cache.key_for(service.fetch, region)
+                for region in ("US-NY", "US-CA", "US-NY")
+            ]
+
+        keys, expected = asyncio.run(run())
+        self.assertEqual(keys, expected)
+        self.assertEqual(keys[0], "fetch:US-NY:g0.0.1")
+        self.assertEqual(len(reads), 1)
+
+    def test_tiered_counters_skip_the_local_tier(self):
+        local, remote = MemoryProvider(), MemoryProvider()
+        cache = Cache(CacheKey("test", 1), TieredCacheProvider(local, remote))
+        asyncio.run(cache.invalidate("region:US-NY"))
+
+        self.assertEqual(remote.data, {"test:generation:region:US-NY:v1": 1})
+        self.assertEqual(local.data, {})
@@ -0,0 +1,70 @@
+import unittest
+
+from lib.codec import CodecSelector, available_codecs, parse_codec_config
+
+
+OBSERVATIONS = [
+    {
+        "speciesCode": "bohwax",
+        "comName": "Bohemian Waxwing",
+        "sciName": "Bombycilla garrulus",
+        "locId": "L7884500",
+        "obsDt": "2024-01-15 10:30",
+        "howMany": 5,
+        "lat": 42.45,
+        "obsValid": True,
+    }
+] * 20
+
+
+class TestCodecs(unittest.TestCase):
+    def test_every_codec_round_trips(self):
+        for name, codec in available_codecs().items():
+            with self.subTest(codec=name):
+                encoded = codec.encode(OBSERVATIONS)
+                self.assertEqual(codec.decode(encoded), OBSERVATIONS)
+
+    def test_compression_shrinks_repeated_records(self):
+        codecs = available_codecs()
+        self.assertLess(
+            len(codecs["json+zlib"].encode(OBSERVATIONS)),
+            len(codecs["json"].encode(OBSERVATIONS)),
+        )
+
+
+class TestCodecSelector(unittest.TestCase):
+    def test_scalars_keep_their_type(self):
+        selector = CodecSelector("json")
+        for value in ["text", b"\x00raw", 12, 1.5, True, None, {"a": [1]}]:
+            with self.subTest(value=value):
+                self.assertEqual(selector.decode(selector.encode("key", value)), value)
+
+    def test_longest_prefix_wins(self):
+        selector = CodecSelector(
+            "json", {"ebird:": "json", "ebird:get_hotspots": "json+zlib"}
+        )
+        self.assertEqual(
+            selector.codec_for("ebird:get_hotspots_by_region").name, "json+zlib"
+        )
+        self.assertEqual(selector.codec_for("ebird:get_species").name, "json")
+        self.assertEqual(selector.codec_for("other").name, "json")
+
+    def test_decodes_values_from_other_codecs(self):
+        writer = CodecSelector("json+zlib")
+        reader = CodecSelector("json")
+        encoded = writer.encode("key", OBSERVATIONS)
+        self.assertEqual(reader.decode(encoded), OBSERVATIONS)
+
+    def test_untagged_values_are_legacy_strings(self):
+        self.assertEqual(CodecSelector("json").decode(b"plain"), "plain")
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            CodecSelector("nope")
+
+    def test_parse_codec_config(self):
+        self.assertEqual(
+            parse_codec_config("ebird:a=json, ebird:b = json+zlib,"),
+            {"ebird:a": "json", "ebird:b": "json+zlib"},
+        )
+        self.assertEqual(parse_codec_config(""), {})
@@ -0,0 +1,74 @@
+import json
+import unittest
+
+from lib.compact import compact_scores, expand_scores
+
+
+def observation(species: str, place: str, date: str, **fields):
+    return {
+        "speciesCode": species,
+        "comName": f"{species} common",
+        "sciName": f"{species} scientific",
+        "locId": place,
+        "locName": f"{place} name",
+        "obsDt": date,
+        "lat": 42.45,
+        "lng": -76.52,
+        "obsValid": True,
+        "obsReviewed": False,
+        "locationPrivate": False,
+        "subId": f"S{date}",
+        **fields,
+    }
+
+
+HOTSPOT_SCORES = [
+    {
+        "location": {"locId": "L1", "locName": "L1 name", "lat": 42.45, "lng": -76.5},
+        "missing_species": {
+            "bohwax": [
+                observation("bohwax", "L1", "2024-01-15 10:30", howMany=5),
+                observation("bohwax", "L1", "2024-01-14 08:00"),
+            ],
+            "snobun": [observation("snobun", "L1", "2024-01-15 10:30", howMany=1)],
+        },
+        "birdspot_score": 2.5,
+        "score": 2,
+    },
+    {
+        "location": {"locId": "L2", "locName": "L2 name", "lat": 42.4, "lng": -76.6},
+        "missing_species": {
+            "bohwax": [observation("bohwax", "L2", "2024-01-15 09:00", howMany=2)]
+        },
+        "birdspot_score": 1.0,
+        "score": 1,
+    },
+    {
+        "location": {"locId": "L3", "locName": "L3 name", "lat": 42.3, "lng": -76.7},
+        "missing_species": {},
+        "birdspot_score": 0,
+        "score": 0,
+        "error": "timed out",
+    },
+]
+
+
+class TestCompactScores(unittest.TestCase):
+    def test_round_trip(self):
+        compact = json.loads(json.dumps(compact_scores(HOTSPOT_SCORES)))
+        self.assertEqual(expand_scores(compact), HOTSPOT_SCORES)
+
+    def test_interns_species_and_places(self):
+        compact = compact_scores(HOTSPOT_SCORES)
+        self.assertEqual(compact["species"]["speciesCode"], ["bohwax", "snobun"])
+        self.assertEqual(compact["places"]["locId"], ["L1", "L2"])
+        self.assertEqual(compact["observations"]["species"], [0, 0, 1, 0])
+        self.assertEqual(compact["observations"]["place"], [0, 0, 0, 1])
+        self.assertEqual(compact["hotspots"]["error"], [None, None, "timed out"])
+
+    def test_empty(self):
+        self.assertEqual(expand_scores(compact_scores([])), [])
+
+    def test_rejects_other_formats(self):
+        with self.assertRaises(ValueError):
+            expand_scores({"format": "other"})
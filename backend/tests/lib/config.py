@@ -0,0 +1,25 @@
+import os
+import unittest
+from unittest import mock
+
+from lib.config import choose_from_env
+
+CHOICES = {"redis": "RedisCache", "file": "FileCache"}
+
+
+class TestChooseFromEnv(unittest.TestCase):
+    def choose(self, value):
+        environ = {} if value is None else {"BIRDSPOT_CACHE_PROVIDER": value}
+        with mock.patch.dict(os.environ, environ, clear=True):
+            return choose_from_env("BIRDSPOT_CACHE_PROVIDER", CHOICES, "file")
+
+    def test_chooses_the_named_choice_or_the_default(self):
+        self.assertEqual(self.choose("redis"), "RedisCache")
+        self.assertEqual(self.choose(None), "FileCache")
+        self.assertEqual(self.choose(""), "FileCache")
+
+    def test_unknown_names_list_the_choices(self):
+        with self.assertRaisesRegex(
+            ValueError, r"BIRDSPOT_CACHE_PROVIDER 'memcached'.*redis, file"
+        ):
+            self.choose("memcached")
@@ -0,0 +1,141 @@
+import asyncio
+import datetime
+import unittest
+from unittest import mock
+
+from app.manager.ebird import EBirdManager
+from tests.lib.fakes import FakeEBirdDAL, MemoryProvider
+
+DATE = datetime.date.today() - datetime.timedelta(days=1)
+DATES = [datetime.date.today() - datetime.timedelta(days=i) for i in range(1, 8)]
+LOC_IDS = [f"L{i}" for i in range(20)]
+# old enough to be settled, and no longer refreshed every few hours
+SETTLED_DATE = datetime.date.today() - datetime.timedelta(days=10)
+
+
+class CountingProvider(MemoryProvider):
+    def __init__(self):
+        super().__init__()
+        self.counter_reads = 0
+
+    async def get_counters(self, keys):
+        self.counter_reads += 1
+        return await super().get_counters(keys)
+
+
+class TestEBirdManagerInvalidation(unittest.TestCase):
+    def setUp(self):
+        self.dal = FakeEBirdDAL(
+            "US-NY",
+            observations={
+                (loc_id, date): [{"speciesCode": "amerob"}]
+                for loc_id in LOC_IDS
+                for date in DATES
+            },
+        )
+        self.provider = CountingProvider()
+        self.manager = EBirdManager(
+            self.dal, self.provider, MemoryProvider(), generation_ttl=5
+        )
+
+    def test_invalidate_region_reaches_hotspot_entries(self):
+        get = self.manager.get_species_observed_by_date_and_region
+
+        async def run():
+            await get("L1", DATE, "auth", "US-NY")
+            await get("L1", DATE, "auth", "US-NY")
+            await self.manager.invalidate_region("US-NY")
+            await get("L1", DATE, "auth", "US-NY")
+
+        asyncio.run(run())
+        self.assertEqual(len(self.dal.calls), 2)
+
+    def test_hotspot_entries_without_a_parent_region_are_not_reached(self):
+        # before hotspots were scoped under their region, each one was its
+        # own scope and invalidating the region missed it
+        get = self.manager.get_species_observed_by_date_and_region
+
+        async def run():
+            await get("L1", DATE, "auth")
+            await self.manager.invalidate_region("US-NY")
+            await get("L1", DATE, "auth")
+
+        asyncio.run(run())
+        self.assertEqual(len(self.dal.calls), 1)
+
+    def test_invalidate_region_leaves_other_regions(self):
+        get = self.manager.get_species_observed_by_date_and_region
+
+        async def run():
+            await get("L1", DATE, "auth", "US-NY")
+            await get("L2", DATE, "auth", "US-CA")
+            await self.manager.invalidate_region("US-NY")
+            await get("L1", DATE, "auth", "US-NY")
+            await get("L2", DATE, "auth", "US-CA")
+
+        asyncio.run(run())
+        self.assertEqual(
+            [call.split("/")[2] for call in self.dal.calls], ["L1", "L2", "L1"]
+        )
+
+    def test_prefetch_reads_generations_once(self):
+        pairs = [(loc_id, date) for loc_id in LOC_IDS for date in DATES]
+
+        async def run():
+            await self.manager.invalidate_region("US-NY")
+            for loc_id, date in pairs:
+                await self.manager.get_species_observed_by_date_and_region(
+                    loc_id, date, "auth", "US-NY"
+                )
+                await self.manager.get_checklists_by_date_and_region(
+                    loc_id, date, "auth", "US-NY"
+                )
+            # a fresh process has no generations memoized
+            manager = EBirdManager(
+                self.dal, self.provider, MemoryProvider(), generation_ttl=5
+            )
+            self.provider.counter_reads = 0
+            return await manager.prefetch_by_date_and_region(
+                pairs, "auth", parent_region="US-NY"
+            )
+
+        self.assertEqual(asyncio.run(run()), 2 * len(pairs))
+        # rather than one per hotspot
+        self.assertEqual(self.provider.counter_reads, 1)
+
+
+class TestEBirdManagerDatePolicy(unittest.TestCase):
+    def setUp(self):
+        self.dal = FakeEBirdDAL(
+            "US-NY", observations={("L1", SETTLED_DATE): [{"speciesCode": "amerob"}]}
+        )
+        self.manager = EBirdManager(
+            self.dal, MemoryProvider(), MemoryProvider(), generation_ttl=5
+        )
+
+    def read_cached_at(self, days_after):
+        """
+        Cache the settled date's observations as of days_after it, then read
+        them now and once more after any refresh.
+        """
+        get = self.manager.get_species_observed_by_date_and_region
+        cached_at = datetime.datetime.combine(
+            SETTLED_DATE + datetime.timedelta(days=days_after), datetime.time(12)
+        ).timestamp()
+
+        async def run():
+            with mock.patch("time.time", return_value=cached_at):
+                await get("L1", SETTLED_DATE, "auth", "US-NY")
+            await get("L1", SETTLED_DATE, "auth", "US-NY")
+            await asyncio.sleep(0.01)
+            await get("L1", SETTLED_DATE, "auth", "US-NY")
+
+        asyncio.run(run())
+        return len(self.dal.calls)
+
+    def test_values_cached_while_recent_are_refreshed_once_settled(self):
+        # cached the next day, say by the cache warmer
+        self.assertEqual(self.read_cached_at(days_after=1), 2)
+
+    def test_values_cached_once_settled_are_not_refreshed(self):
+        self.assertEqual(self.read_cached_at(days_after=9), 1)
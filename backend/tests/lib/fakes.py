@@ -0,0 +1,118 @@
+import datetime
+import fnmatch
+import json
+
+from lib.cache import CacheProvider
+
+TARGET_DATE = datetime.date(2024, 5, 1)
+DATES = [TARGET_DATE - datetime.timedelta(days=i) for i in range(1, 8)]
+TAXA = [
+    {"speciesCode": f"sp{i}", "comName": f"Species {i}", "taxonOrder": i + 1}
+    for i in range(6)
+]
+# nobody birded the last four hotspots that week
+HOTSPOTS = [{"locId": f"L{i}", "locName": f"Hotspot {i}"} for i in range(10)]
+
+
+class MemoryProvider(CacheProvider):
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+        self.ttls = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ttl=None):
+        self.data[key] = value
+        self.ttls[key] = ttl
+
+    async def scan(self, pattern):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, pattern):
+                yield key
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self.payload
+
+
+class FakeEBirdDAL:
+    """
+    Serves one region's hotspots, species, checklists and observations, and
+    records every endpoint requested.
+    """
+
+    def __init__(
+        self,
+        region_code,
+        hotspots=(),
+        taxa=(),
+        checklists=None,
+        observations=None,
+    ):
+        self.region_code = region_code
+        self.hotspots = list(hotspots)
+        self.taxa = list(taxa)
+        # (locId, date) -> list
+        self.checklists = checklists or {}
+        self.observations = observations or {}
+        self.calls = []
+
+    async def get(self, endpoint, auth):
+        self.calls.append(endpoint)
+        path, _, query = endpoint.partition("?")
+        parts = path.split("/")
+        if path.startswith("ref/hotspot/"):
+            return FakeResponse(self.hotspots)
+        if path.startswith("product/spplist/"):
+            return FakeResponse([taxon["speciesCode"] for taxon in self.taxa])
+        if path.startswith("ref/taxonomy/"):
+            return FakeResponse(self.taxa)
+        if path.startswith("data/obs/"):
+            date = datetime.date(*map(int, parts[-3:]))
+            return FakeResponse(self.observations.get((parts[2], date), []))
+        if path.startswith("product/lists/"):
+            date = datetime.date(*map(int, parts[-3:]))
+            if parts[2] != self.region_code:
+                return FakeResponse(self.checklists.get((parts[2], date), []))
+            feed = [
+                checklist
+                for hotspot in self.hotspots
+                for checklist in self.checklists.get((hotspot["locId"], date), [])
+            ]
+            if query.startswith("maxResults="):
+                feed = feed[: int(query.removeprefix("maxResults="))]
+            return FakeResponse(feed)
+        return FakeResponse(None, status_code=404)
+
+
+def make_region_dal(dal_class=FakeEBirdDAL, **kwargs):
+    """
+    A region whose hotspot Li, for i up to 5, had species 0 to i seen on
+    each of the i + 1 days before TARGET_DATE.
+    """
+    return dal_class(
+        "US-NY",
+        hotspots=HOTSPOTS,
+        taxa=TAXA,
+        checklists={
+            (f"L{i}", date): [{"locId": f"L{i}", "subId": f"S{i}{day}"}]
+            for i in range(6)
+            for day, date in enumerate(DATES[: i + 1])
+        },
+        observations={
+            (f"L{i}", date): [
+                {"speciesCode": f"sp{j}", "obsDt": f"{date.isoformat()} 08:00"}
+                for j in range(i + 1)
+            ]
+            for i in range(6)
+            for date in DATES[: i + 1]
+        },
+        **kwargs,
+    )
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from app.dal.cache.file import FileCache
+from lib.codec import CodecSelector
+
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = f"{directory.name}/"
+        with mock.patch.dict(
+            os.environ, {"BIRDSPOT_FILE_CACHE_DIRECTORY": self.directory}
+        ):
+            self.cache = FileCache(
+                CodecSelector("json"),
+                max_bytes=1024 * 1024,
+                max_age=0,
+                compact_interval=3600,
+            )
+        # compaction is run by the tests rather than the background thread
+        self.cache._ensure_compactor = lambda: None
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, filename), self.directory)
+            for root, _, filenames in os.walk(self.directory)
+            for filename in filenames
+        )
+
+    def set_aged(self, key, value, age):
+        asyncio.run(self.cache.set(key, value))
+        written_at = time.time() - age
+        os.utime(self.cache._path(key), (written_at, written_at))
+
+    def test_entries_are_sharded_by_key_hash(self):
+        asyncio.run(self.cache.set("ebird:hotspots:US-NY:v1", [1, 2]))
+
+        (path,) = self.files()
+        first, second, filename = path.split(os.sep)
+        self.assertEqual((len(first), len(second)), (2, 2))
+        self.assertEqual(filename, "ebird:hotspots:US-NY:v1.bin")
+        self.assertEqual(
+            asyncio.run(self.cache.get("ebird:hotspots:US-NY:v1")), [1, 2]
+        )
+
+    def test_keys_with_slashes_stay_in_their_shard(self):
+        asyncio.run(self.cache.set("ebird:a/b:v1", "value"))
+
+        self.assertEqual(len(self.files()[0].split(os.sep)), 3)
+        self.assertEqual(asyncio.run(self.cache.get("ebird:a/b:v1")), "value")
+
+    def test_reads_unsharded_legacy_entries(self):
+        with open(f"{self.directory}ebird:legacy:v1.json", "w") as f:
+            json.dump({"a": 1}, f)
+
+        self.assertEqual(asyncio.run(self.cache.get("ebird:legacy:v1")), {"a": 1})
+        self.assertIsNone(asyncio.run(self.cache.get("ebird:missing:v1")))
+
+    def test_scan_matches_sharded_and_legacy_keys(self):
+        asyncio.run(self.cache.set("ebird:a:v1", 1))
+        asyncio.run(self.cache.set("other:b:v1", 2))
+        with open(f"{self.directory}ebird:c:v1.json", "w") as f:
+            json.dump(3, f)
+
+        async def scan():
+            return sorted([key async for key in self.cache.scan("ebird:*")])
+
+        self.assertEqual(asyncio.run(scan()), ["ebird:a:v1", "ebird:c:v1"])
+
+    def test_set_tracks_the_size(self):
+        asyncio.run(self.cache.set("a", "x" * 100))
+        size = self.cache.size
+        asyncio.run(self.cache.set("a", "x" * 10))
+
+        self.assertEqual(self.cache.size, size - 90)
+
+    def test_compact_evicts_the_oldest_entries_to_the_low_watermark(self):
+        for index, key in enumerate(["a", "b", "c", "d"]):
+            self.set_aged(key, "x" * 100, age=100 - index)
+        entry_size = os.path.getsize(self.cache._path("a"))
+        self.cache.max_bytes = 3 * entry_size
+
+        self.assertEqual(self.cache.compact(), 2)
+        self.assertIsNone(asyncio.run(self.cache.get("a")))
+        self.assertIsNone(asyncio.run(self.cache.get("b")))
+        self.assertEqual(asyncio.run(self.cache.get("d")), "x" * 100)
+        self.assertEqual(self.cache.size, 2 * entry_size)
+        self.assertLessEqual(
+            self.cache.size, self.cache.max_bytes * FileCache.LOW_WATERMARK
+        )
+
+    def test_compact_removes_expired_entries_and_abandoned_temp_files(self):
+        self.cache.max_age = 60
+        self.set_aged("old", 1, age=120)
+        self.set_aged("new", 2, age=10)
+        temp_path = os.path.join(self.directory, "ab", "cd", "abandoned.tmp")
+        os.makedirs(os.path.dirname(temp_path))
+        open(temp_path, "w").close()
+        os.utime(temp_path, (time.time() - 7200, time.time() - 7200))
+
+        self.assertEqual(self.cache.compact(), 2)
+        self.assertFalse(os.path.exists(temp_path))
+        self.assertIsNone(asyncio.run(self.cache.get("old")))
+        self.assertEqual(asyncio.run(self.cache.get("new")), 2)
+
+    def test_exceeding_the_budget_requests_compaction(self):
+        self.cache.max_bytes = 10
+        asyncio.run(self.cache.set("a", "x" * 100))
+
+        self.assertTrue(self.cache._compact_requested.is_set())
@@ -0,0 +1,544 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from app.dal.job.sqlite import SQLiteJobStore
+from app.dal.job_events.memory import MemoryJobEvents
+from app.dal.queue.memory import MemoryJobQueue
+from app.manager.birdspot import BirdSpotManager
+from app.manager.ebird import EBirdManager
+from app.manager.job import Job, JobManager
+from app.manager.job_worker import JobWorker
+from app.manager.task import SCORE_REGION_TASK, TaskManager, summarize_scores
+from app.model.task import ScoreRegionPayload
+from lib.codec import CodecSelector
+from lib.progress import Progress, tracking
+from lib.worker import WorkerLoop
+from tests.lib.fakes import (
+    HOTSPOTS,
+    TARGET_DATE,
+    FakeEBirdDAL,
+    MemoryProvider,
+    make_region_dal,
+)
+
+DEDUP_WINDOW = 60.0
+
+
+class BlockingEBirdDAL(FakeEBirdDAL):
+    """
+    Never answers requests for the blocked hotspots, as if the process died
+    while fetching them.
+    """
+
+    def __init__(self, *args, blocked=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.blocked = set(blocked)
+
+    async def get(self, endpoint, auth):
+        if endpoint.split("/")[2] in self.blocked:
+            await asyncio.Event().wait()
+        return await super().get(endpoint, auth)
+
+
+def make_job_manager(path, dal):
+    ebird_manager = EBirdManager(dal, MemoryProvider(), MemoryProvider(), 5.0)
+    return JobManager(
+        job_store=SQLiteJobStore(path),
+        job_queue=MemoryJobQueue(lease_seconds=60),
+        job_events=MemoryJobEvents(ttl=60),
+        task_manager=TaskManager(BirdSpotManager(ebird_manager)),
+        worker=WorkerLoop(max_concurrency=2),
+        dedup_window=DEDUP_WINDOW,
+        result_codecs=CodecSelector("json"),
+        resume_window=24 * 60 * 60,
+    )
+
+
+def make_payload(region_code="US-NY"):
+    return ScoreRegionPayload(
+        region_code=region_code,
+        life_list=[],
+        life_list_name="life list",
+        target_date=TARGET_DATE,
+        auth="auth",
+    )
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class TestJobManagerDedup(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.manager = make_job_manager(
+            os.path.join(directory.name, "jobs.sqlite3"), FakeEBirdDAL("US-NY")
+        )
+        self.addCleanup(self.manager.close)
+        self.source = self.manager.create_job("a", SCORE_REGION_TASK, make_payload())
+        asyncio.run(self.manager.start_job(self.source))
+
+    def update_source(self, **changes):
+        job = self.manager.get_job(self.source.id)
+        for name, value in changes.items():
+            setattr(job, name, value)
+        self.manager._save(job)
+
+    def create_duplicate(self):
+        return self.manager.create_job("b", SCORE_REGION_TASK, make_payload())
+
+    def test_reuses_a_running_job_older_than_the_window(self):
+        self.update_source(created_at=time.time() - 2 * DEDUP_WINDOW)
+
+        job = self.create_duplicate()
+        self.assertEqual((job.source, job.state), (self.source.id, "running"))
+
+    def test_reuses_a_job_finished_within_the_window(self):
+        self.update_source(
+            created_at=time.time() - 2 * DEDUP_WINDOW,
+            state="completed",
+            response=[],
+            summary={"finished_at": time.time() - DEDUP_WINDOW / 2},
+        )
+
+        job = self.create_duplicate()
+        self.assertEqual((job.source, job.state), (self.source.id, "completed"))
+
+    def test_does_not_reuse_a_job_finished_before_the_window(self):
+        self.update_source(
+            state="completed",
+            response=[],
+            summary={"finished_at": time.time() - 2 * DEDUP_WINDOW},
+        )
+
+        job = self.create_duplicate()
+        self.assertEqual((job.source, job.state), (None, "not-started"))
+
+    def test_does_not_reuse_a_failed_job(self):
+        self.update_source(state="failed", response={"error": "boom"})
+
+        self.assertIsNone(self.create_duplicate().source)
+
+    def test_does_not_reuse_other_work(self):
+        job = self.manager.create_job("b", SCORE_REGION_TASK, make_payload("US-CA"))
+        self.assertIsNone(job.source)
+
+
+class TestJobManagerLegacyImport(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.manager = make_job_manager(
+            os.path.join(directory.name, "jobs.sqlite3"), FakeEBirdDAL("US-NY")
+        )
+        self.addCleanup(self.manager.close)
+        self.manager.directory = os.path.join(directory.name, "jobs", "")
+        os.makedirs(self.manager.directory)
+
+    def write_legacy_job(self, job_id, created_at=None):
+        job = Job(
+            id=job_id,
+            owner="a",
+            state="completed",
+            task=None,
+            payload="",
+            response=[],
+            created_at=created_at,
+        )
+        path = f"{self.manager.directory}{job_id}.json"
+        with open(path, "w") as f:
+            f.write(str(job))
+        return path
+
+    def test_imports_each_job_once(self):
+        self.write_legacy_job("j1", created_at=1.0)
+        path = self.write_legacy_job("j2")
+
+        self.assertEqual(self.manager.import_legacy_jobs(), 2)
+        self.assertEqual(self.manager.import_legacy_jobs(), 0)
+        self.assertTrue(os.path.exists(f"{path}.imported"))
+        jobs, _ = self.manager.get_jobs_for_owner("a")
+        self.assertEqual([job.id for job in jobs], ["j2", "j1"])
+        # jobs without a creation time take their file's
+        self.assertEqual(jobs[0].created_at, os.path.getmtime(f"{path}.imported"))
+
+    def test_importing_a_job_again_does_not_duplicate_it(self):
+        # as if the file couldn't be renamed after an earlier import
+        self.write_legacy_job("j1", created_at=1.0)
+        self.manager.import_legacy_jobs()
+        self.write_legacy_job("j1", created_at=1.0)
+
+        self.assertEqual(self.manager.import_legacy_jobs(), 1)
+        jobs, _ = self.manager.get_jobs_for_owner("a")
+        self.assertEqual([job.id for job in jobs], ["j1"])
+
+    def test_unreadable_files_are_left_in_place(self):
+        path = f"{self.manager.directory}broken.json"
+        with open(path, "w") as f:
+            f.write("{")
+
+        self.assertEqual(self.manager.import_legacy_jobs(), 0)
+        self.assertTrue(os.path.exists(path))
+
+
+class TestJobManagerPriorities(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.manager = make_job_manager(
+            os.path.join(directory.name, "jobs.sqlite3"), FakeEBirdDAL("US-NY")
+        )
+        self.addCleanup(self.manager.close)
+
+    def start_jobs(self, region_codes):
+        jobs = {}
+        for region_code in region_codes:
+            job = self.manager.create_job(
+                "a", SCORE_REGION_TASK, make_payload(region_code)
+            )
+            asyncio.run(self.manager.start_job(job))
+            jobs[job.id] = region_code
+        return jobs
+
+    def claim_all(self, queue):
+        leases = []
+        while lease := asyncio.run(queue.claim("worker", 0)):
+            leases.append(lease)
+        return leases
+
+    def test_smaller_regions_are_queued_first(self):
+        jobs = self.start_jobs(["US", "US-NY", "US-NY-061"])
+
+        leases = self.claim_all(self.manager.job_queue)
+        self.assertEqual(
+            [(jobs[lease.job_id], lease.priority) for lease in leases],
+            [("US-NY-061", 0), ("US-NY", 1), ("US", 2)],
+        )
+
+    def test_resumed_jobs_keep_their_priority(self):
+        jobs = self.start_jobs(["US", "US-NY-061"])
+        # as if the process restarted and lost its queue
+        self.manager.job_queue = MemoryJobQueue(lease_seconds=60)
+
+        self.assertEqual(asyncio.run(self.manager.resume_orphaned_jobs()), 2)
+        leases = self.claim_all(self.manager.job_queue)
+        self.assertEqual([jobs[lease.job_id] for lease in leases], ["US-NY-061", "US"])
+
+    def test_jobs_run_at_their_priority(self):
+        jobs = self.start_jobs(["US"])
+        (lease,) = self.claim_all(self.manager.job_queue)
+
+        with mock.patch.object(
+            self.manager.worker, "submit", wraps=self.manager.worker.submit
+        ) as submit:
+            future = self.manager.run_job(
+                self.manager.get_job(lease.job_id), lease.priority
+            )
+        future.result(timeout=5)
+        self.assertEqual(jobs[lease.job_id], "US")
+        self.assertEqual(submit.call_args.args[2], 2)
+
+
+class TestJobManagerProgressWrites(unittest.TestCase):
+    def test_progress_is_written_off_the_worker_loop(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        manager = make_job_manager(
+            os.path.join(directory.name, "jobs.sqlite3"), make_region_dal()
+        )
+        self.addCleanup(manager.close)
+        manager.PROGRESS_INTERVAL = 0.01
+        manager.PARTIAL_RESULT_INTERVAL = 0
+        manager.CHECKPOINT_INTERVAL = 0
+        job = manager.create_job("a", SCORE_REGION_TASK, make_payload())
+        asyncio.run(manager.start_job(job))
+        writers = []
+
+        def slow(write):
+            def inner(*args):
+                writers.append(threading.current_thread().name)
+                # long enough to still be writing when the job finishes
+                time.sleep(0.05)
+                return write(*args)
+
+            return inner
+
+        manager._save_partial = slow(manager._save_partial)
+        manager._save_checkpoint = slow(manager._save_checkpoint)
+        manager.job_events.publish = slow(manager.job_events.publish)
+        result = manager.run_job(manager.get_job(job.id)).result(timeout=5)
+
+        wait_for(lambda: manager.get_job(job.id).state == "completed")
+        self.assertTrue(writers)
+        self.assertNotIn(manager.worker.name, writers)
+        # no partial result saved late overwrote the finished job
+        time.sleep(0.1)
+        finished = manager.get_job(job.id)
+        self.assertEqual(finished.state, "completed")
+        self.assertEqual(finished.response, summarize_scores(result))
+        self.assertIsNone(manager.job_store.load_checkpoint(job.id))
+
+
+class TestJobManagerResults(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.manager = make_job_manager(
+            os.path.join(directory.name, "jobs.sqlite3"), make_region_dal()
+        )
+        self.addCleanup(self.manager.close)
+
+    def run_job(self):
+        job = self.manager.create_job("a", SCORE_REGION_TASK, make_payload())
+        asyncio.run(self.manager.start_job(job))
+        result = self.manager.run_job(self.manager.get_job(job.id)).result(timeout=5)
+        wait_for(lambda: self.manager.get_job(job.id).state == "completed")
+        return self.manager.get_job(job.id), result
+
+    def test_jobs_keep_a_summary_and_store_the_result_apart(self):
+        job, result = self.run_job()
+
+        self.assertEqual(len(result), len(HOTSPOTS))
+        self.assertEqual(job.response, summarize_scores(result))
+        self.assertLess(len(job.response), len(result))
+        stored = self.manager.job_store.load_result(job.id)
+        self.assertEqual(self.manager.result_codecs.decode(stored), result)
+        self.assertEqual(job.summary["result_bytes"], len(stored))
+        self.assertEqual(job.summary["count"], len(result))
+
+    def test_get_result_and_get_summary(self):
+        job, result = self.run_job()
+
+        self.assertEqual(self.manager.get_result(job), result)
+        self.assertEqual(self.manager.get_summary(job), summarize_scores(result))
+
+    def test_legacy_jobs_with_an_inline_result(self):
+        _, result = self.run_job()
+        legacy = Job(
+            id="legacy",
+            owner="a",
+            state="completed",
+            task=None,
+            payload="",
+            response=result,
+        )
+        self.manager._save(legacy)
+        legacy = self.manager.get_job("legacy")
+
+        self.assertEqual(self.manager.get_result(legacy), result)
+        self.assertEqual(self.manager.get_summary(legacy), summarize_scores(result))
+
+
+class TestJobManagerResume(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "jobs.sqlite3")
+
+    def make_manager(self, dal, path=None):
+        manager = make_job_manager(path or self.path, dal)
+        manager.CHECKPOINT_INTERVAL = 0
+        manager.PROGRESS_INTERVAL = 0.01
+        self.addCleanup(manager.close)
+        return manager
+
+    def run_to_completion(self, manager, job_id):
+        manager.run_job(manager.get_job(job_id)).result(timeout=5)
+        wait_for(lambda: manager.get_job(job_id).state == "completed")
+        return manager.get_result(manager.get_job(job_id))
+
+    def checkpoint(self, manager, job_id):
+        return manager._load_checkpoint(job_id) or {}
+
+    def test_resumed_job_does_not_fetch_checkpointed_hotspots(self):
+        blocked = {"L0", "L4"}
+        # not closed, so the blocked fetches never return
+        first = make_job_manager(
+            self.path, make_region_dal(BlockingEBirdDAL, blocked=blocked)
+        )
+        first.CHECKPOINT_INTERVAL = 0
+        job = first.create_job("a", SCORE_REGION_TASK, make_payload())
+        asyncio.run(first.start_job(job))
+        first.run_job(first.get_job(job.id))
+        scored = {f"hotspot:{h['locId']}" for h in HOTSPOTS} - {
+            f"hotspot:{loc_id}" for loc_id in blocked
+        }
+        wait_for(lambda: scored <= self.checkpoint(first, job.id).keys())
+
+        # another process takes over the job
+        dal = make_region_dal()
+        second = self.make_manager(dal)
+        self.assertEqual(asyncio.run(second.resume_orphaned_jobs()), 1)
+        lease = asyncio.run(second.job_queue.claim("worker", 0))
+        result = self.run_to_completion(second, lease.job_id)
+
+        fetched = {call.split("/")[2] for call in dal.calls}
+        self.assertFalse(fetched & {key.split(":")[1] for key in scored})
+        self.assertIn("L4", fetched)
+        # the same result as a run that was never interrupted
+        uninterrupted = self.make_manager(
+            make_region_dal(), os.path.join(os.path.dirname(self.path), "other")
+        )
+        fresh = uninterrupted.create_job("a", SCORE_REGION_TASK, make_payload())
+        self.assertEqual(result, self.run_to_completion(uninterrupted, fresh.id))
+
+    def test_checkpoint_keeps_scores_and_the_top_results_only(self):
+        ebird_manager = EBirdManager(
+            make_region_dal(), MemoryProvider(), MemoryProvider(), 5.0
+        )
+        birdspot_manager = BirdSpotManager(ebird_manager)
+        birdspot_manager.TOP_K = 2
+        progress = Progress()
+        with tracking(progress):
+            result = asyncio.run(
+                birdspot_manager.get_scores_for_region(
+                    "US-NY", [], "life list", TARGET_DATE, "auth"
+                )
+            )
+
+        checkpoint = dict(progress.checkpoint)
+        self.assertEqual(checkpoint.pop("top"), result)
+        self.assertEqual(len(result), 2)
+        self.assertEqual(set(checkpoint), {f"hotspot:{h['locId']}" for h in HOTSPOTS})
+        self.assertTrue(all(isinstance(v, float) for v in checkpoint.values()))
+
+
+class TestJobManagerEvents(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.manager = make_job_manager(
+            os.path.join(directory.name, "jobs.sqlite3"), FakeEBirdDAL("US-NY")
+        )
+        self.manager.EVENTS_POLL_INTERVAL = 0.01
+        self.addCleanup(self.manager.close)
+        self.job = self.manager.create_job("a", SCORE_REGION_TASK, make_payload())
+        asyncio.run(self.manager.start_job(self.job))
+
+    def follow(self, job, during=None, **kwargs):
+        async def run():
+            events = []
+            async for event in self.manager.follow_events(job, **kwargs):
+                events.append(event)
+                if during is not None:
+                    during(events)
+            return events
+
+        return asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+    def test_follows_events_until_the_job_finishes(self):
+        def during(events):
+            if len(events) == 1:
+                self.manager.job_events.publish(self.job.id, {"state": "completed"})
+
+        events = self.follow(self.job, during)
+        self.assertEqual(
+            events,
+            [
+                (1, {"state": "running", "phase": "queued"}),
+                (2, {"state": "completed"}),
+            ],
+        )
+
+    def test_skips_the_last_seen_event(self):
+        self.manager.job_events.publish(self.job.id, {"state": "completed"})
+
+        events = self.follow(self.job, last_version="1")
+        self.assertEqual(events, [(2, {"state": "completed"})])
+
+    def test_ends_when_the_final_event_was_lost(self):
+        def during(events):
+            # finishes without publishing, as if the event had expired
+            job = self.manager.get_job(self.job.id)
+            job.state = "completed"
+            self.manager._save(job)
+
+        events = self.follow(
+            self.job, during, last_version="1", keepalive_interval=0.05
+        )
+        self.assertEqual(events, [None, (None, {"state": "completed"})])
+
+    def test_finished_jobs_end_right_away(self):
+        self.job.state = "failed"
+
+        self.assertEqual(self.follow(self.job), [(None, {"state": "failed"})])
+
+
+class TestJobWorker(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dal = make_region_dal()
+        self.manager = make_job_manager(
+            os.path.join(directory.name, "jobs.sqlite3"), self.dal
+        )
+        self.addCleanup(self.manager.close)
+        self.queue = self.manager.job_queue
+        self.acked = []
+        ack = self.queue.ack
+
+        async def recording_ack(lease):
+            self.acked.append(lease.job_id)
+            await ack(lease)
+
+        self.queue.ack = recording_ack
+        self.worker = JobWorker(self.manager, "worker", lease_seconds=60)
+        self.worker.CLAIM_TIMEOUT = 0.01
+
+    def run_worker_until(self, condition):
+        async def run():
+            worker = asyncio.create_task(self.worker.run())
+            try:
+                while not condition():
+                    await asyncio.sleep(0.01)
+            finally:
+                worker.cancel()
+
+        asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+    def test_runs_claimed_jobs_and_acknowledges_them(self):
+        job = self.manager.create_job("a", SCORE_REGION_TASK, make_payload())
+        asyncio.run(self.manager.start_job(job))
+
+        self.run_worker_until(lambda: self.acked)
+        self.assertEqual(self.acked, [job.id])
+        self.assertEqual(self.manager.get_job(job.id).state, "completed")
+        # nothing is left to redeliver once the lease would have expired
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 120):
+            self.assertIsNone(asyncio.run(self.queue.claim("other", 0)))
+
+    def test_redelivered_finished_jobs_are_acknowledged_without_running(self):
+        job = self.manager.create_job("a", SCORE_REGION_TASK, make_payload())
+        asyncio.run(self.manager.start_job(job))
+        job.state = "completed"
+        self.manager._save(job)
+
+        self.run_worker_until(lambda: self.acked)
+        self.assertEqual(self.acked, [job.id])
+        self.assertEqual(self.dal.calls, [])
+
+    def test_jobs_that_cannot_run_fail_without_stopping_the_worker(self):
+        bad = self.manager.create_job("a", SCORE_REGION_TASK, make_payload())
+        asyncio.run(self.manager.start_job(bad))
+        # as if its task had been renamed since it was queued
+        bad.task = "renamed"
+        self.manager._save(bad)
+        good = self.manager.create_job("a", SCORE_REGION_TASK, make_payload("US-CA"))
+        asyncio.run(self.manager.start_job(good))
+
+        self.run_worker_until(lambda: len(self.acked) == 2)
+        self.assertEqual(self.acked, [bad.id, good.id])
+        failed = self.manager.get_job(bad.id)
+        self.assertEqual(failed.state, "failed")
+        self.assertIn("renamed", failed.response["error"])
+        self.assertEqual(self.manager.get_job(good.id).state, "completed")
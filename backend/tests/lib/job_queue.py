@@ -0,0 +1,70 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from app.dal.queue.memory import MemoryJobQueue
+
+
+class TestMemoryJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = MemoryJobQueue(lease_seconds=60)
+        self.now = time.monotonic()
+
+    def at(self, offset, coroutine):
+        async def run():
+            with mock.patch("time.monotonic", return_value=self.now + offset):
+                return await coroutine
+
+        return asyncio.run(run())
+
+    def test_claims_by_priority_then_order(self):
+        async def run():
+            await self.queue.enqueue("low", priority=1)
+            await self.queue.enqueue("first")
+            await self.queue.enqueue("second")
+            return [(await self.queue.claim("a", 0)).job_id for _ in range(3)]
+
+        self.assertEqual(asyncio.run(run()), ["first", "second", "low"])
+        self.assertIsNone(asyncio.run(self.queue.claim("a", 0)))
+
+    def test_expired_lease_is_redelivered(self):
+        self.at(0, self.queue.enqueue("job"))
+        lease = self.at(0, self.queue.claim("a", 0))
+
+        self.assertIsNone(self.at(59, self.queue.claim("b", 0)))
+        redelivered = self.at(61, self.queue.claim("b", 0))
+        self.assertEqual(
+            (redelivered.message_id, redelivered.job_id), (lease.message_id, "job")
+        )
+        # the new holder has a lease of its own
+        self.assertIsNone(self.at(62, self.queue.claim("c", 0)))
+
+    def test_heartbeat_renews_the_lease(self):
+        self.at(0, self.queue.enqueue("job"))
+        lease = self.at(0, self.queue.claim("a", 0))
+        self.at(50, self.queue.heartbeat("a", lease))
+
+        self.assertIsNone(self.at(100, self.queue.claim("b", 0)))
+        self.assertIsNotNone(self.at(111, self.queue.claim("b", 0)))
+
+    def test_acknowledged_job_is_not_redelivered(self):
+        self.at(0, self.queue.enqueue("job"))
+        lease = self.at(0, self.queue.claim("a", 0))
+        self.at(1, self.queue.ack(lease))
+
+        self.assertIsNone(self.at(120, self.queue.claim("b", 0)))
+        # a late heartbeat doesn't bring it back
+        self.at(121, self.queue.heartbeat("a", lease))
+        self.assertIsNone(self.at(300, self.queue.claim("b", 0)))
+
+    def test_claim_waits_for_a_job(self):
+        self.queue.POLL_INTERVAL = 0.01
+
+        async def run():
+            claim = asyncio.create_task(self.queue.claim("a", 5))
+            await asyncio.sleep(0.05)
+            await self.queue.enqueue("job")
+            return await claim
+
+        self.assertEqual(asyncio.run(run()).job_id, "job")
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import unittest
+
+from app.dal.job.redis import RedisJobStore
+from app.dal.job.sqlite import SQLiteJobStore
+from lib.job_store import InvalidCursor, decode_cursor, encode_cursor
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class TestCursor(unittest.TestCase):
+    def test_round_trip(self):
+        cursor = encode_cursor(1718000000.123456, "6f1c9a2e-job:id")
+        self.assertEqual(decode_cursor(cursor), (1718000000.123456, "6f1c9a2e-job:id"))
+
+    def test_rejects_malformed_cursors(self):
+        for cursor in ("not base64!", encode_cursor(1.0, "x")[:-4] + "AAAA", ""):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    decode_cursor(cursor)
+
+
+class JobStoreTests:
+    """
+    Tests every job store passes, mixed into a TestCase whose make_store
+    returns an empty store.
+    """
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.store = self.make_store()
+
+    def save(self, job_id, created_at, owner="a"):
+        self.store.save(job_id, owner, created_at, f"data:{job_id}")
+
+    def pages(self, owner, limit):
+        pages = []
+        cursor = None
+        while True:
+            page, cursor = self.store.list_for_owner(owner, limit, cursor)
+            pages.append(page)
+            if cursor is None:
+                return pages
+
+    def test_lists_newest_first(self):
+        self.save("j1", 1.0)
+        self.save("j3", 3.0)
+        self.save("j2", 2.0)
+
+        self.assertEqual(
+            self.store.list_for_owner("a"), (["data:j3", "data:j2", "data:j1"], None)
+        )
+
+    def test_lists_only_the_owners_jobs(self):
+        self.save("j1", 1.0)
+        self.save("j2", 2.0, owner="b")
+
+        self.assertEqual(self.store.list_for_owner("a"), (["data:j1"], None))
+        self.assertEqual(self.store.list_for_owner("c"), ([], None))
+
+    def test_saving_again_keeps_the_jobs_place(self):
+        self.save("j1", 1.0)
+        self.save("j2", 2.0)
+        self.store.save("j1", "a", 3.0, "updated")
+
+        self.assertEqual(self.store.list_for_owner("a")[0], ["data:j2", "updated"])
+        self.assertEqual(self.store.load("j1"), "updated")
+
+    def test_pages_through_tied_creation_times(self):
+        for job_id, created_at in [
+            ("j0", 1.0),
+            ("j1", 2.0),
+            ("j2", 2.0),
+            ("j3", 2.0),
+            ("j4", 2.0),
+            ("j5", 2.0),
+            ("j6", 3.0),
+        ]:
+            self.save(job_id, created_at)
+        everything, _ = self.store.list_for_owner("a")
+
+        for limit in (1, 2, 3, 7):
+            with self.subTest(limit=limit):
+                pages = self.pages("a", limit)
+                self.assertEqual([job for page in pages for job in page], everything)
+                self.assertTrue(all(len(page) <= limit for page in pages))
+        self.assertEqual(everything, [f"data:j{i}" for i in (6, 5, 4, 3, 2, 1, 0)])
+
+    def test_a_full_last_page_has_no_cursor(self):
+        self.save("j1", 1.0)
+        self.save("j2", 2.0)
+
+        self.assertEqual(
+            self.store.list_for_owner("a", 2), (["data:j2", "data:j1"], None)
+        )
+
+
+class TestSQLiteJobStore(JobStoreTests, unittest.TestCase):
+    def make_store(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SQLiteJobStore(os.path.join(directory.name, "jobs.sqlite3"))
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestRedisJobStore(JobStoreTests, unittest.TestCase):
+    def make_store(self):
+        store = RedisJobStore("localhost", 6379, "default", None)
+        server = fakeredis.FakeServer()
+        store.redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+        store.results = fakeredis.FakeRedis(server=server)
+        return store
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import time
+import unittest
+from unittest import mock
+
+from app.dal.cache.memory import MemoryCache
+
+VALUE = {"locId": "L1", "observations": list(range(100))}
+
+
+def make_cache(entries, prefix_ttls=None, default_ttl=60.0):
+    # room for the given number of VALUEs
+    return MemoryCache(
+        max_bytes=MemoryCache.estimate_size(VALUE) * entries,
+        default_ttl=default_ttl,
+        prefix_ttls=prefix_ttls or {},
+    )
+
+
+class TestMemoryCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = make_cache(2)
+
+        async def run():
+            await cache.set("a", VALUE)
+            await cache.set("b", VALUE)
+            # reading a makes b the least recently used
+            await cache.get("a")
+            await cache.set("c", VALUE)
+            return [await cache.get(key) for key in ("a", "b", "c")]
+
+        self.assertEqual(asyncio.run(run()), [VALUE, None, VALUE])
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_skips_values_larger_than_the_cache(self):
+        cache = make_cache(1)
+        asyncio.run(cache.set("a", {**VALUE, "more": list(range(100))}))
+
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_longest_prefix_chooses_the_ttl(self):
+        cache = make_cache(
+            2, prefix_ttls={"ebird:": 60.0, "ebird:recent:": 5.0, "ebird:off:": 0.0}
+        )
+
+        self.assertEqual(cache.ttl_for("ebird:hotspots:US-NY"), 60.0)
+        self.assertEqual(cache.ttl_for("ebird:recent:US-NY"), 5.0)
+        self.assertEqual(cache.ttl_for("other"), cache.default_ttl)
+        # a zero ttl keeps keys out of the memory tier
+        asyncio.run(cache.set("ebird:off:US-NY", VALUE))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_entries_expire_after_the_shorter_ttl(self):
+        cache = make_cache(2, prefix_ttls={"ebird:recent:": 5.0})
+        now = time.monotonic()
+
+        async def get_at(offset, key):
+            with mock.patch("time.monotonic", return_value=now + offset):
+                return await cache.get(key)
+
+        async def run():
+            with mock.patch("time.monotonic", return_value=now):
+                await cache.set("ebird:recent:US-NY", VALUE, ttl=60.0)
+                await cache.set("ebird:settled:US-NY", VALUE, ttl=10.0)
+            return [
+                await get_at(4, "ebird:recent:US-NY"),
+                await get_at(6, "ebird:recent:US-NY"),
+                await get_at(9, "ebird:settled:US-NY"),
+                await get_at(11, "ebird:settled:US-NY"),
+            ]
+
+        self.assertEqual(asyncio.run(run()), [VALUE, None, VALUE, None])
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_stats_count_hits_and_misses(self):
+        cache = make_cache(2)
+
+        async def run():
+            await cache.set("a", VALUE)
+            await cache.get("a")
+            await cache.get("b")
+
+        asyncio.run(run())
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["bytes"], MemoryCache.estimate_size(VALUE))
+
+    def test_long_lists_are_sized_from_a_sample(self):
+        observations = [
+            {"speciesCode": f"sp{i}", "obsDt": "2024-05-01 08:00", "howMany": i}
+            for i in range(1000)
+        ]
+        value = {"__cached_at__": time.time(), "value": observations}
+        encoded = len(json.dumps(value, separators=(",", ":")))
+
+        with mock.patch("json.dumps", wraps=json.dumps) as dumps:
+            size = MemoryCache.estimate_size(value)
+        self.assertAlmostEqual(
+            size, encoded * MemoryCache.OBJECT_OVERHEAD, delta=size / 20
+        )
+        # without encoding every observation
+        self.assertLessEqual(
+            max(
+                len(call.args[0])
+                for call in dumps.call_args_list
+                if isinstance(call.args[0], list)
+            ),
+            MemoryCache.SIZE_SAMPLES,
+        )
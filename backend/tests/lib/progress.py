@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+
+from lib.progress import (
+    Progress,
+    advance,
+    get_checkpoint,
+    set_checkpoint,
+    set_partial,
+    set_phase,
+    tracking,
+)
+
+
+class TestProgress(unittest.TestCase):
+    def test_reports_outside_tracking_are_ignored(self):
+        set_phase("scoring", hotspots=3)
+        advance("hotspots_scored")
+
+    def test_tracks_the_current_task_and_its_children(self):
+        progress = Progress()
+
+        async def score():
+            advance("hotspots_scored")
+
+        async def run():
+            with tracking(progress):
+                set_phase("scoring", hotspots=3, hotspots_scored=0)
+                await asyncio.gather(score(), score())
+            advance("hotspots_scored")
+
+        asyncio.run(run())
+        self.assertEqual(
+            progress.snapshot(),
+            {"phase": "scoring", "hotspots": 3, "hotspots_scored": 2},
+        )
+        self.assertEqual(progress.version, 3)
+
+    def test_concurrent_tasks_track_separately(self):
+        first, second = Progress(), Progress()
+
+        async def run(progress: Progress, phase: str):
+            with tracking(progress):
+                await asyncio.sleep(0)
+                set_phase(phase)
+
+        async def main():
+            await asyncio.gather(run(first, "hotspots"), run(second, "species"))
+
+        asyncio.run(main())
+        self.assertEqual(first.phase, "hotspots")
+        self.assertEqual(second.phase, "species")
+
+    def test_partial_results_are_computed_when_read(self):
+        progress = Progress()
+        calls = []
+
+        def result():
+            calls.append(1)
+            return ["best"]
+
+        self.assertIsNone(progress.partial())
+        with tracking(progress):
+            set_partial(result)
+            set_partial(result)
+        self.assertEqual(progress.partial_version, 2)
+        self.assertEqual(calls, [])
+        self.assertEqual(progress.partial(), ["best"])
+
+    def test_checkpoints(self):
+        self.assertIsNone(get_checkpoint("hotspot:L1"))
+        set_checkpoint("hotspot:L1", {"score": 1})
+
+        progress = Progress({"hotspot:L1": {"score": 1}})
+        with tracking(progress):
+            self.assertEqual(get_checkpoint("hotspot:L1"), {"score": 1})
+            self.assertIsNone(get_checkpoint("hotspot:L2"))
+            set_checkpoint("hotspot:L2", {"score": 2})
+        self.assertEqual(progress.checkpoint_version, 1)
+        self.assertEqual(
+            progress.checkpoint,
+            {"hotspot:L1": {"score": 1}, "hotspot:L2": {"score": 2}},
+        )
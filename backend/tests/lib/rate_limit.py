@@ -0,0 +1,51 @@
+import asyncio
+import time
+import unittest
+
+from lib.rate_limit import RateLimiter, TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_is_immediate(self):
+        bucket = TokenBucket(rate=1, burst=3)
+        delays = [bucket.reserve() for _ in range(3)]
+        self.assertEqual(delays, [0.0, 0.0, 0.0])
+
+    def test_waiters_queue_behind_each_other(self):
+        bucket = TokenBucket(rate=10, burst=1)
+        self.assertEqual(bucket.reserve(), 0.0)
+        first = bucket.reserve()
+        second = bucket.reserve()
+        self.assertAlmostEqual(first, 0.1, delta=0.01)
+        self.assertAlmostEqual(second, 0.2, delta=0.01)
+
+    def test_refund_returns_token(self):
+        bucket = TokenBucket(rate=1, burst=1)
+        bucket.reserve()
+        bucket.refund()
+        self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0, burst=1)
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=1, burst=0)
+
+    def test_acquire_waits_for_rate(self):
+        bucket = TokenBucket(rate=50, burst=1)
+
+        async def run():
+            await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+
+        start = time.monotonic()
+        asyncio.run(run())
+        self.assertGreaterEqual(time.monotonic() - start, 0.07)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_keys_have_separate_buckets(self):
+        limiter = RateLimiter(rate=1, burst=1)
+        self.assertIs(limiter.bucket("a"), limiter.bucket("a"))
+        self.assertIsNot(limiter.bucket("a"), limiter.bucket("b"))
+        self.assertEqual(limiter.bucket("a").reserve(), 0.0)
+        self.assertEqual(limiter.bucket("b").reserve(), 0.0)
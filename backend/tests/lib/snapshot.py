@@ -0,0 +1,84 @@
+import asyncio
+import gzip
+import os
+import tempfile
+import unittest
+
+from lib.snapshot import export_snapshot, import_snapshot
+from tests.lib.fakes import MemoryProvider
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache.snapshot")
+
+    def test_round_trip(self):
+        source = MemoryProvider(
+            {
+                "ebird:hotspots:US-NY:v1": [{"locId": "L1"}],
+                "ebird:count:v1": 3,
+                "ebird:name:v1": "Central Park",
+                "other:key": "skipped",
+            }
+        )
+        target = MemoryProvider()
+
+        written = asyncio.run(export_snapshot(source, self.path, ["ebird:*"]))
+        loaded = asyncio.run(import_snapshot(target, self.path, ttl=60))
+
+        self.assertEqual((written, loaded), (3, 3))
+        self.assertEqual(
+            target.data, {k: v for k, v in source.data.items() if k != "other:key"}
+        )
+        self.assertEqual(set(target.ttls.values()), {60})
+
+    def test_overlapping_patterns_write_keys_once(self):
+        source = MemoryProvider({"ebird:a:v1": 1, "ebird:b:v1": 2})
+
+        written = asyncio.run(
+            export_snapshot(source, self.path, ["ebird:*", "ebird:a*"], batch_size=1)
+        )
+
+        self.assertEqual(written, 2)
+
+    def test_existing_keys_are_kept_unless_overwriting(self):
+        asyncio.run(export_snapshot(MemoryProvider({"a": 1, "b": 2}), self.path, ["*"]))
+        target = MemoryProvider({"a": 10})
+
+        self.assertEqual(asyncio.run(import_snapshot(target, self.path)), 1)
+        self.assertEqual(target.data, {"a": 10, "b": 2})
+        self.assertEqual(
+            asyncio.run(import_snapshot(target, self.path, overwrite=True)), 2
+        )
+        self.assertEqual(target.data, {"a": 1, "b": 2})
+
+    def test_counters_never_move_backwards(self):
+        source = MemoryProvider({"generation:a": 3, "generation:b": 3})
+        asyncio.run(
+            export_snapshot(source, self.path, ["*"], counter_pattern="generation*")
+        )
+        target = MemoryProvider({"generation:a": 5})
+
+        asyncio.run(import_snapshot(target, self.path, overwrite=True))
+
+        self.assertEqual(target.data, {"generation:a": 5, "generation:b": 3})
+
+    def test_rejects_other_files(self):
+        with gzip.open(self.path, "wb") as file:
+            file.write(b"not a snapshot")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(import_snapshot(MemoryProvider(), self.path))
+
+    def test_rejects_truncated_snapshots(self):
+        asyncio.run(export_snapshot(MemoryProvider({"a": 1}), self.path, ["*"]))
+        with gzip.open(self.path, "rb") as file:
+            data = file.read()
+        with gzip.open(self.path, "wb") as file:
+            file.write(data[:-1])
+
+        with self.assertRaises(ValueError):
+            asyncio.run(import_snapshot(MemoryProvider(), self.path))
+
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from app.dal.cache.sqlite import SQLiteCache
+from lib.codec import CodecSelector
+
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache", "cache.sqlite3")
+        self.cache = SQLiteCache(self.path, readers=2, codecs=CodecSelector("json"))
+        self.addCleanup(self.cache._readers.shutdown)
+        self.addCleanup(self.cache._writer.shutdown)
+
+    def rows(self):
+        with sqlite3.connect(self.path) as connection:
+            return sorted(
+                key for (key,) in connection.execute("SELECT key FROM cache")
+            )
+
+    def test_round_trip(self):
+        async def run():
+            await self.cache.set("a", {"locId": "L1"})
+            await self.cache.set("a", {"locId": "L2"})
+            return await self.cache.get("a"), await self.cache.get("b")
+
+        self.assertEqual(asyncio.run(run()), ({"locId": "L2"}, None))
+
+    def test_get_many_and_set_many_batch_keys(self):
+        self.cache.BATCH_SIZE = 2
+        items = {f"key:{i}": i for i in range(5)}
+
+        async def run():
+            await self.cache.set_many(items)
+            return await self.cache.get_many([*items, "missing"])
+
+        self.assertEqual(asyncio.run(run()), {**items, "missing": None})
+
+    def test_concurrent_writes_are_all_committed(self):
+        async def run():
+            await asyncio.gather(
+                *(self.cache.set(f"key:{i}", i) for i in range(20))
+            )
+            return await self.cache.get_many([f"key:{i}" for i in range(20)])
+
+        self.assertEqual(list(asyncio.run(run()).values()), list(range(20)))
+
+    def test_expired_entries_are_not_read(self):
+        async def run():
+            await self.cache.set("expired", 1, ttl=-1)
+            await self.cache.set("fresh", 2, ttl=60)
+            await self.cache.set("forever", 3)
+            return await self.cache.get_many(["expired", "fresh", "forever"])
+
+        self.assertEqual(
+            asyncio.run(run()), {"expired": None, "fresh": 2, "forever": 3}
+        )
+
+    def test_expired_rows_are_purged_on_write(self):
+        self.cache.PURGE_INTERVAL = 0
+
+        async def run():
+            await self.cache.set("expired", 1, ttl=-1)
+            await self.cache.set("fresh", 2, ttl=60)
+
+        asyncio.run(run())
+        self.assertEqual(self.rows(), ["fresh"])
+
+    def test_incr(self):
+        async def run():
+            values = [await self.cache.incr("counter") for _ in range(3)]
+            await self.cache.set_counter("other", 5)
+            return values, await self.cache.get_counters(
+                ["counter", "other", "missing"]
+            )
+
+        self.assertEqual(
+            asyncio.run(run()), ([1, 2, 3], {"counter": 3, "other": 5, "missing": 0})
+        )
+
+    def test_incr_counts_across_instances(self):
+        other = SQLiteCache(self.path, readers=1, codecs=CodecSelector("json"))
+        self.addCleanup(other._readers.shutdown)
+        self.addCleanup(other._writer.shutdown)
+
+        async def run():
+            await self.cache.incr("counter")
+            await other.incr("counter")
+            return await self.cache.incr("counter")
+
+        self.assertEqual(asyncio.run(run()), 3)
+
+    def test_scan_pages_through_matching_live_keys(self):
+        self.cache.BATCH_SIZE = 2
+
+        async def run():
+            await self.cache.set_many({f"ebird:{i}:v1": i for i in range(5)})
+            await self.cache.set("ebird:expired:v1", 0, ttl=-1)
+            await self.cache.set("other:0:v1", 0)
+            return [key async for key in self.cache.scan("ebird:*")]
+
+        self.assertEqual(asyncio.run(run()), [f"ebird:{i}:v1" for i in range(5)])
+
+    def test_scan_stops_at_a_full_last_page(self):
+        self.cache.BATCH_SIZE = 2
+
+        async def run():
+            await self.cache.set_many({"ebird:a": 1, "ebird:b": 2})
+            return [key async for key in self.cache.scan("ebird:*")]
+
+        self.assertEqual(asyncio.run(run()), ["ebird:a", "ebird:b"])
@@ -0,0 +1,108 @@
+import asyncio
+import datetime
+import unittest
+
+import attrs
+
+from app.model.task import ScoreRegionPayload
+from lib.task import Task, TaskRegistry, UnknownTask
+
+
+@attrs.define
+class Payload:
+    region_code: str
+    target_date: datetime.date = attrs.field(
+        converter=lambda value: (
+            datetime.date.fromisoformat(value) if isinstance(value, str) else value
+        )
+    )
+
+
+class TestTaskRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = TaskRegistry()
+
+        async def handler(payload: Payload):
+            return [payload.region_code, payload.target_date.isoformat()]
+
+        self.task = self.registry.register("score", Payload, handler)
+
+    def test_payloads_round_trip_through_json_types(self):
+        payload = Payload("US-NY", datetime.date(2024, 5, 1))
+        encoded = self.task.encode(payload)
+
+        self.assertEqual(encoded, {"region_code": "US-NY", "target_date": "2024-05-01"})
+        self.assertEqual(self.task.decode(encoded), payload)
+
+    def test_decode_ignores_unknown_fields(self):
+        payload = self.task.decode(
+            {"region_code": "US-NY", "target_date": "2024-05-01", "added": 1}
+        )
+        self.assertEqual(payload, Payload("US-NY", datetime.date(2024, 5, 1)))
+
+    def test_encode_rejects_other_payload_types(self):
+        with self.assertRaises(TypeError):
+            self.task.encode({"region_code": "US-NY"})
+
+    def test_run_calls_the_handler(self):
+        payload = Payload("US-NY", datetime.date(2024, 5, 1))
+        result = asyncio.run(self.registry.get("score").run(payload))
+        self.assertEqual(result, ["US-NY", "2024-05-01"])
+
+    def test_unknown_and_duplicate_tasks(self):
+        with self.assertRaises(UnknownTask):
+            self.registry.get("missing")
+        with self.assertRaises(ValueError):
+            self.registry.register("score", Payload, self.task.handler)
+
+    def test_content_hash_depends_only_on_the_dedup_key(self):
+        self.assertIsNone(self.task.content_hash(Payload("US-NY", "2024-05-01")))
+
+        dedup = self.registry.register(
+            "dedup",
+            Payload,
+            self.task.handler,
+            dedup_key=lambda payload: {
+                "region": payload.region_code,
+                "dates": {payload.target_date, datetime.date(2024, 1, 1)},
+            },
+        )
+        first = dedup.content_hash(Payload("US-NY", "2024-05-01"))
+        self.assertEqual(first, dedup.content_hash(Payload("US-NY", "2024-05-01")))
+        self.assertNotEqual(first, dedup.content_hash(Payload("US-NY", "2024-05-02")))
+        self.assertNotEqual(first, dedup.content_hash(Payload("US-CA", "2024-05-01")))
+
+    def test_summarize_result(self):
+        self.assertEqual(self.task.summarize_result([3, 2, 1]), [3, 2, 1])
+
+        summarized = self.registry.register(
+            "summarized", Payload, self.task.handler, summarize=lambda r: r[:2]
+        )
+        self.assertEqual(summarized.summarize_result([3, 2, 1]), [3, 2])
+
+    def test_priority_for(self):
+        payload = Payload("US-NY", "2024-05-01")
+        self.assertEqual(self.task.priority_for(payload), Task.DEFAULT_PRIORITY)
+
+        prioritized = self.registry.register(
+            "prioritized",
+            Payload,
+            self.task.handler,
+            priority=lambda payload: len(payload.region_code),
+        )
+        self.assertEqual(prioritized.priority_for(payload), 5)
+
+
+class TestScoreRegionPayload(unittest.TestCase):
+    def make(self, **kwargs):
+        return ScoreRegionPayload(
+            "US-NY", [], "life list", "2024-05-01", "auth", **kwargs
+        )
+
+    def test_max_concurrency_is_a_positive_int(self):
+        self.assertEqual(self.make(max_concurrency=4).max_concurrency, 4)
+        self.assertIsNone(self.make().max_concurrency)
+        for value in ("4", 0, -1, 2.5, True):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    self.make(max_concurrency=value)
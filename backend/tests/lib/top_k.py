@@ -0,0 +1,29 @@
+import random
+import unittest
+
+from lib.top_k import TopK
+
+
+class TestTopK(unittest.TestCase):
+    def test_matches_a_stable_descending_sort(self):
+        rng = random.Random(7)
+        items = [{"id": i, "score": rng.randint(0, 5)} for i in range(200)]
+        expected = sorted(items, key=lambda item: item["score"], reverse=True)
+
+        for k in (1, 5, 50, None):
+            top = TopK(k, key=lambda item: item["score"])
+            for item in items:
+                top.push(item)
+            self.assertEqual(top.items(), expected[:k])
+
+    def test_order_ranks_items_pushed_out_of_order(self):
+        top = TopK(2, key=lambda item: item[1])
+        self.assertTrue(top.push(("c", 1), order=2))
+        self.assertTrue(top.push(("b", 1), order=1))
+        self.assertTrue(top.push(("a", 1), order=0))
+        self.assertFalse(top.push(("d", 0), order=3))
+        self.assertEqual(top.items(), [("a", 1), ("b", 1)])
+
+    def test_rejects_empty_k(self):
+        with self.assertRaises(ValueError):
+            TopK(0, key=lambda item: item)
@@ -0,0 +1,122 @@
+import asyncio
+import datetime
+import unittest
+from collections import Counter
+from unittest import mock
+
+from app.manager.warmer import CacheWarmer
+
+UTC = datetime.timezone.utc
+
+
+class FakeJobManager:
+    def __init__(self, counts):
+        self.counts = Counter(counts)
+        self.since = None
+
+    def get_region_job_counts(self, since):
+        self.since = since
+        return self.counts
+
+
+class FakeBirdSpotManager:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.warmed = []
+
+    async def warm_region(self, region_code, dates, auth, max_concurrency=None):
+        if region_code in self.failing:
+            raise RuntimeError(region_code)
+        self.warmed.append((region_code, dates, max_concurrency))
+        return 3
+
+
+def make_warmer(counts=(), failing=(), auth="auth"):
+    return CacheWarmer(
+        birdspot_manager=FakeBirdSpotManager(failing),
+        job_manager=FakeJobManager(counts),
+        auth=auth,
+        max_regions=2,
+        lookback_days=7,
+        delay=datetime.timedelta(minutes=30),
+        max_concurrency=1,
+    )
+
+
+class TestCacheWarmer(unittest.TestCase):
+    def test_next_run_is_the_delay_after_midnight(self):
+        warmer = make_warmer()
+
+        for now, expected in [
+            (
+                datetime.datetime(2024, 5, 1, 0, 10, tzinfo=UTC),
+                datetime.datetime(2024, 5, 1, 0, 30, tzinfo=UTC),
+            ),
+            (
+                datetime.datetime(2024, 5, 1, 0, 30, tzinfo=UTC),
+                datetime.datetime(2024, 5, 2, 0, 30, tzinfo=UTC),
+            ),
+            (
+                datetime.datetime(2024, 12, 31, 23, 0, tzinfo=UTC),
+                datetime.datetime(2025, 1, 1, 0, 30, tzinfo=UTC),
+            ),
+        ]:
+            with self.subTest(now=now):
+                self.assertEqual(warmer.next_run(now), expected)
+
+    def test_popular_regions_over_the_lookback(self):
+        warmer = make_warmer({"US-NY": 5, "US-CA": 9, "US-TX": 1})
+        now = datetime.datetime(2024, 5, 8, tzinfo=UTC)
+
+        self.assertEqual(warmer.popular_regions(now), ["US-CA", "US-NY"])
+        self.assertEqual(
+            warmer.job_manager.since, datetime.datetime(2024, 5, 1, tzinfo=UTC)
+        )
+
+    def test_warm_skips_failing_regions(self):
+        warmer = make_warmer({"US-NY": 5, "US-CA": 9}, failing={"US-CA"})
+        date = datetime.date(2024, 5, 1)
+
+        self.assertEqual(asyncio.run(warmer.warm(date)), 1)
+        self.assertEqual(warmer.birdspot_manager.warmed, [("US-NY", [date], 1)])
+
+    def test_warm_defaults_to_yesterday(self):
+        warmer = make_warmer({"US-NY": 1})
+        asyncio.run(warmer.warm())
+
+        yesterday = datetime.datetime.now(UTC).date() - datetime.timedelta(days=1)
+        self.assertEqual(warmer.birdspot_manager.warmed[0][1], [yesterday])
+
+    def test_warm_needs_an_api_key(self):
+        warmer = make_warmer({"US-NY": 1}, auth=None)
+
+        self.assertEqual(asyncio.run(warmer.warm()), 0)
+        self.assertEqual(warmer.birdspot_manager.warmed, [])
+
+    def test_run_forever_sleeps_until_each_run(self):
+        warmer = make_warmer({"US-NY": 1})
+        now = datetime.datetime.now(UTC)
+        warmer.next_run = lambda _: now + datetime.timedelta(hours=1)
+        warms = [RuntimeError("boom"), 1]
+        sleeps = []
+
+        async def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) > len(warms):
+                raise asyncio.CancelledError
+
+        async def warm():
+            result = warms[len(sleeps) - 1]
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        warmer.warm = warm
+        with mock.patch("app.manager.warmer.asyncio.sleep", sleep):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(warmer.run_forever())
+
+        # a failed run doesn't stop the next one
+        self.assertEqual(len(sleeps), 3)
+        for seconds in sleeps:
+            self.assertAlmostEqual(seconds, 3600, delta=5)
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import unittest
+from concurrent import futures
+
+from lib.worker import WorkerLoop
+
+
+class TestWorkerLoop(unittest.TestCase):
+    def setUp(self):
+        self.started = []
+
+    def make_worker(self, *args, **kwargs) -> WorkerLoop:
+        worker = WorkerLoop(*args, **kwargs)
+        self.addCleanup(worker.stop)
+        return worker
+
+    def job(self, name: str, seconds: float = 0.0):
+        async def run():
+            self.started.append(name)
+            await asyncio.sleep(seconds)
+            return name
+
+        return run
+
+    def test_results_and_errors_reach_the_future(self):
+        worker = self.make_worker(max_concurrency=2)
+
+        async def fail():
+            raise ValueError("bad")
+
+        self.assertEqual(worker.submit("a", self.job("one")).result(1), "one")
+        with self.assertRaises(ValueError):
+            worker.submit("a", fail).result(1)
+
+    def test_jobs_share_one_loop(self):
+        worker = self.make_worker(max_concurrency=2)
+
+        async def loop_id():
+            return id(asyncio.get_running_loop())
+
+        loops = {worker.submit("a", loop_id).result(1) for _ in range(3)}
+        self.assertEqual(len(loops), 1)
+
+    def test_concurrency_is_bounded(self):
+        worker = self.make_worker(max_concurrency=2)
+        running = 0
+        peak = 0
+        lock = threading.Lock()
+
+        async def run():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            with lock:
+                running -= 1
+
+        futures.wait([worker.submit(str(i), run) for i in range(6)], timeout=1)
+        self.assertEqual(peak, 2)
+
+    def test_priorities_then_owners_round_robin(self):
+        worker = self.make_worker(max_concurrency=1)
+        submitted = [
+            worker.submit("x", self.job("blocker", 0.05)),
+            worker.submit("a", self.job("a1")),
+            worker.submit("a", self.job("a2")),
+            worker.submit("a", self.job("a3")),
+            worker.submit("b", self.job("b1")),
+            worker.submit("c", self.job("urgent"), priority=-1),
+        ]
+        futures.wait(submitted, timeout=1)
+        self.assertEqual(
+            self.started, ["blocker", "urgent", "a1", "b1", "a2", "a3"]
+        )
+
+    def test_max_per_owner(self):
+        worker = self.make_worker(max_concurrency=2, max_per_owner=1)
+        submitted = [
+            worker.submit("a", self.job("a1", 0.05)),
+            worker.submit("a", self.job("a2")),
+            worker.submit("b", self.job("b1")),
+        ]
+        futures.wait(submitted, timeout=1)
+        self.assertEqual(self.started, ["a1", "b1", "a2"])
+
+    def test_cancelled_jobs_never_start(self):
+        worker = self.make_worker(max_concurrency=1)
+        blocker = worker.submit("a", self.job("blocker", 0.05))
+        cancelled = worker.submit("a", self.job("cancelled"))
+        self.assertTrue(cancelled.cancel())
+        after = worker.submit("a", self.job("after"))
+
+        futures.wait([blocker, after], timeout=1)
+        self.assertEqual(self.started, ["blocker", "after"])
@@ -0,0 +1,69 @@
+import logging
+import sys
+
+logging.basicConfig(
+    level=logging.DEBUG,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+    handlers=[
+        logging.StreamHandler(sys.stdout),
+    ],
+)
+
+import asyncio
+import os
+
+import dotenv
+
+if os.getenv("RAILWAY_ENVIRONMENT_NAME") != "production":
+    dotenv.load_dotenv("./.env")
+
+from lib.logging_config import configure_logging
+
+configure_logging(logging.DEBUG)
+
+from app.dal.ebird import EBirdDAL
+from app.manager.ebird import EBirdManager
+from app.manager.job import JobManager
+from app.manager.job_worker import JobWorker
+from minject import Registry
+
+
+logger = logging.getLogger(__name__)
+
+registry = Registry()
+
+
+async def main():
+    """
+    Run jobs from the shared job queue until interrupted. Start as many of
+    these as needed, on any node that can reach the queue and job store.
+    """
+    job_manager = registry[JobManager]
+    interval = float(os.getenv("BIRDSPOT_MEMORY_CACHE_STATS_INTERVAL", "300"))
+    stats = (
+        asyncio.create_task(
+            registry[EBirdManager].memory_cache.log_stats_forever(interval)
+        )
+        if interval > 0
+        else None
+    )
+    try:
+        await registry[JobWorker].run()
+    finally:
+        if stats is not None:
+            stats.cancel()
+        # jobs run on the job manager's loop, along with its eBird client
+        await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(
+                registry[EBirdDAL].close(), job_manager.worker.loop
+            )
+        )
+        job_manager.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Job worker stopped")